@@ -0,0 +1,401 @@
+import argparse
+import asyncio
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+from typing import BinaryIO, get_args
+
+import ffmpeg
+from discord.utils import DEFAULT_FILE_SIZE_LIMIT_BYTES
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import MyGOConfig
+from core.classes import BaseClassMixin
+from database import EpisodeItem, SentenceItem, engine, recreate_model
+from loggers import TZ
+
+from .const import (
+    BENCH_FRAME_RATE,
+    BENCH_GOP,
+    BENCH_SUBTITLE_SECONDS,
+    BENCH_VIDEO_SIZE,
+    BENCH_VOCABULARY,
+    VIDEO_DIR,
+)
+from .schema import BenchReport, BenchResult, LatencyStats, RenderTrace
+from .telemetry import RenderTelemetry, percentile
+from .types import EpisodeChoices
+from .utils import SubtitleUtils
+
+# one benchmark request: episode, number of frames and the call to time
+Request = tuple[str, int, Callable[[], Awaitable[BinaryIO | None]]]
+
+
+def workspace_env(workdir: Path) -> dict[str, str]:
+    """Environment pointing database, videos and caches into `workdir`."""
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{workdir / 'bench.db'}",
+        "MYGO_VIDEO_DIR": str(workdir / "videos"),
+        "MYGO_CACHE_DIR": str(workdir / "cache"),
+    }
+
+
+def in_workspace(workdir: Path) -> bool:
+    """Whether this process already runs against the database of `workdir`."""
+    return (
+        engine.url.get_backend_name() == "sqlite"
+        and Path(engine.url.database or "").resolve() == (workdir / "bench.db").resolve()
+    )
+
+
+def probe_video(path: Path) -> tuple[float, int] | None:
+    """Duration (seconds) and number of frames of video of `path`, None if unreadable."""
+    try:
+        stream = ffmpeg.probe(str(path), select_streams="v:0")["streams"][0]
+        return float(stream["duration"]), int(stream["nb_frames"])
+    except (ffmpeg.Error, IndexError, KeyError, ValueError):
+        return None
+
+
+def generate_episode(path: Path, seconds: float, frame_rate: float = BENCH_FRAME_RATE) -> int:
+    """Encode a synthetic episode of testsrc2 video and a sine tone, return its frame count.
+
+    Video of an earlier run is kept if it is as long as `seconds`.
+
+    Equivalent to:
+        ffmpeg -f lavfi -i testsrc2=size=${BENCH_VIDEO_SIZE}:rate=${frame_rate}
+            -f lavfi -i sine -t ${seconds} -c:v libx264 -g ${BENCH_GOP} -c:a aac ${path}
+    """
+    if path.exists() and (probed := probe_video(path)) is not None:
+        duration, total_frame = probed
+        if abs(duration - seconds) < 1 / frame_rate:
+            return total_frame
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    video = ffmpeg.input(f"testsrc2=size={BENCH_VIDEO_SIZE}:rate={frame_rate}", f="lavfi")
+    audio = ffmpeg.input("sine=frequency=440:sample_rate=48000", f="lavfi")
+    ffmpeg.output(
+        video,
+        audio,
+        str(path),
+        t=seconds,
+        vcodec="libx264",
+        preset="veryfast",
+        pix_fmt="yuv420p",
+        g=BENCH_GOP,
+        acodec="aac",
+        movflags="+faststart",
+    ).overwrite_output().run(quiet=True)
+
+    if (probed := probe_video(path)) is None:
+        raise RuntimeError(f"Generated episode {path} is unreadable")
+    return probed[1]
+
+
+def synthetic_subtitles(
+    episode: str, total_frame: int, first_segment_id: int, rng: random.Random
+) -> list[SentenceItem]:
+    """A subtitle line of random vocabulary words every `BENCH_SUBTITLE_SECONDS`."""
+    step = round(BENCH_SUBTITLE_SECONDS * BENCH_FRAME_RATE)
+    return [
+        SentenceItem(
+            text="".join(rng.sample(BENCH_VOCABULARY, rng.randint(2, 4))),
+            episode=episode,
+            frame_start=frame_start,
+            frame_end=min(frame_start + step * 3 // 4, total_frame),
+            segment_id=first_segment_id + index,
+        )
+        for index, frame_start in enumerate(range(0, total_frame - step, step))
+    ]
+
+
+def summarize(
+    kind: str, concurrency: int, latencies: list[float], traces: list[RenderTrace]
+) -> BenchResult:
+    """Latency and stage statistics of one benchmark run, `wall` and errors are set later."""
+    latency = None
+    if latencies:
+        latency = LatencyStats(
+            mean=sum(latencies) / len(latencies),
+            p50=percentile(latencies, 50),
+            p95=percentile(latencies, 95),
+            max=max(latencies),
+        )
+
+    return BenchResult(
+        kind=kind,
+        concurrency=concurrency,
+        requests=len(latencies),
+        wall=0.0,
+        throughput=0.0,
+        latency=latency,
+        stages=RenderTelemetry.stage_stats(traces),
+    )
+
+
+class Benchmark(BaseClassMixin):
+    """Frame, GIF and search requests against `SubtitleUtils` on seeded synthetic episodes.
+
+    Every render request targets a different frame or range, so all of them miss the render
+    cache and the numbers are of cold renders.
+    """
+
+    def __init__(
+        self,
+        episodes: dict[str, int],
+        subtitles: list[SentenceItem],
+        gif_frames: int,
+        seed: int = 0,
+    ):
+        super().__init__()
+        self.utils = SubtitleUtils()
+        self.episodes = episodes
+        self.subtitles = subtitles
+        self.gif_frames = gif_frames
+        self.rng = random.Random(seed)
+        self._used: set[tuple[str, str, int]] = set()
+
+    async def warm_up(self):
+        """Load episode registry, keyframe indexes and subtitle index before timing."""
+        await self.utils.warm_keyframes()
+        await self.utils.search_title_by_text(BENCH_VOCABULARY[0])
+
+    def _unused_frame(self, kind: str, last_frame: int) -> tuple[str, int]:
+        while True:
+            episode = self.rng.choice(list(self.episodes))
+            frame = self.rng.randint(0, self.episodes[episode] - last_frame)
+            if (kind, episode, frame) not in self._used:
+                self._used.add((kind, episode, frame))
+                return episode, frame
+
+    def requests(self, kind: str, count: int) -> list[Request]:
+        """`count` requests of `kind`, never repeating a render of earlier requests."""
+        result: list[Request] = []
+        for _ in range(count):
+            if kind == "frame":
+                episode, frame = self._unused_frame(kind, 1)
+                result.append((episode, 1, partial(self.utils.extract_frame, episode, frame)))
+            elif kind == "gif":
+                episode, start = self._unused_frame(kind, self.gif_frames)
+                render = partial(
+                    self.utils.extract_animation,
+                    episode,
+                    start,
+                    start + self.gif_frames - 1,
+                    max_bytes=DEFAULT_FILE_SIZE_LIMIT_BYTES,
+                )
+                result.append((episode, self.gif_frames, render))
+            else:
+                item = self.rng.choice(self.subtitles)
+                start = self.rng.randrange(len(item.text) - 1)
+                query = item.text[start : start + self.rng.randint(2, 4)]
+                # mix both modes, fuzzy search ranks every subtitle so it is the slower one
+                fuzzy = bool(self.rng.getrandbits(1))
+                result.append((item.episode, 1, partial(self._search, query, fuzzy)))
+
+        return result
+
+    async def _search(self, query: str, fuzzy: bool) -> None:
+        await self.utils.search_title_by_text(query, fuzzy=fuzzy)
+
+    async def run(self, kind: str, count: int, concurrency: int) -> BenchResult:
+        """Time `count` requests of `kind` with at most `concurrency` running at once."""
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: list[float] = []
+        traces: list[RenderTrace] = []
+        errors: Counter[str] = Counter()
+
+        async def timed(episode: str, frames: int, request: Callable[[], Awaitable]):
+            async with semaphore:
+                started = perf_counter()
+                try:
+                    with self.utils.telemetry.trace(kind, episode, frames) as trace:
+                        if (output := await request()) is not None:
+                            trace.measure(output)
+                            output.close()
+                except Exception as e:  # pylint: disable=broad-except
+                    errors[type(e).__name__] += 1
+                    return
+
+                latencies.append(perf_counter() - started)
+                traces.append(trace)
+
+        requests = self.requests(kind, count)
+        started = perf_counter()
+        await asyncio.gather(*(timed(*request) for request in requests))
+        wall = perf_counter() - started
+
+        result = summarize(kind, concurrency, latencies, traces)
+        result.wall = wall
+        result.throughput = len(latencies) / wall
+        result.errors = dict(errors)
+        self.logger.info(
+            "%s x%d: %.2f req/s, p95 %.3fs, %d errors",
+            kind,
+            concurrency,
+            result.throughput,
+            result.latency.p95 if result.latency else 0.0,
+            errors.total(),
+        )
+        return result
+
+
+async def seed(episodes: dict[str, int]) -> list[SentenceItem]:
+    """Recreate tables and insert `episodes` (name to total frames) with their subtitles."""
+    await recreate_model()
+    rng = random.Random(0)
+    subtitles: list[SentenceItem] = []
+    for episode, total_frame in episodes.items():
+        subtitles.extend(synthetic_subtitles(episode, total_frame, len(subtitles), rng))
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add_all(
+            EpisodeItem(episode=episode, total_frame=total_frame, frame_rate=BENCH_FRAME_RATE)
+            for episode, total_frame in episodes.items()
+        )
+        session.add_all(subtitles)
+        await session.commit()
+
+    return subtitles
+
+
+def platform_info() -> dict[str, str | int | None]:
+    try:
+        ffmpeg_version = subprocess.run(
+            ["ffmpeg", "-version"], capture_output=True, text=True, check=True
+        ).stdout.split("\n", 1)[0]
+    except (OSError, subprocess.CalledProcessError):
+        ffmpeg_version = None
+
+    return {
+        "machine": platform.machine(),
+        "system": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_version,
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(args: argparse.Namespace) -> BenchReport:
+    """Generate episodes, seed database, then run every kind at every concurrency level."""
+    setup: dict[str, float] = {}
+    names = list(get_args(EpisodeChoices))[: args.episodes]
+
+    started = perf_counter()
+    # seed frame counts of the videos themselves, not of the requested length
+    episodes = {
+        episode: await asyncio.to_thread(
+            generate_episode, VIDEO_DIR / f"{episode}.mp4", args.seconds
+        )
+        for episode in names
+    }
+    setup["generate"] = perf_counter() - started
+
+    started = perf_counter()
+    # caches are of the previous run, drop them so every render is cold
+    shutil.rmtree(MyGOConfig.CACHE_DIR, ignore_errors=True)
+    subtitles = await seed(episodes)
+    setup["seed"] = perf_counter() - started
+
+    benchmark = Benchmark(episodes, subtitles, args.gif_frames, args.seed)
+    started = perf_counter()
+    await benchmark.warm_up()
+    setup["warm_up"] = perf_counter() - started
+
+    results = [
+        await benchmark.run(kind, args.requests, concurrency)
+        for concurrency in args.concurrency
+        for kind in args.kinds
+    ]
+    return BenchReport(
+        revision=git_revision(),
+        created=datetime.now(TZ),
+        platform=platform_info(),
+        settings={
+            "episodes": args.episodes,
+            "seconds": args.seconds,
+            "frame_rate": BENCH_FRAME_RATE,
+            "video_size": BENCH_VIDEO_SIZE,
+            "gop": BENCH_GOP,
+            "requests": args.requests,
+            "gif_frames": args.gif_frames,
+            "seed": args.seed,
+            "render_concurrency": MyGOConfig.RENDER_CONCURRENCY,
+            "render_max_pending": MyGOConfig.RENDER_MAX_PENDING,
+            "use_proxy": MyGOConfig.USE_PROXY,
+        },
+        setup=setup,
+        results=results,
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m cogs.mygo.bench",
+        description="Benchmark frame, GIF and search latency on synthetic episodes.",
+    )
+    parser.add_argument(
+        "--workdir",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "mygo-bench",
+        help="where videos (kept between runs), database and caches are created",
+    )
+    parser.add_argument("--episodes", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=120.0, help="length of each episode")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=20, help="per kind and concurrency")
+    parser.add_argument(
+        "--kinds", nargs="+", choices=("frame", "gif", "search"), default=["frame", "gif", "search"]
+    )
+    parser.add_argument("--gif-frames", type=int, default=48)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", type=Path, default=None, help="JSON report path, printed if omitted"
+    )
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    workdir = args.workdir.resolve()
+    if not in_workspace(workdir):
+        # database and video directory are bound when the bot modules are imported, so run
+        # again with them pointed at the workspace (this also keeps the real database safe)
+        workdir.mkdir(parents=True, exist_ok=True)
+        sys.exit(
+            subprocess.run(
+                [sys.executable, "-m", "cogs.mygo.bench", *sys.argv[1:]],
+                env=workspace_env(workdir),
+                check=False,
+            ).returncode
+        )
+
+    report = asyncio.run(run_benchmark(args))
+    if args.output is None:
+        print(report.model_dump_json(indent=2))
+    else:
+        args.output.write_text(report.model_dump_json(indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, TypeVar
+
+from core.classes import BaseClassMixin
+
+from .schema import FFProbeStream, ProbeCacheEntry, RenderCacheStats
+
+T = TypeVar("T")
+
+
+class RenderCache(BaseClassMixin):
+    """Two-tier cache for rendered frames and GIFs.
+
+    The memory tier is an LRU bounded by `max_memory_bytes`, the disk tier stores one file
+    per key under `directory` and evicts the least recently used files once
+    `max_disk_bytes` is exceeded. Items larger than a tier's capacity skip that tier.
+    """
+
+    def __init__(self, directory: Path, max_memory_bytes: int, max_disk_bytes: int):
+        super().__init__()
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes: int = 0
+        self._disk: OrderedDict[str, int] | None = None  # key -> file size, LRU order
+        self._disk_bytes: int = 0
+
+    @staticmethod
+    def make_key(*parts: object) -> str:
+        """Build content address from render parameters."""
+        return hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()
+
+    async def get(self, key: str) -> bytes | None:
+        if (data := self._memory.get(key)) is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return data
+
+        await self._load_disk_index()
+        if key in self._disk:
+            try:
+                data = await asyncio.to_thread(self._read, self._path(key))
+            except FileNotFoundError:
+                self._forget_disk(key)
+            else:
+                self._disk.move_to_end(key)
+                self._put_memory(key, data)
+                self.disk_hits += 1
+                return data
+
+        self.misses += 1
+        return None
+
+    async def open(self, key: str, count: bool = True) -> BinaryIO | None:
+        """Like `get`, but return a file object, items on disk are opened instead of read.
+
+        Hit statistics are not updated if `count` is False.
+        """
+        if (data := self._memory.get(key)) is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += count
+            return BytesIO(data)
+
+        await self._load_disk_index()
+        if key in self._disk:
+            try:
+                fp = await asyncio.to_thread(self._open, self._path(key))
+            except FileNotFoundError:
+                self._forget_disk(key)
+            else:
+                self._disk.move_to_end(key)
+                self.disk_hits += count
+                return fp
+
+        self.misses += count
+        return None
+
+    async def put(self, key: str, data: bytes):
+        self._put_memory(key, data)
+
+        await self._load_disk_index()
+        if len(data) > self.max_disk_bytes:
+            return
+
+        await asyncio.to_thread(self._write, self._path(key), data)
+        self._add_disk(key, len(data))
+
+    async def put_file(self, key: str, fp: BinaryIO):
+        """Like `put`, but copy from file object, only read it whole if it fits in memory tier.
+
+        `fp` is rewound afterwards.
+        """
+        size = fp.seek(0, os.SEEK_END)
+        fp.seek(0)
+        if size <= self.max_memory_bytes:
+            await self.put(key, fp.read())
+            fp.seek(0)
+            return
+
+        await self._load_disk_index()
+        if size > self.max_disk_bytes:
+            return
+
+        await asyncio.to_thread(self._write_file, self._path(key), fp)
+        fp.seek(0)
+        self._add_disk(key, size)
+
+    def _add_disk(self, key: str, size: int):
+        self._forget_disk(key)
+        self._disk[key] = size
+        self._disk_bytes += size
+
+        while self._disk_bytes > self.max_disk_bytes:
+            old_key, _ = next(iter(self._disk.items()))
+            self._forget_disk(old_key)
+            self._path(old_key).unlink(missing_ok=True)
+            self.logger.debug("Evicted %s from disk cache", old_key)
+
+    async def contains(self, key: str) -> bool:
+        """Check `key` without touching hit statistics or LRU order."""
+        await self._load_disk_index()
+        return key in self._memory or key in self._disk
+
+    def stats(self) -> RenderCacheStats:
+        return RenderCacheStats(
+            memory_hits=self.memory_hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+            memory_items=len(self._memory),
+            memory_bytes=self._memory_bytes,
+            disk_items=len(self._disk or ()),
+            disk_bytes=self._disk_bytes,
+        )
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.max_memory_bytes:
+            return
+
+        if (old := self._memory.pop(key, None)) is not None:
+            self._memory_bytes -= len(old)
+
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _forget_disk(self, key: str):
+        if (size := self._disk.pop(key, None)) is not None:
+            self._disk_bytes -= size
+
+    async def _load_disk_index(self):
+        """Scan existing cache files once, oldest access first."""
+        if self._disk is not None:
+            return
+
+        entries = await asyncio.to_thread(self._scan, self.directory)
+        self._disk = OrderedDict((path.name, stat.st_size) for path, stat in entries)
+        self._disk_bytes = sum(self._disk.values())
+        self.logger.info(
+            "Loaded %d cached renders (%d bytes) from %s",
+            len(self._disk),
+            self._disk_bytes,
+            self.directory,
+        )
+
+    @staticmethod
+    def _scan(directory: Path) -> list[tuple[Path, os.stat_result]]:
+        directory.mkdir(parents=True, exist_ok=True)
+        entries = [
+            (path, path.stat())
+            for path in directory.iterdir()
+            if path.is_file() and not path.name.endswith(".tmp")
+        ]
+        return sorted(entries, key=lambda entry: entry[1].st_atime)
+
+    @staticmethod
+    def _read(path: Path) -> bytes:
+        data = path.read_bytes()
+        os.utime(path)  # keep LRU order across restarts
+        return data
+
+    @staticmethod
+    def _open(path: Path) -> BinaryIO:
+        fp = path.open("rb")
+        os.utime(path)  # keep LRU order across restarts
+        return fp
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    @staticmethod
+    def _write_file(path: Path, fp: BinaryIO):
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with tmp_path.open("wb") as tmp_file:
+            shutil.copyfileobj(fp, tmp_file)
+        tmp_path.replace(path)
+
+
+class SingleFlight(BaseClassMixin):
+    """Share one in-flight job between concurrent callers with the same key."""
+
+    def __init__(self):
+        super().__init__()
+        self.shared: int = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[T]],
+        discard: Callable[[T], object] | None = None,
+    ) -> T:
+        """Run `func` unless a job with same key is running, then wait for that job instead.
+
+        The job is shielded so that a cancelled caller does not cancel it for the others.
+        If the caller that started the job is cancelled, `discard` is called with the result
+        of the job once it finishes, e.g. to close what only that caller would have used.
+        """
+        started = (future := self._inflight.get(key)) is None
+        if started:
+            future = asyncio.ensure_future(func())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+            self.logger.debug("Attached to in-flight job %s", key)
+
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if started and discard is not None:
+                future.add_done_callback(partial(self._discard, discard))
+            raise
+
+    @staticmethod
+    def _discard(discard: Callable[[T], object], future: asyncio.Future):
+        if not future.cancelled() and future.exception() is None:
+            discard(future.result())
+
+    def _finish(self, key: str, future: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not future.cancelled():
+            future.exception()  # mark as retrieved even if every caller was cancelled
+
+
+class ProbeCache(BaseClassMixin):
+    """Persist ffprobe results in a JSON file, keyed by video path, size and mtime."""
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = path
+        self._entries: dict[str, ProbeCacheEntry] | None = None
+
+    def get(self, video_path: Path) -> FFProbeStream | None:
+        entry = self._load().get(str(video_path))
+        stat = video_path.stat()
+        if entry is None or (entry.size, entry.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            return None
+
+        return entry.stream
+
+    def put(self, video_path: Path, stream: FFProbeStream):
+        stat = video_path.stat()
+        self._load()[str(video_path)] = ProbeCacheEntry(
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, stream=stream
+        )
+        self._save()
+
+    def _load(self) -> dict[str, ProbeCacheEntry]:
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            self._entries = {
+                path: ProbeCacheEntry.model_validate(entry) for path, entry in raw.items()
+            }
+        except FileNotFoundError:
+            pass
+        except ValueError as error:  # corrupted cache, probe again
+            self.logger.warning("Ignoring invalid probe cache %s: %s", self.path, error)
+
+        return self._entries
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        tmp_path.write_text(
+            json.dumps(
+                {path: entry.model_dump(mode="json") for path, entry in self._entries.items()}
+            ),
+            encoding="utf-8",
+        )
+        tmp_path.replace(self.path)
@@ -1,183 +1,321 @@
-from collections.abc import Callable
-from io import BytesIO
-from typing import Literal
-
-from discord import File, Interaction
-from discord.enums import ButtonStyle
-from discord.ext import commands
-from discord.ui import Button, Select
+import asyncio
+import re
+from pathlib import Path
+from typing import BinaryIO, Literal
+
+import ffmpeg
+from discord import Attachment, File, Guild, Interaction, Message
+from discord.app_commands import CommandInvokeError
+from discord.ext import commands, tasks
+from discord.ui import Button, DynamicItem, Select
+from discord.utils import DEFAULT_FILE_SIZE_LIMIT_BYTES
+from sqlalchemy.exc import SQLAlchemyError
 
 from cogs import CogsExtension
 from core.classes import CogsView
 
-from .const import PAGED_BY, IndexEnum
-from .schema import SentenceItem
-from .types import EpisodeChoices
+from .const import (
+    CLIP_EXTENSIONS,
+    MAX_ATTACHMENTS,
+    PAGED_BY,
+    PREWARM_INTERVAL,
+    SEARCH_QUERY_MAX_LENGTH,
+    SEARCH_STATE_PATTERN,
+    SUBTITLE_WATCH_INTERVAL,
+    TELEMETRY_FLUSH_INTERVAL,
+)
+from .quote import QuoteChannels, quote_matcher
+from .reload import SubtitleReloader
+from .render import RenderQueueFullError
+from .schema import SearchState, SentenceItem
+from .telemetry import stage
+from .types import AnimationFormat, ClipMedia, EpisodeChoices
 from .utils import SubtitleUtils
 
 
-class SubtitleView(CogsView):
-    def __init__(
-        self,
-        *,
-        text: str,
-        utils: SubtitleUtils,
-        timeout: float | None = 60.0,
-        page: int = 1,
-        episode: EpisodeChoices | None = None,
-    ):
-        """- self.children
-        0: PrevButton
-        1: NextButton
-        2: SubmitButton
-        3: ResponseSelect
-        4: SubtitleSelect
+def upload_limit(guild: Guild | None) -> int:
+    """Largest attachment size in bytes allowed in `guild` (or direct message if None)."""
+    return guild.filesize_limit if guild is not None else DEFAULT_FILE_SIZE_LIMIT_BYTES
 
-        """
-        super().__init__(timeout=timeout)
-        self.page = page
-        self.text = text
-        self.utils = utils
-        self.episode = episode
-
-        prev_button = Button(label="Previous", custom_id="previous", emoji="⬅️", disabled=True)
-        next_button = Button(label="Next", custom_id="next", emoji="➡️")
-        submit_button = Button(
-            label="Submit", custom_id="submit", emoji="✅", style=ButtonStyle.success
-        )
-        response_select = Select(placeholder="Select response")
-        response_select.add_option(label="Frame", value="frame")
-        response_select.add_option(label="Gif", value="gif")
-        subtitle_select = Select(placeholder="Select subtitle")
-
-        self.add(response_select, callback=self.update_response_value).add(
-            subtitle_select, callback=self.update_subtitle
-        ).add(prev_button, callback=self.prev_page).add(submit_button, callback=self.submit).add(
-            next_button, callback=self.next_page
-        )
 
-    async def prev_page(self, interaction: Interaction):
-        await interaction.response.defer()
-        prev_button: Button = self.children[IndexEnum.PREV]
-        next_button: Button = self.children[IndexEnum.NEXT]
-        self.page = max(self.page - 1, 1)
+def subtitle_caption(items: list[SentenceItem]) -> str | None:
+    """Subtitle text to send along with a frame or GIF, None if nothing is said."""
+    return "\n".join(f"{item.text} (segment {item.segment_id})" for item in items) or None
 
-        results, count = await self.utils.search_title_by_text(
-            self.text, self.episode, nth_page=self.page
-        )
 
-        start = (self.page - 1) * PAGED_BY + 1
-        end = self.page * PAGED_BY
-
-        prev_button.disabled = self.page == 1
-        next_button.disabled = count < end
-
-        self.update_subtitle_select(results)
-        await interaction.followup.edit_message(
-            message_id=interaction.message.id,
-            content=(
-                f"Paged {self.page}:\n"
-                f"Search {start} ~ {min(end, count)} of {count} results "
-                f"for `{self.text}` in episode `{self.episode or 'ALL'}`:\n\n"
-            ),
-            view=self,
-        )
+def render_error_message(error: Exception) -> str | None:
+    """Reply for errors users can fix or retry (bad input, busy queue), None for others."""
+    if isinstance(error, commands.BadArgument | RenderQueueFullError | ValueError):
+        return str(error)
 
-    async def next_page(self, interaction: Interaction):
-        await interaction.response.defer()
-        prev_button: Button = self.children[IndexEnum.PREV]
-        next_button: Button = self.children[IndexEnum.NEXT]
+    if isinstance(error, ffmpeg.Error):
+        return "Could not decode or render this media."
 
-        self.page += 1
-        results, count = await self.utils.search_title_by_text(
-            self.text, self.episode, nth_page=self.page
-        )
+    return None
 
-        start = (self.page - 1) * PAGED_BY + 1
-        end = self.page * PAGED_BY
-
-        prev_button.disabled = self.page == 1
-        next_button.disabled = count <= end
-
-        self.update_subtitle_select(results)
-        await interaction.followup.edit_message(
-            message_id=interaction.message.id,
-            content=(
-                f"Paged {self.page}:\n"
-                f"Search {start} ~ {min(end, count)} of {count} results "
-                f"for `{self.text}` in episode `{self.episode or 'ALL'}`:\n\n"
-            ),
-            view=self,
-        )
 
-    async def submit(self, interaction: Interaction):
-        await interaction.response.defer()
-        subtitle_select: Select = self.children[IndexEnum.SUBTITLE]
-        response_select: Select = self.children[IndexEnum.RESPONSE]
+def cog_utils(interaction: Interaction) -> SubtitleUtils:
+    return interaction.client.get_cog("SubtitleCMD").utils
 
-        segment_id = subtitle_select.values[0].split(", ")[1]
-        response_type = response_select.values[0]
 
-        if response_type not in ("frame", "gif"):
-            raise commands.BadArgument("Invalid response type.")
+async def search_message(
+    utils: SubtitleUtils, state: SearchState
+) -> tuple[str, "SubtitleView | None"]:
+    """Content and components of a search message showing `state.page` of results."""
+    cursor = await utils.open_cursor(state.query, state.episode, state.fuzzy)
+    if cursor.count == 0:
+        return f"No result found for `{state.query}` in episode `{state.episode or 'ALL'}`", None
 
-        subtitle_item = await self.utils.get_item_by_segment_id(segment_id)
+    if state.page > (pages := cursor.pages()):
+        # keep page numbers in custom_id of components as short as the results
+        state = state.model_copy(update={"page": pages})
 
-        if response_type == "frame":
-            result = await self.utils.extract_frame(
-                subtitle_item.episode, subtitle_item.frame_start
-            )
-            extension = "png"
-        else:
-            result: BytesIO = await self.utils.extract_gif(
-                subtitle_item.episode, subtitle_item.frame_start, subtitle_item.frame_end
-            )
-            extension = "gif"
+    results = await utils.fetch_page(cursor, state.page)
+    start = (state.page - 1) * PAGED_BY + 1  # 1-indexed
+    end = min(cursor.count, start + len(results) - 1)
+    content = (
+        f"Paged {state.page}:\n"
+        f"Search {start} ~ {end} of {cursor.count} results "
+        f"for `{state.query}` in episode `{state.episode or 'ALL'}`"
+    )
+    return content, SubtitleView(state, results, has_next=end < cursor.count)
+
+
+async def edit_search_message(interaction: Interaction, state: SearchState):
+    await interaction.response.defer()
+    content, view = await search_message(cog_utils(interaction), state)
+    await interaction.followup.edit_message(
+        message_id=interaction.message.id, content=content, view=view
+    )
 
-        await interaction.followup.send(
-            file=File(result, filename=f"{segment_id}-{response_type}.{extension}"),
+
+class PageButton(DynamicItem[Button], template=f"mygo:page:{SEARCH_STATE_PATTERN}"):
+    """Previous / next page button, custom_id holds the state of the page it goes to."""
+
+    def __init__(self, state: SearchState, label: str, emoji: str, disabled: bool = False):
+        super().__init__(
+            Button(label=label, emoji=emoji, disabled=disabled, custom_id=state.encode("mygo:page"))
         )
+        self.state = state
 
-    async def update_response_value(self, interaction: Interaction):
-        await interaction.response.defer()
-        response_select: Select = self.children[IndexEnum.RESPONSE]
-        response_select.placeholder = f"Selected: {response_select.values[0]}"
-        await interaction.followup.edit_message(message_id=interaction.message.id, view=self)
+    @classmethod
+    async def from_custom_id(
+        cls, interaction: Interaction, item: Button, match: re.Match[str]
+    ) -> "PageButton":
+        return cls(SearchState.decode(match), item.label, item.emoji)
 
-    async def update_subtitle(self, interaction: Interaction):
-        await interaction.response.defer()
-        subtitle_select: Select = self.children[IndexEnum.SUBTITLE]
-        text = subtitle_select.values[0].split(", ")[0]
-        subtitle_select.placeholder = f"Selected: {text}"
-        await interaction.followup.edit_message(message_id=interaction.message.id, view=self)
-
-    def add(self, item: Select | Button, callback: Callable | None = None) -> "SubtitleView":
-        self.add_item(item)
-        if callback:
-            item.callback = callback
-
-        return self
-
-    def update_subtitle_select(self, items: list[SentenceItem]) -> "SubtitleView":
-        subtitle_select: Select = self.children[IndexEnum.SUBTITLE]
-        subtitle_select.options = []  # clear all options
-        for item in items:
-            subtitle_select.add_option(
-                label=f"{item.text}",
+    async def callback(self, interaction: Interaction):
+        await edit_search_message(interaction, self.state)
+
+
+class ResponseSelect(DynamicItem[Select], template=f"mygo:response:{SEARCH_STATE_PATTERN}"):
+    """Select response type, the page is shown again with the subtitle select switched."""
+
+    def __init__(self, state: SearchState):
+        select = Select(
+            placeholder=f"Selected: {state.response}",
+            custom_id=state.encode("mygo:response"),
+        )
+        select.add_option(label="Frame", value="frame", default=state.response == "frame")
+        select.add_option(label="Gif", value="gif", default=state.response == "gif")
+        super().__init__(select)
+        self.state = state
+
+    @classmethod
+    async def from_custom_id(
+        cls, interaction: Interaction, item: Select, match: re.Match[str]
+    ) -> "ResponseSelect":
+        return cls(SearchState.decode(match))
+
+    async def callback(self, interaction: Interaction):
+        response = self.item.values[0]
+        if response not in ("frame", "gif"):
+            raise commands.BadArgument("Invalid response type.")
+
+        await edit_search_message(interaction, self.state.model_copy(update={"response": response}))
+
+
+class SubtitleSelect(DynamicItem[Select], template=r"mygo:subtitle:(?P<response>frame|gif)"):
+    """Select subtitle to get its frame or gif, the only state needed is response type."""
+
+    def __init__(self, response: str, items: list[SentenceItem] | None = None):
+        select = Select(placeholder="Select subtitle", custom_id=f"mygo:subtitle:{response}")
+        for item in items or []:
+            select.add_option(
+                label=item.text,
                 description=(
                     f"Episode {item.episode} - {item.frame_start} ~ {item.frame_end} "
                     f"(segment {item.segment_id})"
                 ),
-                value=f"{item.text}, {item.segment_id}",
+                value=str(item.segment_id),
+            )
+        super().__init__(select)
+        self.response = response
+
+    @classmethod
+    async def from_custom_id(
+        cls, interaction: Interaction, item: Select, match: re.Match[str]
+    ) -> "SubtitleSelect":
+        return cls(match["response"])
+
+    async def callback(self, interaction: Interaction):
+        await interaction.response.defer()
+        try:
+            await self._send(interaction)
+        except Exception as e:
+            if (message := render_error_message(e)) is None:
+                raise
+
+            await interaction.followup.send(message, ephemeral=True)
+
+    async def _send(self, interaction: Interaction):
+        utils = cog_utils(interaction)
+        segment_id = int(self.item.values[0])
+        subtitle_item = await utils.get_item_by_segment_id(segment_id)
+        if subtitle_item is None:
+            raise commands.BadArgument(f"Segment ID {segment_id} not found.")
+
+        utils.popularity.hit(segment_id)
+        frames = subtitle_item.frame_end - subtitle_item.frame_start + 1
+        kind = "frame" if self.response == "frame" else "gif"
+        with utils.telemetry.trace(kind, subtitle_item.episode, frames) as trace:
+            if self.response == "frame":
+                result = await utils.extract_frame(subtitle_item.episode, subtitle_item.frame_start)
+                extension = "png"
+            else:
+                result: BinaryIO = await utils.extract_animation(
+                    subtitle_item.episode,
+                    subtitle_item.frame_start,
+                    subtitle_item.frame_end,
+                    max_bytes=upload_limit(interaction.guild),
+                )
+                extension = "gif"
+
+            trace.measure(result)
+            with stage("upload"):
+                await interaction.followup.send(
+                    file=File(result, filename=f"{segment_id}-{self.response}.{extension}"),
+                )
+
+
+class SubtitleView(CogsView):
+    """Components of a search message, stateless so they keep working after a restart.
+
+    Every component is a `DynamicItem` with its state in custom_id, the bot dispatches
+    interactions by matching custom_id against their templates, so no view is kept per
+    message.
+    """
+
+    def __init__(self, state: SearchState, items: list[SentenceItem], has_next: bool):
+        super().__init__(timeout=None)
+        self.add_item(ResponseSelect(state))
+        self.add_item(SubtitleSelect(state.response, items))
+        self.add_item(
+            PageButton(
+                state.model_copy(update={"page": state.page - 1}),
+                label="Previous",
+                emoji="⬅️",
+                disabled=state.page == 1,
+            )
+        )
+        self.add_item(
+            PageButton(
+                state.model_copy(update={"page": state.page + 1}),
+                label="Next",
+                emoji="➡️",
+                disabled=not has_next,
             )
+        )
 
-        return self
+
+SEARCH_ITEMS = (PageButton, ResponseSelect, SubtitleSelect)
 
 
 class SubtitleCMD(CogsExtension):
     def __init__(self, bot, *args, **kwargs):
         super().__init__(bot, *args, **kwargs)
         self.utils = SubtitleUtils()
+        self.background_tasks: set[asyncio.Task] = set()
+        self.quote_channels = QuoteChannels()
+        self.subtitle_reloader = SubtitleReloader(Path.cwd() / "json_data" / "mygo_detail.json")
+
+    async def cog_load(self):
+        await self.quote_channels.load()
+        task = asyncio.create_task(self.utils.warm_keyframes())
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        self.prewarm.start()
+        self.bot.add_dynamic_items(*SEARCH_ITEMS)
+        self.watch_subtitles.start()
+        await self.utils.telemetry.load()
+        self.flush_telemetry.start()
+
+    async def cog_unload(self):
+        for task in self.background_tasks:
+            task.cancel()
+        self.prewarm.cancel()
+        self.bot.remove_dynamic_items(*SEARCH_ITEMS)
+        self.watch_subtitles.cancel()
+        self.flush_telemetry.cancel()
+        await self.utils.telemetry.flush()
+        self.utils.popularity.save()
+
+    async def cog_command_error(self, ctx: commands.Context, error: Exception):
+        original = error
+        while isinstance(
+            original,
+            commands.CommandInvokeError | commands.HybridCommandError | CommandInvokeError,
+        ):
+            original = original.original
+
+        if (message := render_error_message(original)) is None:
+            return await super().cog_command_error(ctx, error)
+
+        self.logger.warning("Command `%s` failed: %r", ctx.command.qualified_name, original)
+        return await ctx.send(message, ephemeral=True)
+
+    @tasks.loop(seconds=PREWARM_INTERVAL)
+    async def prewarm(self):
+        """Render popular segments ahead of time while the bot is idle."""
+        await self.utils.prewarm()
+
+    @tasks.loop(seconds=SUBTITLE_WATCH_INTERVAL)
+    async def watch_subtitles(self):
+        """Apply changes of the subtitle data file without restarting."""
+        await self.subtitle_reloader.check()
+
+    @tasks.loop(seconds=TELEMETRY_FLUSH_INTERVAL)
+    async def flush_telemetry(self):
+        """Save render timings collected since last flush."""
+        try:
+            await self.utils.telemetry.flush()
+        except SQLAlchemyError as error:
+            # timings are kept for the next flush, the loop must keep running
+            self.logger.warning("Failed to save render timings: %s", error)
+
+    @commands.Cog.listener()
+    async def on_message(self, message: Message):
+        """Reply frame of the subtitle quoted in a message, in channels with auto-quote."""
+        if message.author.bot or message.channel.id not in self.quote_channels.enabled:
+            return
+
+        if (segment_id := await quote_matcher.match(message.content)) is None:
+            return
+
+        if not self.quote_channels.acquire(message.channel.id):
+            return
+
+        # subtitle may be removed by an import since the automaton was compiled
+        if (item := await self.utils.get_item_by_segment_id(segment_id)) is None:
+            return
+
+        frame_io = await self.utils.extract_frame(item.episode, item.frame_start)
+        self.utils.popularity.hit(segment_id)
+        await message.reply(
+            f"{item.text} (episode {item.episode}, segment {segment_id})",
+            file=File(frame_io, filename=f"{item.episode}-{item.frame_start}.png"),
+            mention_author=False,
+        )
 
     # use custom prefix `!!!!!`
     @commands.hybrid_group(ephemeral=True)
@@ -192,8 +330,33 @@ class SubtitleCMD(CogsExtension):
         frame: int,
     ):
         """Get image at specific frame from video."""
-        frame_io: BytesIO = await self.utils.extract_frame(episode, frame)
-        await ctx.send(file=File(frame_io, filename=f"{episode}-{frame}.png"))
+        with self.utils.telemetry.trace("frame", episode) as trace:
+            frame_io: BinaryIO = await self.utils.extract_frame(episode, frame)
+            items = await self.utils.get_items_at_frame(episode, frame)
+            trace.measure(frame_io)
+            with stage("upload"):
+                await ctx.send(
+                    subtitle_caption(items), file=File(frame_io, filename=f"{episode}-{frame}.png")
+                )
+
+    @mygo.command(name="at")
+    async def subtitle_at(
+        self,
+        ctx: commands.Context,
+        episode: EpisodeChoices,
+        frame: int,
+    ):
+        """Show what is being said at specific frame of video."""
+        items = await self.utils.get_items_at_frame(episode, frame)
+        if not items:
+            return await ctx.send(f"Nothing is said at frame {frame} of episode {episode}.")
+
+        return await ctx.send(
+            "\n".join(
+                f"{item.text} (segment {item.segment_id}, {item.frame_start} ~ {item.frame_end})"
+                for item in items
+            )
+        )
 
     @mygo.command(name="gif")
     async def extract_gif(
@@ -202,13 +365,76 @@ class SubtitleCMD(CogsExtension):
         episode: EpisodeChoices,
         start: int,
         end: int,
+        output_format: AnimationFormat = "gif",
     ):
-        """Get gif from start to end frame from video."""
+        """Get gif from start to end frame from video.
+
+        `output_format` can also be animated webp or mp4. Resolution, frame rate and quality
+        are lowered as needed to fit the upload limit of this server.
+        """
         await ctx.interaction.response.defer()
-        gif_io: BytesIO = await self.utils.extract_gif(episode, start, end)
-        await ctx.interaction.followup.send(
-            file=File(gif_io, filename=f"{episode}-{start}-{end}.gif")
-        )
+        # reversed ranges render backwards, as many frames
+        with self.utils.telemetry.trace(output_format, episode, abs(end - start) + 1) as trace:
+            animation_io: BinaryIO = await self.utils.extract_animation(
+                episode,
+                start,
+                end,
+                output_format,
+                max_bytes=upload_limit(ctx.guild),
+            )
+            extension = "png" if start == end else output_format
+            items = await self.utils.get_items_in_range(episode, start, end)
+            trace.measure(animation_io)
+            with stage("upload"):
+                await ctx.interaction.followup.send(
+                    subtitle_caption(items),
+                    file=File(animation_io, filename=f"{episode}-{start}-{end}.{extension}"),
+                )
+
+    @mygo.command(name="clip")
+    async def extract_clip(
+        self,
+        ctx: commands.Context,
+        episode: EpisodeChoices,
+        start: int,
+        end: int,
+    ):
+        """Get MP4 video clip with sound from start to end frame from video."""
+        await self._send_clip(ctx, episode, start, end, "video")
+
+    @mygo.command(name="audio")
+    async def extract_audio(
+        self,
+        ctx: commands.Context,
+        episode: EpisodeChoices,
+        start: int,
+        end: int,
+    ):
+        """Get M4A audio clip from start to end frame from video."""
+        await self._send_clip(ctx, episode, start, end, "audio")
+
+    async def _send_clip(
+        self, ctx: commands.Context, episode: EpisodeChoices, start: int, end: int, media: ClipMedia
+    ):
+        await ctx.interaction.response.defer()
+        with self.utils.telemetry.trace(media, episode, end - start + 1) as trace:
+            try:
+                clip_io = await self.utils.extract_clip(episode, start, end, media)
+            except ValueError as e:
+                raise commands.BadArgument(str(e)) from e
+
+            trace.measure(clip_io)
+            if trace.output_bytes > upload_limit(ctx.guild):
+                clip_io.close()
+                raise commands.BadArgument("Clip is too large to upload, try a shorter range.")
+
+            items = await self.utils.get_items_in_range(episode, start, end)
+            extension = CLIP_EXTENSIONS[media]
+            with stage("upload"):
+                await ctx.interaction.followup.send(
+                    subtitle_caption(items),
+                    file=File(clip_io, filename=f"{episode}-{start}-{end}.{extension}"),
+                )
 
     @mygo.command(name="search")
     async def search_subtitles(
@@ -217,55 +443,211 @@ class SubtitleCMD(CogsExtension):
         query: str,
         episode: EpisodeChoices | None = None,
         nth_page: int = 1,
+        mode: Literal["exact", "fuzzy"] = "exact",
     ):
-        """Search subtitles by query, then return the result as custom string."""
-        results, count = await self.utils.search_title_by_text(query, episode, nth_page=nth_page)
-        if count == 0:
-            return await ctx.send(f"No result found for `{query}` in episode `{episode or 'ALL'}`")
-        start = max(1, (nth_page - 1) * PAGED_BY + 1)  # 1-indexed
-        end = min(count, start + len(results) - 1)
-
-        subtitle_view = SubtitleView(text=query, episode=episode, page=nth_page, utils=self.utils)
-        subtitle_view.children[IndexEnum.PREV].disabled = nth_page == 1
-        subtitle_view.children[IndexEnum.NEXT].disabled = count <= end
-
-        subtitle_view.update_subtitle_select(results)
+        """Search subtitles by query, then return the result as custom string.
+
+        `fuzzy` mode ignores punctuation and variant characters and ranks best matches first.
+        """
+        if len(query) > SEARCH_QUERY_MAX_LENGTH:
+            raise commands.BadArgument(
+                f"Query must be at most {SEARCH_QUERY_MAX_LENGTH} characters long."
+            )
+        if nth_page < 1:
+            raise commands.BadArgument("Page number must be at least 1.")
+
+        state = SearchState(query=query, episode=episode, page=nth_page, fuzzy=mode == "fuzzy")
+        content, view = await search_message(self.utils, state)
+        if view is None:
+            return await ctx.send(content)
+
+        return await ctx.send(content, view=view)
+
+    @mygo.command(name="batch")
+    async def render_batch(
+        self,
+        ctx: commands.Context,
+        segment_ids: str,
+        response_format: Literal["frame", "gif"] = "frame",
+    ):
+        """Get frames or gifs of several segments at once, segment ids separated by comma."""
+        await ctx.interaction.response.defer()
+        try:
+            ids = list(dict.fromkeys(int(segment_id) for segment_id in segment_ids.split(",")))
+        except ValueError as e:
+            raise commands.BadArgument("Segment IDs must be integers separated by comma.") from e
+
+        if len(ids) > MAX_ATTACHMENTS:
+            raise commands.BadArgument(f"At most {MAX_ATTACHMENTS} segments at once.")
+
+        results = await self.utils.render_segments(ids, response_format)
+        if not results:
+            raise commands.BadArgument(f"Segment IDs {segment_ids} not found.")
+
+        for segment_id in results:
+            self.utils.popularity.hit(segment_id)
+
+        extension = "png" if response_format == "frame" else "gif"
+        await ctx.interaction.followup.send(
+            files=[
+                File(result, filename=f"{segment_id}-{response_format}.{extension}")
+                for segment_id, result in results.items()
+            ]
+        )
+
+    @mygo.command(name="sheet")
+    async def extract_sheet(
+        self,
+        ctx: commands.Context,
+        segment_id: int,
+        columns: int = 4,
+        rows: int = 4,
+    ):
+        """Get a contact sheet of evenly spaced frames of a segment, labeled by frame number."""
+        await ctx.interaction.response.defer()
+        sheet_io = await self.utils.extract_sheet(segment_id, columns, rows)
+        await ctx.interaction.followup.send(
+            file=File(sheet_io, filename=f"{segment_id}-{columns}x{rows}.jpg")
+        )
+
+    @mygo.command(name="whereis")
+    async def whereis(self, ctx: commands.Context, image: Attachment):
+        """Find episode and frame of a screenshot, with the subtitle shown on it."""
+        await ctx.interaction.response.defer()
+        if not (image.content_type or "").startswith("image/"):
+            raise commands.BadArgument("Attachment must be an image.")
+
+        try:
+            results = await self.utils.whereis(await image.read())
+        except ValueError as e:
+            raise commands.BadArgument(str(e)) from e
+
+        if not results:
+            raise commands.BadArgument("No matching frame found.")
+
+        lines = [
+            f"Episode {match.episode} frame {match.frame} (distance {match.distance}): "
+            + (", ".join(f"{item.text} ({item.segment_id})" for item in items) or "no subtitle")
+            for match, items in results
+        ]
+        best = results[0][0]
+        frame = await self.utils.extract_frame(best.episode, best.frame)
+        await ctx.interaction.followup.send(
+            "\n".join(lines), file=File(frame, filename=f"{best.episode}-{best.frame}.png")
+        )
+
+    @mygo.command(name="autoquote")
+    @commands.has_guild_permissions(manage_channels=True)
+    async def auto_quote(self, ctx: commands.Context, enabled: bool):
+        """Enable or disable replying frames of subtitles quoted in this channel."""
+        await self.quote_channels.set_enabled(ctx.channel.id, enabled)
+        await ctx.send(f"Auto-quote is {'enabled' if enabled else 'disabled'} in this channel.")
+
+    @mygo.command(name="queue")
+    async def render_queue_stats(self, ctx: commands.Context):
+        """Show render queue depth and wait time."""
+        stats = self.utils.render_queue.stats()
+        await ctx.send(
+            f"Render queue: {stats.running}/{stats.concurrency} running, "
+            f"{stats.waiting}/{stats.max_pending} waiting\n"
+            f"Completed: {stats.completed}, Failed: {stats.failed}\n"
+            f"Wait time: avg {stats.avg_wait:.2f}s, max {stats.max_wait:.2f}s"
+        )
+
+    @mygo.command(name="cache")
+    async def render_cache_stats(self, ctx: commands.Context):
+        """Show render cache hit rate and size."""
+        stats = self.utils.render_cache.stats()
+        warm = self.utils.warm_store.stats()
+        total = stats.memory_hits + stats.disk_hits + stats.misses
+        hit_rate = (stats.memory_hits + stats.disk_hits) / total if total else 0.0
         await ctx.send(
-            f"Search {start} ~ {end} of {count} results"
-            f"for `{query}` in episode `{episode or 'ALL'}`",
-            view=subtitle_view,
-            delete_after=subtitle_view.timeout,
+            f"Render cache: hit rate {hit_rate:.1%} "
+            f"(memory {stats.memory_hits}, disk {stats.disk_hits}, miss {stats.misses})\n"
+            f"Memory: {stats.memory_items} items, {stats.memory_bytes / 1024**2:.1f}MB\n"
+            f"Disk: {stats.disk_items} items, {stats.disk_bytes / 1024**2:.1f}MB\n"
+            f"Deduplicated renders: {self.utils.render_flight.shared}\n"
+            f"Warm store: {warm.disk_items} items, {warm.disk_bytes / 1024**2:.1f}MB, "
+            f"{warm.disk_hits} hits"
         )
 
+    @mygo.command(name="telemetry")
+    @commands.is_owner()
+    async def render_telemetry(
+        self,
+        ctx: commands.Context,
+        kind: Literal["frame", "gif", "webp", "mp4", "video", "audio"] | None = None,
+        episode: EpisodeChoices | None = None,
+    ):
+        """Show p50 / p95 duration of every render stage, and of whole renders per episode."""
+        traces = self.utils.telemetry.select(kind, episode)
+        if not traces:
+            return await ctx.send("No renders recorded yet.")
+
+        cached = sum(trace.cached for trace in traces)
+        lines = [
+            f"{len(traces)} renders ({cached} cached)",
+            f"{'stage':<12}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}",
+        ]
+        lines.extend(
+            f"{stats.name:<12}{stats.count:>7}{stats.p50 * 1000:>10.1f}{stats.p95 * 1000:>10.1f}"
+            for stats in self.utils.telemetry.stage_stats(traces)
+        )
+        lines.append(f"{'episode':<12}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}")
+        lines.extend(
+            f"{stats.name:<12}{stats.count:>7}{stats.p50 * 1000:>10.1f}{stats.p95 * 1000:>10.1f}"
+            for stats in self.utils.telemetry.episode_stats(traces)
+        )
+        return await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
     @mygo.command("segment")
     async def search_segment(
         self,
         ctx: commands.Context,
         segment_id: int,
-        response_format: Literal["frame", "gif"] = "frame",
+        response_format: Literal["frame", "gif", "webp", "mp4"] = "frame",
+        snap: bool = False,
     ):
-        """Search subtitle by segment_id."""
+        """Search subtitle by segment_id.
+
+        With `snap`, animation is trimmed to the scene cuts near its ends.
+        """
         await ctx.interaction.response.defer()
         result = await self.utils.get_item_by_segment_id(segment_id)
         result.episode = result.episode or "ALL"
         if result is None:
             raise commands.BadArgument(f"Segment ID {segment_id} not found.")
 
-        if response_format not in ("frame", "gif"):
-            raise commands.BadArgument("Invalid response format.")
+        self.utils.popularity.hit(segment_id)
 
-        if response_format == "gif":
-            file = await self.utils.extract_gif(
-                result.episode, result.frame_start, result.frame_end
-            )
-            filename = f"{result.episode}-{result.frame_start}-{result.frame_end}.gif"
-
-        else:
-            file = await self.utils.extract_frame(result.episode, result.frame_start)
-            filename = f"{result.episode}-{result.frame_start}.png"
+        if response_format not in ("frame", "gif", "webp", "mp4"):
+            raise commands.BadArgument("Invalid response format.")
 
-        return await ctx.interaction.followup.send(
-            f"Result for segment_id {segment_id}"
-            f"({result.text} at {result.episode}\n({result.frame_start} ~ {result.frame_end}))",
-            file=File(file, filename=filename),
-        )
+        start, end = result.frame_start, result.frame_end
+        if response_format != "frame" and snap:
+            start, end = await self.utils.snap_to_cuts(result.episode, start, end)
+
+        frames = 1 if response_format == "frame" else abs(end - start) + 1
+        with self.utils.telemetry.trace(response_format, result.episode, frames) as trace:
+            if response_format != "frame":
+                file = await self.utils.extract_animation(
+                    result.episode,
+                    start,
+                    end,
+                    response_format,
+                    max_bytes=upload_limit(ctx.guild),
+                )
+                filename = f"{result.episode}-{start}-{end}.{response_format}"
+
+            else:
+                file = await self.utils.extract_frame(result.episode, result.frame_start)
+                filename = f"{result.episode}-{result.frame_start}.png"
+
+            trace.measure(file)
+            with stage("upload"):
+                await ctx.interaction.followup.send(
+                    f"Result for segment_id {segment_id}"
+                    f"({result.text} at {result.episode}\n"
+                    f"({result.frame_start} ~ {result.frame_end}))",
+                    file=File(file, filename=filename),
+                )
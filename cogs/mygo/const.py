@@ -1,17 +1,165 @@
-from enum import IntEnum
+from pathlib import Path
+
+from config import MyGOConfig
 
 PAGED_BY: int = 25
+NGRAM_SIZE: int = 2
+
+# fuzzy search: BM25 parameters and number of ranked results
+BM25_K1: float = 1.2
+BM25_B: float = 0.75
+FUZZY_LIMIT: int = 100
+# unicode categories (first letter) dropped before fuzzy matching:
+# punctuation, symbol, separator and control characters
+IGNORED_CATEGORIES: str = "PSZC"
+# simplified / variant characters folded into their traditional form for fuzzy matching
+VARIANT_CHARACTERS: str = (
+    "妳祢裏着为么吗们这个来说对时会没还过样乐队爱见听让谢请话该觉后灯团边开关门问"
+    "间头学长东车儿发现经给点实无与种从动难谁认识记忆欢约终于亲气电练习弹贝词组场"
+    "员岁写读书体办买卖饭机帮应当坏错梦声远别讨厌辞脸吓怀丢够选决热颜礼孙赢输钢"
+)
+TRADITIONAL_CHARACTERS: str = (
+    "你你裡著為麼嗎們這個來說對時會沒還過樣樂隊愛見聽讓謝請話該覺後燈團邊開關門問"
+    "間頭學長東車兒發現經給點實無與種從動難誰認識記憶歡約終於親氣電練習彈貝詞組場"
+    "員歲寫讀書體辦買賣飯機幫應當壞錯夢聲遠別討厭辭臉嚇懷丟夠選決熱顏禮孫贏輸鋼"
+)
+
 HEIGHT: int = 480
+VIDEO_DIR: Path = MyGOConfig.VIDEO_DIR
+
+# proxy videos for GIF rendering: 480p with a keyframe every PROXY_GOP frames
+PROXY_HEIGHT: int = 480
+PROXY_GOP: int = 12
+
+# size-adaptive encoding: (width, fps or None for source rate, quality level 0-100),
+# ordered from best to smallest output
+ENCODE_LADDER: tuple[tuple[int, float | None, int], ...] = (
+    (HEIGHT, None, 100),
+    (HEIGHT, None, 70),
+    (360, 15, 70),
+    (320, 12, 50),
+    (240, 10, 50),
+    (160, 10, 40),
+)
+# initial bytes per frame per squared output width of each format at quality level 100
+ENCODE_PRIOR: dict[str, float] = {"gif": 0.17, "webp": 0.04, "mp4": 0.015}
+# weight of the newest observation in the bytes-per-frame estimate
+ENCODE_LEARNING_RATE: float = 0.3
+# aim below the size limit since the estimate is never exact
+ENCODE_SAFETY: float = 0.9
+ENCODE_MAX_PASSES: int = 2
+
+# segments of a batch closer than this (in seconds) are rendered from one decoded stream
+BATCH_MAX_GAP: float = 10.0
+# attachments allowed in one Discord message
+MAX_ATTACHMENTS: int = 10
+
+# contact sheet: width of each tile and largest number of columns / rows
+SHEET_TILE_WIDTH: int = 320
+SHEET_MAX_GRID: int = 6
+
+# video / audio clips: longest range in seconds, container of each media, and x264 settings
+# of the re-encode used when a video range does not line up with keyframes
+CLIP_MAX_SECONDS: float = 60.0
+CLIP_EXTENSIONS: dict[str, str] = {"video": "mp4", "audio": "m4a"}
+CLIP_PRESET: str = "veryfast"
+CLIP_CRF: int = 23
+
+# columns of sentence table that come from the subtitle data file
+SUBTITLE_FIELDS: set[str] = {"text", "episode", "frame_start", "frame_end", "segment_id"}
+# seconds between checks of the subtitle data file for changes
+SUBTITLE_WATCH_INTERVAL: float = 5.0
+
+# auto-quote: subtitles shorter than QUOTE_MIN_LENGTH folded characters are too common to
+# quote, a channel is replied at most once every QUOTE_COOLDOWN seconds
+QUOTE_MIN_LENGTH: int = 5
+QUOTE_COOLDOWN: float = 30.0
+
+# reverse image search: every PHASH_STEP-th frame is downscaled to PHASH_SAMPLE_SIZE squared
+# grayscale and hashed by its PHASH_BITS x PHASH_BITS lowest DCT frequencies (64-bit hash),
+# matches are hashes at most PHASH_MAX_DISTANCE bits different
+PHASH_STEP: int = 6
+PHASH_SAMPLE_SIZE: int = 32
+PHASH_BITS: int = 8
+PHASH_MAX_DISTANCE: int = 12
+PHASH_MAX_MATCHES: int = 3
+
+# scene cuts: frames are downscaled to SCENE_SAMPLE_WIDTH x SCENE_SAMPLE_HEIGHT grayscale, a
+# mean absolute difference (0 ~ 1) above SCENE_THRESHOLD from the previous frame is a cut,
+# unless the last cut is less than SCENE_MIN_SHOT frames before. Ranges are snapped to cuts
+# at most SCENE_SNAP_WINDOW frames inside them.
+SCENE_SAMPLE_WIDTH: int = 64
+SCENE_SAMPLE_HEIGHT: int = 36
+SCENE_THRESHOLD: float = 0.12
+SCENE_MIN_SHOT: int = 6
+SCENE_SNAP_WINDOW: int = 12
+SCENE_CHUNK_FRAMES: int = 1024
+
+# bytes read from ffmpeg stdout at once when streaming render output
+STREAM_CHUNK_SIZE: int = 64 * 1024
+
+# number of recent queue wait times kept for statistics
+WAIT_SAMPLE_SIZE: int = 100
 
 MICROSECOND: int = 1000
 SECOND: int = 1
 MINUTE: int = 60
 HOUR: int = 3600
 
+# how long a search result is reused for paging before searching again, and how many
+# recent search results are kept
+CURSOR_TTL: float = 5 * MINUTE
+CURSOR_CACHE_SIZE: int = 128
+
+# search messages keep their state in custom_id of components (at most 100 characters):
+# "{page}:{response}:{fuzzy}:{episode}:{query}", queries are limited to fit
+SEARCH_STATE_PATTERN: str = (
+    r"(?P<page>\d+):(?P<response>[fg]):(?P<fuzzy>[01]):(?P<episode>[0-9-]*):(?P<query>.+)"
+)
+SEARCH_QUERY_MAX_LENGTH: int = 64
+
+# request counts of segments are halved every POPULARITY_HALF_LIFE seconds,
+# and forgotten below POPULARITY_MIN_SCORE
+POPULARITY_HALF_LIFE: float = 24 * HOUR
+POPULARITY_MIN_SCORE: float = 0.05
+# prewarm frame and GIF of the PREWARM_TOP_K most requested segments every PREWARM_INTERVAL
+# seconds, unless 1-minute load per CPU or temperature (°C) is above the limits
+PREWARM_TOP_K: int = 30
+PREWARM_INTERVAL: float = 10 * MINUTE
+PREWARM_MAX_LOAD: float = 0.5
+PREWARM_MAX_TEMPERATURE: float = 60.0
+
+# render telemetry: stages timed for every render (see `RenderTelemetry`), number of recent
+# renders kept in memory, and seconds between writes to database
+RENDER_STAGES: tuple[str, ...] = (
+    "lookup",
+    "queue",
+    "first_byte",
+    "ffmpeg",
+    "store",
+    "upload",
+    "total",
+)
+TELEMETRY_RING_SIZE: int = 1000
+TELEMETRY_FLUSH_INTERVAL: float = MINUTE
 
-class IndexEnum(IntEnum):
-    RESPONSE = 0
-    SUBTITLE = 1
-    PREV = 2
-    SUBMIT = 3
-    NEXT = 4
+# benchmark: synthetic episodes have the resolution, frame rate and keyframe interval of the
+# real ones, with a subtitle line made of BENCH_VOCABULARY words every BENCH_SUBTITLE_SECONDS
+BENCH_VIDEO_SIZE: str = "854x480"
+BENCH_FRAME_RATE: float = 23.976
+BENCH_GOP: int = 240
+BENCH_SUBTITLE_SECONDS: float = 2.0
+BENCH_VOCABULARY: tuple[str, ...] = (
+    "春日影",
+    "為什麼",
+    "一輩子",
+    "樂團",
+    "迷子",
+    "小祥",
+    "燈",
+    "立希",
+    "愛音",
+    "睦",
+    "樂奈",
+    "演奏",
+)
@@ -0,0 +1,98 @@
+import ffmpeg
+
+from core.classes import BaseClassMixin
+
+from .const import ENCODE_LADDER, ENCODE_LEARNING_RATE, ENCODE_PRIOR, ENCODE_SAFETY
+from .schema import EncodeProfile
+from .types import AnimationFormat
+
+
+def ladder(output_format: AnimationFormat) -> list[EncodeProfile]:
+    """Encoding profiles of `output_format`, ordered from best to smallest output."""
+    return [
+        EncodeProfile(output_format=output_format, width=width, fps=fps, level=level)
+        for width, fps, level in ENCODE_LADDER
+    ]
+
+
+def encode(
+    stream: ffmpeg.nodes.FilterableStream,
+    profile: EncodeProfile,
+    frame_rate: float,
+    output: str = "pipe:",
+) -> ffmpeg.nodes.OutputStream:
+    """Scale, resample and encode `stream` with `profile`, written to `output` (stdout by default).
+
+    Frame rate is always set explicitly, otherwise trimmed streams are muxed at 25 fps.
+    """
+    stream = stream.filter("fps", min(profile.fps or frame_rate, frame_rate))
+
+    if profile.output_format == "gif":
+        split = stream.filter("scale", profile.width, -1).split()
+        palette = split[0].filter("palettegen", max_colors=max(32, round(2.56 * profile.level)))
+        return ffmpeg.filter([split[1], palette], "paletteuse").output(
+            output, vcodec="gif", format="gif"
+        )
+
+    if profile.output_format == "webp":
+        return stream.filter("scale", profile.width, -1).output(
+            output, vcodec="libwebp", format="webp", loop=0, quality=round(0.8 * profile.level)
+        )
+
+    # fragmented mp4 is the only mp4 flavor writable to a pipe
+    return stream.filter("scale", profile.width, -2).output(
+        output,
+        vcodec="libx264",
+        format="mp4",
+        pix_fmt="yuv420p",
+        crf=round(40 - 0.17 * profile.level),
+        movflags="frag_keyframe+empty_moov",
+    )
+
+
+class SizeEstimator(BaseClassMixin):
+    """Learn output size of each format to pick the best profile fitting a size limit.
+
+    Size is modeled as `k * frames * width ** 2`, `k` of each format and quality level starts
+    from `ENCODE_PRIOR` and follows observed renders by exponential moving average.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._factors: dict[tuple[str, int], float] = {}
+
+    @staticmethod
+    def output_frames(profile: EncodeProfile, frames: int, frame_rate: float) -> int:
+        if profile.fps is None or profile.fps >= frame_rate:
+            return frames
+        return max(1, round(frames * profile.fps / frame_rate))
+
+    def factor(self, profile: EncodeProfile) -> float:
+        prior = ENCODE_PRIOR[profile.output_format] * (0.25 + 0.75 * profile.level / 100)
+        return self._factors.get((profile.output_format, profile.level), prior)
+
+    def estimate(self, profile: EncodeProfile, frames: int, frame_rate: float) -> float:
+        return (
+            self.factor(profile)
+            * self.output_frames(profile, frames, frame_rate)
+            * profile.width**2
+        )
+
+    def observe(self, profile: EncodeProfile, frames: int, frame_rate: float, size: int):
+        observed = size / (self.output_frames(profile, frames, frame_rate) * profile.width**2)
+        self._factors[(profile.output_format, profile.level)] = (
+            1 - ENCODE_LEARNING_RATE
+        ) * self.factor(profile) + ENCODE_LEARNING_RATE * observed
+
+    def pick(
+        self, profiles: list[EncodeProfile], frames: int, frame_rate: float, max_bytes: int
+    ) -> int:
+        """Return index of the best profile estimated to fit `max_bytes`.
+
+        The last (smallest) profile is returned if none of them is estimated to fit.
+        """
+        for index, profile in enumerate(profiles):
+            if self.estimate(profile, frames, frame_rate) <= max_bytes * ENCODE_SAFETY:
+                return index
+
+        return len(profiles) - 1
@@ -0,0 +1,106 @@
+import asyncio
+from bisect import bisect_right
+from collections import defaultdict
+from collections.abc import Iterable
+from itertools import accumulate
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.classes import BaseClassMixin
+from database import SentenceItem, engine
+
+
+class FrameIndex(BaseClassMixin):
+    """In-memory index from frames to the subtitles shown on them.
+
+    Subtitles of each episode are kept sorted by first frame, along with the running maximum
+    of their last frames. A query bisects for the last subtitle starting before the range
+    ends, then walks back only while some earlier subtitle can still reach the range, so a
+    lookup is O(log n) plus the few overlapping subtitles.
+
+    Sorted arrays of an episode are rebuilt lazily after `upsert` or `remove` touches it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.loaded: bool = False
+        self._items: defaultdict[str, dict[int, SentenceItem]] = defaultdict(dict)
+        self._episodes: dict[int, str] = {}
+        self._sorted: dict[str, tuple[list[int], list[int], list[SentenceItem]]] = {}
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._episodes)
+
+    async def ensure_loaded(self):
+        """Build index from sentence table on first use."""
+        if self.loaded:
+            return
+
+        async with self._lock:
+            if self.loaded:
+                return
+
+            async with AsyncSession(engine) as session:
+                rows = (await session.exec(select(SentenceItem))).all()
+                self.upsert(rows)
+
+            self.loaded = True
+            self.logger.info("Indexed frame ranges of %d subtitles", len(self))
+
+    def upsert(self, items: Iterable[SentenceItem]):
+        """Add new subtitles or move changed ones (by segment_id)."""
+        for item in items:
+            self.remove(item.segment_id)
+            self._items[item.episode][item.segment_id] = item
+            self._episodes[item.segment_id] = item.episode
+            self._sorted.pop(item.episode, None)
+
+    def remove(self, segment_id: int):
+        if (episode := self._episodes.pop(segment_id, None)) is None:
+            return
+
+        del self._items[episode][segment_id]
+        self._sorted.pop(episode, None)
+
+    @staticmethod
+    def _bounds(item: SentenceItem) -> tuple[int, int]:
+        # some ranges are stored reversed
+        return min(item.frame_start, item.frame_end), max(item.frame_start, item.frame_end)
+
+    def _arrays(self, episode: str) -> tuple[list[int], list[int], list[SentenceItem]]:
+        if (arrays := self._sorted.get(episode)) is None:
+            items = sorted(
+                self._items.get(episode, {}).values(),
+                key=lambda item: (self._bounds(item), item.segment_id),
+            )
+            starts = [self._bounds(item)[0] for item in items]
+            max_ends = list(accumulate((self._bounds(item)[1] for item in items), max))
+            arrays = self._sorted[episode] = (starts, max_ends, items)
+
+        return arrays
+
+    def overlapping(self, episode: str, start: int, end: int | None = None) -> list[SentenceItem]:
+        """Return subtitles of `episode` shown on any frame of `start` ~ `end`, in order."""
+        end = start if end is None else end
+        start, end = min(start, end), max(start, end)
+        starts, max_ends, items = self._arrays(episode)
+
+        result = []
+        for index in range(bisect_right(starts, end) - 1, -1, -1):
+            if max_ends[index] < start:
+                break
+
+            if self._bounds(items[index])[1] >= start:
+                result.append(items[index])
+
+        result.reverse()
+        return result
+
+    def at(self, episode: str, frame: int) -> list[SentenceItem]:
+        """Return subtitles of `episode` shown on `frame`."""
+        return self.overlapping(episode, frame)
+
+
+frame_index = FrameIndex()
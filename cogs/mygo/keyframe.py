@@ -0,0 +1,106 @@
+import asyncio
+from bisect import bisect_right
+from collections.abc import Iterable
+from pathlib import Path
+
+import ffmpeg
+
+from core.classes import BaseClassMixin
+
+from .schema import EpisodeInfo, KeyframeEntry
+
+
+class KeyframeIndex(BaseClassMixin):
+    """Keyframe frame numbers of every episode, built once with ffprobe and kept on disk.
+
+    Index of an episode is rebuilt when size or mtime of its video changes.
+    """
+
+    def __init__(self, directory: Path):
+        super().__init__()
+        self.directory = directory
+        self._entries: dict[str, KeyframeEntry] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def preceding(self, episode_data: EpisodeInfo, frame: int) -> int | None:
+        """Return nearest keyframe at or before `frame`, None if index is unavailable."""
+        keyframes = await self.get(episode_data)
+        if not keyframes or (position := bisect_right(keyframes, frame)) == 0:
+            return None
+
+        return keyframes[position - 1]
+
+    async def get(self, episode_data: EpisodeInfo) -> list[int]:
+        lock = self._locks.setdefault(episode_data.episode, asyncio.Lock())
+        async with lock:
+            stat = episode_data.video_path.stat()
+            entry = self._entries.get(episode_data.episode) or await asyncio.to_thread(
+                self._read, episode_data.episode
+            )
+            if entry is None or (entry.size, entry.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                try:
+                    entry = KeyframeEntry(
+                        size=stat.st_size,
+                        mtime_ns=stat.st_mtime_ns,
+                        frames=await self._probe(episode_data),
+                    )
+                except (ffmpeg.Error, OSError) as error:
+                    self.logger.error(
+                        "Failed to index keyframes of episode %s: %s",
+                        episode_data.episode,
+                        getattr(error, "stderr", error),
+                    )
+                    # remember failure until the video changes, renders use timestamp seek
+                    self._entries[episode_data.episode] = KeyframeEntry(
+                        size=stat.st_size, mtime_ns=stat.st_mtime_ns, frames=[]
+                    )
+                    return []
+
+                await asyncio.to_thread(self._write, episode_data.episode, entry)
+
+            self._entries[episode_data.episode] = entry
+            return entry.frames
+
+    async def warm(self, episodes: Iterable[EpisodeInfo]):
+        """Build missing indexes one by one, meant to run as a background task."""
+        for episode_data in episodes:
+            try:
+                await self.get(episode_data)
+            except OSError as error:
+                self.logger.warning("Skip keyframe index of %s: %s", episode_data.episode, error)
+
+    async def _probe(self, episode_data: EpisodeInfo) -> list[int]:
+        r"""Read keyframe timestamps from packet flags, without decoding.
+
+        Equivalent to:
+            ffprobe -select_streams v:0 -show_entries packet=pts_time,flags \
+                -print_format json ${episode}.mp4
+        """
+        self.logger.info("Indexing keyframes of %s", episode_data.video_path)
+        media = await asyncio.to_thread(
+            ffmpeg.probe,
+            episode_data.video_path,
+            select_streams="v:0",
+            show_entries="packet=pts_time,flags",
+            print_format="json",
+        )
+        return sorted(
+            round(float(packet["pts_time"]) * episode_data.frame_rate)
+            for packet in media["packets"]
+            if "K" in packet.get("flags", "") and "pts_time" in packet
+        )
+
+    def _read(self, episode: str) -> KeyframeEntry | None:
+        try:
+            return KeyframeEntry.model_validate_json(
+                (self.directory / f"{episode}.json").read_text(encoding="utf-8")
+            )
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, episode: str, entry: KeyframeEntry):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{episode}.json"
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        tmp_path.write_text(entry.model_dump_json(), encoding="utf-8")
+        tmp_path.replace(path)
@@ -0,0 +1,227 @@
+import asyncio
+from pathlib import Path
+from tempfile import TemporaryFile
+from typing import get_args
+
+import ffmpeg
+import numpy as np
+
+from config import MyGOConfig
+from core.classes import BaseClassMixin
+
+from .const import (
+    PHASH_BITS,
+    PHASH_MAX_DISTANCE,
+    PHASH_SAMPLE_SIZE,
+    PHASH_STEP,
+    VIDEO_DIR,
+)
+from .render import RenderQueue
+from .schema import FrameMatch, SourceStamp
+from .types import EpisodeChoices
+
+# number of set bits of every byte value, for numpy without `bitwise_count`
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II matrix, `matrix @ x @ matrix.T` is the 2D DCT of `x`."""
+    k = np.arange(size)[:, None]
+    i = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+DCT = dct_matrix(PHASH_SAMPLE_SIZE)
+
+
+def phash(pixels: np.ndarray) -> np.ndarray:
+    """64-bit perceptual hashes of grayscale images shaped (count, size, size).
+
+    Each bit tells whether one of the 8x8 lowest frequency DCT coefficients is above
+    their median.
+    """
+    coefficients = DCT @ pixels.astype(np.float32) @ DCT.T
+    low = coefficients[:, :PHASH_BITS, :PHASH_BITS].reshape(len(pixels), -1)
+    bits = low > np.median(low, axis=1, keepdims=True)
+    return np.packbits(bits, axis=1).view(np.uint64).ravel()
+
+
+def hamming(hashes: np.ndarray, query: int) -> np.ndarray:
+    """Hamming distance between every hash of `hashes` and `query`."""
+    xor = hashes ^ np.uint64(query)
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(xor)
+
+    return POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def sample_filter(stream: ffmpeg.nodes.FilterableStream) -> ffmpeg.nodes.FilterableStream:
+    return stream.filter("scale", PHASH_SAMPLE_SIZE, PHASH_SAMPLE_SIZE).filter("format", "gray")
+
+
+class PerceptualIndex(BaseClassMixin):
+    """Perceptual hashes of every `PHASH_STEP`-th frame of each episode.
+
+    Each episode is stored as `{episode}.npz` under `directory` with its hashes, frame numbers
+    and the size and mtime of its video, and is rebuilt once the video changes. All episodes
+    are searched at once as concatenated arrays.
+    """
+
+    def __init__(self, directory: Path):
+        super().__init__()
+        self.directory = directory
+        self.episodes: list[str] = []
+        self._signature: tuple[tuple[str, int], ...] | None = None
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._frames = np.empty(0, dtype=np.uint32)
+        self._episode_ids = np.empty(0, dtype=np.uint8)
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _path(self, episode: str) -> Path:
+        return self.directory / f"{episode}.npz"
+
+    async def ensure_loaded(self):
+        """Load index files, again whenever one of them changes."""
+        async with self._lock:
+            paths = sorted(self.directory.glob("*.npz")) if self.directory.exists() else []
+            signature = tuple((path.name, path.stat().st_mtime_ns) for path in paths)
+            if signature == self._signature:
+                return
+
+            await asyncio.to_thread(self._load, paths)
+            self._signature = signature
+
+    def _load(self, paths: list[Path]):
+        hashes, frames, episode_ids = [], [], []
+        self.episodes = []
+        for path in paths:
+            with np.load(path) as data:
+                hashes.append(data["hashes"])
+                frames.append(data["frames"])
+            episode_ids.append(np.full(len(frames[-1]), len(self.episodes), dtype=np.uint8))
+            self.episodes.append(path.stem)
+
+        self._hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+        self._frames = np.concatenate(frames) if frames else np.empty(0, dtype=np.uint32)
+        self._episode_ids = (
+            np.concatenate(episode_ids) if episode_ids else np.empty(0, dtype=np.uint8)
+        )
+        self.logger.info("Loaded %d frame hashes of %d episodes", len(self), len(self.episodes))
+
+    def search(self, query: int, k: int) -> list[FrameMatch]:
+        """Return up to `k` closest frames within `PHASH_MAX_DISTANCE`, best first.
+
+        Neighboring samples of one scene hash alike, so only the best match is kept among
+        frames less than a second apart.
+        """
+        if not len(self):
+            return []
+
+        distances = hamming(self._hashes, query)
+        candidates = np.flatnonzero(distances <= PHASH_MAX_DISTANCE)
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+
+        matches: list[FrameMatch] = []
+        for index in candidates:
+            episode = self.episodes[self._episode_ids[index]]
+            frame = int(self._frames[index])
+            if any(
+                match.episode == episode and abs(match.frame - frame) < PHASH_STEP * 4
+                for match in matches
+            ):
+                continue
+
+            matches.append(FrameMatch(episode=episode, frame=frame, distance=int(distances[index])))
+            if len(matches) == k:
+                break
+
+        return matches
+
+    async def hash_image(self, image: bytes, render_queue: RenderQueue) -> int:
+        """Decode an image of any format ffmpeg reads, and return its perceptual hash."""
+        process = sample_filter(ffmpeg.input("pipe:")).output("pipe:", vframes=1, format="rawvideo")
+        pixels = await render_queue.run(process.compile(), stdin=image)
+        size = PHASH_SAMPLE_SIZE * PHASH_SAMPLE_SIZE
+        if len(pixels) < size:
+            raise ValueError("Not a valid image")
+
+        return int(
+            phash(
+                np.frombuffer(pixels[:size], dtype=np.uint8).reshape(
+                    1, PHASH_SAMPLE_SIZE, PHASH_SAMPLE_SIZE
+                )
+            )[0]
+        )
+
+    def fresh(self, episode: str, source: Path) -> bool:
+        try:
+            with np.load(self._path(episode)) as data:
+                stamp = SourceStamp(size=int(data["size"]), mtime_ns=int(data["mtime_ns"]))
+        except (FileNotFoundError, ValueError, KeyError):
+            return False
+
+        return stamp == SourceStamp.of(source)
+
+    async def build(
+        self, episode: str, source: Path, render_queue: RenderQueue, force: bool = False
+    ):
+        r"""Hash every `PHASH_STEP`-th frame of `source`, skip if index is up to date.
+
+        Equivalent to:
+            ffmpeg -i ${source} -vf "select=not(mod(n\,6)),scale=32:32,format=gray" \
+                -fps_mode passthrough -f rawvideo pipe:
+        """
+        if not force and self.fresh(episode, source):
+            self.logger.info("Frame hashes of episode %s are up to date", episode)
+            return
+
+        stamp = SourceStamp.of(source)
+        process = sample_filter(
+            ffmpeg.input(source).video.filter("select", f"not(mod(n,{PHASH_STEP}))")
+        ).output("pipe:", format="rawvideo", fps_mode="passthrough")
+
+        self.logger.info("Hashing frames of episode %s", episode)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with TemporaryFile(dir=self.directory) as output:
+            await render_queue.run(process.compile(), output=output)
+            pixels = np.fromfile(output, dtype=np.uint8).reshape(
+                -1, PHASH_SAMPLE_SIZE, PHASH_SAMPLE_SIZE
+            )
+
+        hashes = phash(pixels)
+        path = self._path(episode)
+        # not `*.npz`, so `_load` never picks up a half-written index
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with tmp_path.open("wb") as fp:
+            np.savez(
+                fp,
+                hashes=hashes,
+                frames=np.arange(len(hashes), dtype=np.uint32) * PHASH_STEP,
+                size=stamp.size,
+                mtime_ns=stamp.mtime_ns,
+            )
+        tmp_path.replace(path)
+
+
+async def build_index(force: bool = False):
+    """Build frame hashes of all episodes one by one."""
+    index = PerceptualIndex(MyGOConfig.CACHE_DIR / "phash")
+    render_queue = RenderQueue(concurrency=1, max_pending=len(get_args(EpisodeChoices)))
+    for episode in get_args(EpisodeChoices):
+        source = VIDEO_DIR / f"{episode}.mp4"
+        if not source.exists():
+            index.logger.warning("Skip hashing episode %s, %s not found", episode, source)
+            continue
+
+        await index.build(episode, source, render_queue, force=force)
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(build_index(force="--force" in sys.argv))
@@ -0,0 +1,103 @@
+import heapq
+import json
+import os
+from pathlib import Path
+from time import time
+
+import psutil
+
+from core.classes import BaseClassMixin
+
+from .const import (
+    POPULARITY_HALF_LIFE,
+    POPULARITY_MIN_SCORE,
+    PREWARM_MAX_LOAD,
+    PREWARM_MAX_TEMPERATURE,
+)
+from .schema import PopularityEntry
+
+
+class PopularityCounter(BaseClassMixin):
+    """Request count of each segment, halved every `half_life` seconds.
+
+    Counts are persisted in a JSON file by `save`, scores below `POPULARITY_MIN_SCORE` are
+    dropped then.
+    """
+
+    def __init__(self, path: Path, half_life: float = POPULARITY_HALF_LIFE):
+        super().__init__()
+        self.path = path
+        self.half_life = half_life
+        self._entries: dict[int, PopularityEntry] | None = None
+
+    def score(self, segment_id: int, now: float | None = None) -> float:
+        if (entry := self._load().get(segment_id)) is None:
+            return 0.0
+
+        now = time() if now is None else now
+        return entry.score * 0.5 ** ((now - entry.updated_at) / self.half_life)
+
+    def hit(self, segment_id: int, now: float | None = None):
+        now = time() if now is None else now
+        self._load()[segment_id] = PopularityEntry(
+            score=self.score(segment_id, now) + 1, updated_at=now
+        )
+
+    def top(self, k: int, now: float | None = None) -> list[int]:
+        """Return `k` most requested segment ids, most requested first."""
+        now = time() if now is None else now
+        return heapq.nlargest(k, self._load(), key=lambda segment_id: self.score(segment_id, now))
+
+    def _load(self) -> dict[int, PopularityEntry]:
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            self._entries = {
+                int(segment_id): PopularityEntry.model_validate(entry)
+                for segment_id, entry in raw.items()
+            }
+        except FileNotFoundError:
+            pass
+        except ValueError as error:  # corrupted counts, start over
+            self.logger.warning("Ignoring invalid popularity file %s: %s", self.path, error)
+
+        return self._entries
+
+    def save(self, now: float | None = None):
+        now = time() if now is None else now
+        self._entries = {
+            segment_id: entry
+            for segment_id, entry in self._load().items()
+            if self.score(segment_id, now) >= POPULARITY_MIN_SCORE
+        }
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        tmp_path.write_text(
+            json.dumps(
+                {
+                    str(segment_id): entry.model_dump(mode="json")
+                    for segment_id, entry in self._entries.items()
+                }
+            ),
+            encoding="utf-8",
+        )
+        tmp_path.replace(self.path)
+
+
+def system_busy() -> bool:
+    """Whether CPU load or temperature is too high for background rendering.
+
+    Temperature is read from the same thermal sensor as `vcgencmd measure_temp` on a
+    Raspberry Pi, and is ignored if no sensor is available.
+    """
+    load = psutil.getloadavg()[0] / (os.cpu_count() or 1)
+    if load > PREWARM_MAX_LOAD:
+        return True
+
+    sensors = getattr(psutil, "sensors_temperatures", dict)()
+    temperatures = [sensor.current for group in sensors.values() for sensor in group]
+    return bool(temperatures) and max(temperatures) > PREWARM_MAX_TEMPERATURE
@@ -0,0 +1,100 @@
+import asyncio
+from pathlib import Path
+from typing import get_args
+
+import ffmpeg
+
+from config import MyGOConfig
+from core.classes import BaseClassMixin
+
+from .const import PROXY_GOP, PROXY_HEIGHT, VIDEO_DIR
+from .render import RenderQueue
+from .schema import SourceStamp
+from .types import EpisodeChoices
+
+
+class ProxyStore(BaseClassMixin):
+    """Low-resolution, short-GOP copies of episode videos for cheap GIF rendering.
+
+    Every proxy has a sidecar JSON with size and mtime of its source, a proxy is only used
+    while they still match. Keyframes of a proxy are exactly every `PROXY_GOP` frames.
+    """
+
+    def __init__(self, directory: Path):
+        super().__init__()
+        self.directory = directory
+
+    def proxy_path(self, source: Path) -> Path:
+        return self.directory / source.name
+
+    def get(self, source: Path) -> Path | None:
+        """Return proxy of `source` if it is up to date."""
+        proxy = self.proxy_path(source)
+        try:
+            stamp = SourceStamp.model_validate_json(
+                proxy.with_suffix(".json").read_text(encoding="utf-8")
+            )
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if not proxy.exists() or stamp != SourceStamp.of(source):
+            return None
+
+        return proxy
+
+    async def build(self, source: Path, render_queue: RenderQueue, force: bool = False) -> Path:
+        r"""Transcode `source` to proxy, skip if it is up to date.
+
+        Equivalent to:
+            ffmpeg -i ${source} -an -vf scale=-2:480 -c:v libx264 -preset veryfast -crf 23 \
+                -g 12 -keyint_min 12 -sc_threshold 0 -movflags +faststart ${proxy}
+        """
+        if not force and (proxy := self.get(source)) is not None:
+            self.logger.info("Proxy of %s is up to date", source)
+            return proxy
+
+        stamp = SourceStamp.of(source)
+        proxy = self.proxy_path(source)
+        tmp_proxy = proxy.with_name(f"{proxy.stem}.tmp{proxy.suffix}")
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        process = (
+            ffmpeg.input(source)
+            .video.filter("scale", -2, PROXY_HEIGHT)
+            .output(
+                str(tmp_proxy),
+                vcodec="libx264",
+                preset="veryfast",
+                crf=23,
+                g=PROXY_GOP,
+                keyint_min=PROXY_GOP,
+                sc_threshold=0,
+                movflags="+faststart",
+            )
+            .overwrite_output()
+        )
+        self.logger.info("Building proxy of %s", source)
+        await render_queue.run(process.compile())
+
+        tmp_proxy.replace(proxy)
+        proxy.with_suffix(".json").write_text(stamp.model_dump_json(), encoding="utf-8")
+        return proxy
+
+
+async def build_proxies(force: bool = False):
+    """Build proxies of all episodes one by one."""
+    store = ProxyStore(MyGOConfig.CACHE_DIR / "proxy")
+    render_queue = RenderQueue(concurrency=1, max_pending=len(get_args(EpisodeChoices)))
+    for episode in get_args(EpisodeChoices):
+        source = VIDEO_DIR / f"{episode}.mp4"
+        if not source.exists():
+            store.logger.warning("Skip proxy of episode %s, %s not found", episode, source)
+            continue
+
+        await store.build(source, render_queue, force=force)
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(build_proxies(force="--force" in sys.argv))
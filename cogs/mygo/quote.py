@@ -0,0 +1,204 @@
+import asyncio
+from collections import deque
+from collections.abc import Iterable
+from time import monotonic
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.classes import BaseClassMixin
+from database import AutoQuoteChannel, SentenceItem, engine
+
+from .const import QUOTE_COOLDOWN, QUOTE_MIN_LENGTH
+from .search import SubtitleIndex
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton finding all patterns in a text with one pass over it.
+
+    States are trie nodes, `_fail` links a state to its longest proper suffix that is also
+    in the trie, and `_output` links to the nearest suffix state ending a pattern.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: list[str] = []
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._ends: list[int | None] = [None]  # index of pattern ending at the state
+        self._output: list[int] = [0]
+
+        for pattern in patterns:
+            self._add(pattern)
+        self._link()
+
+    def _add(self, pattern: str):
+        state = 0
+        for char in pattern:
+            if (next_state := self._goto[state].get(char)) is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._ends.append(None)
+                self._output.append(0)
+            state = next_state
+
+        if self._ends[state] is None:
+            self._ends[state] = len(self.patterns)
+            self.patterns.append(pattern)
+
+    def _link(self):
+        """Fill failure and output links breadth first, parents before children."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = fail if self._ends[fail] is not None else self._output[fail]
+                queue.append(child)
+
+    def find(self, text: str) -> list[tuple[int, int]]:
+        """Return (end position, pattern index) of every occurrence of every pattern."""
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+
+            match_state = state if self._ends[state] is not None else self._output[state]
+            while match_state:
+                matches.append((position, self._ends[match_state]))
+                match_state = self._output[match_state]
+
+        return matches
+
+
+class QuoteMatcher(BaseClassMixin):
+    """Find subtitle lines quoted in chat messages.
+
+    Subtitles of at least `QUOTE_MIN_LENGTH` folded characters (see `SubtitleIndex.fold`)
+    are compiled into one `AhoCorasick` automaton, so a message is matched against all of
+    them in time linear to its length. The automaton is recompiled lazily after `upsert` or
+    `remove` changes the subtitles.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.loaded: bool = False
+        self._texts: dict[int, str] = {}
+        self._automaton: AhoCorasick | None = None
+        self._segments: list[list[int]] = []
+        self._version: int = 0  # bumped on every change of `_texts`
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    async def ensure_loaded(self):
+        """Load subtitles from sentence table on first use, compile automaton if outdated."""
+        async with self._lock:
+            if not self.loaded:
+                async with AsyncSession(engine) as session:
+                    rows = (await session.exec(select(SentenceItem))).all()
+                    self.upsert(rows)
+
+                self.loaded = True
+
+            # compile a snapshot, and again if subtitles changed while compiling it
+            while self._automaton is None:
+                version = self._version
+                automaton, segments = await asyncio.to_thread(self._compile, dict(self._texts))
+                if version == self._version:
+                    self._automaton, self._segments = automaton, segments
+                    self.logger.info("Compiled %d quotable subtitles", len(automaton.patterns))
+
+    def upsert(self, items: Iterable[SentenceItem]):
+        """Add new subtitles or replace changed ones (by segment_id)."""
+        for item in items:
+            self.remove(item.segment_id)
+            if len(text := SubtitleIndex.fold(item.text)) >= QUOTE_MIN_LENGTH:
+                self._texts[item.segment_id] = text
+                self._version += 1
+                self._automaton = None
+
+    def remove(self, segment_id: int):
+        if self._texts.pop(segment_id, None) is not None:
+            self._version += 1
+            self._automaton = None
+
+    @staticmethod
+    def _compile(texts: dict[int, str]) -> tuple[AhoCorasick, list[list[int]]]:
+        """Return automaton of `texts`, and segment ids of each of its patterns."""
+        segments_by_text: dict[str, list[int]] = {}
+        for segment_id, text in sorted(texts.items()):
+            segments_by_text.setdefault(text, []).append(segment_id)
+
+        automaton = AhoCorasick(segments_by_text)
+        return automaton, [segments_by_text[pattern] for pattern in automaton.patterns]
+
+    async def match(self, message: str) -> int | None:
+        """Return segment id of the longest subtitle quoted in `message`, None if none is."""
+        await self.ensure_loaded()
+        matches = self._automaton.find(SubtitleIndex.fold(message))
+        if not matches:
+            return None
+
+        _, pattern = max(matches, key=lambda match: len(self._automaton.patterns[match[1]]))
+        return self._segments[pattern][0]
+
+
+class QuoteChannels(BaseClassMixin):
+    """Channels with auto-quote enabled, stored in `auto_quote_channel` table.
+
+    Every channel replies at most once per `QUOTE_COOLDOWN` seconds.
+    """
+
+    def __init__(self, cooldown: float = QUOTE_COOLDOWN):
+        super().__init__()
+        self.cooldown = cooldown
+        self.enabled: set[int] = set()
+        self._last_reply: dict[int, float] = {}
+
+    async def load(self):
+        async with AsyncSession(engine) as session:
+            rows = (await session.exec(select(AutoQuoteChannel))).all()
+
+        self.enabled = {row.channel_id for row in rows}
+        self.logger.info("Auto-quote is enabled in %d channels", len(self.enabled))
+
+    async def set_enabled(self, channel_id: int, enabled: bool):
+        async with AsyncSession(engine) as session:
+            row = (
+                await session.exec(
+                    select(AutoQuoteChannel).where(AutoQuoteChannel.channel_id == channel_id)
+                )
+            ).first()
+            if enabled and row is None:
+                session.add(AutoQuoteChannel(channel_id=channel_id))
+            elif not enabled and row is not None:
+                await session.delete(row)
+            await session.commit()
+
+        if enabled:
+            self.enabled.add(channel_id)
+        else:
+            self.enabled.discard(channel_id)
+
+    def acquire(self, channel_id: int) -> bool:
+        """Whether channel may reply now, start its cooldown if so."""
+        if channel_id not in self.enabled:
+            return False
+
+        now = monotonic()
+        if now - self._last_reply.get(channel_id, -self.cooldown) < self.cooldown:
+            return False
+
+        self._last_reply[channel_id] = now
+        return True
+
+
+quote_matcher = QuoteMatcher()
@@ -0,0 +1,64 @@
+import asyncio
+from collections.abc import Iterator
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.classes import BaseClassMixin
+from database import EpisodeItem, engine
+
+from .const import VIDEO_DIR
+from .schema import EpisodeInfo
+
+
+class EpisodeRegistry(BaseClassMixin):
+    """In-memory copy of episode table, so render path never checks out a DB session."""
+
+    def __init__(self):
+        super().__init__()
+        self.loaded: bool = False
+        self._episodes: dict[str, EpisodeInfo] = {}
+        self._lock = asyncio.Lock()
+
+    def __contains__(self, episode: str) -> bool:
+        return episode in self._episodes
+
+    async def ensure_loaded(self):
+        """Load episode table on first use."""
+        if self.loaded:
+            return
+
+        async with self._lock:
+            if self.loaded:
+                return
+
+            async with AsyncSession(engine) as session:
+                self.update(*(await session.exec(select(EpisodeItem))).all())
+
+            self.loaded = True
+            self.logger.info("Loaded %d episodes", len(self._episodes))
+
+    def update(self, *items: EpisodeItem):
+        for item in items:
+            self._episodes[item.episode] = EpisodeInfo(
+                episode=item.episode,
+                total_frame=item.total_frame,
+                frame_rate=item.frame_rate,
+                video_path=VIDEO_DIR / f"{item.episode}.mp4",
+            )
+
+    def get(self, episode: str) -> EpisodeInfo:
+        if (info := self._episodes.get(episode)) is None:
+            raise ValueError(f"Episode {episode} does not exist")
+
+        return info
+
+    def check_frames(self, episode: str, *frames: int) -> list[bool]:
+        total_frame = self.get(episode).total_frame
+        return [0 <= frame <= total_frame for frame in frames]
+
+    def __iter__(self) -> Iterator[EpisodeInfo]:
+        return iter(self._episodes.values())
+
+
+episode_registry = EpisodeRegistry()
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+
+from sqlmodel import column, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.classes import BaseClassMixin
+from database import ImportChecksum, SentenceItem, engine
+
+from .const import SUBTITLE_FIELDS
+from .interval import frame_index
+from .quote import quote_matcher
+from .schema import SourceStamp, SubtitleDiff, SubtitleRecord
+from .search import subtitle_index
+
+
+def by_segment_id(raw_items: list[dict[str, Any]]) -> dict[int, dict[str, Any]]:
+    """Key raw subtitles by segment_id, the first one wins like `db_insert_subtitle_data`."""
+    result: dict[int, dict[str, Any]] = {}
+    for raw in raw_items:
+        result.setdefault(raw["segment_id"], raw)
+
+    return result
+
+
+def diff_subtitles(old: dict[int, dict[str, Any]], new: dict[int, dict[str, Any]]) -> SubtitleDiff:
+    """Compare raw subtitles by segment_id, only new or changed ones are validated."""
+    return SubtitleDiff(
+        changed=[
+            SentenceItem(**SubtitleRecord.model_validate(raw, strict=True).model_dump())
+            for segment_id, raw in new.items()
+            if old.get(segment_id) != raw
+        ],
+        removed=sorted(old.keys() - new.keys()),
+    )
+
+
+class SubtitleReloader(BaseClassMixin):
+    """Apply changes of subtitle data file to database and in-memory indexes while running.
+
+    `check` is meant to be polled: it only reads the file when its size or mtime changed,
+    then parses it with `json` and validates just the subtitles that differ from the last
+    import. The first check takes the file as imported by `core.func.init`.
+    """
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = path
+        self._stamp: SourceStamp | None = None
+        self._checksum: str | None = None
+        self._raw_items: dict[int, dict[str, Any]] | None = None
+
+    async def check(self) -> SubtitleDiff | None:
+        """Reload data file if it changed, return applied diff (None if nothing is done)."""
+        try:
+            stamp = SourceStamp.of(self.path)
+        except FileNotFoundError:
+            self.logger.warning("%s does not exist", self.path)
+            return None
+
+        if stamp == self._stamp:
+            return None
+
+        raw_data = await asyncio.to_thread(self.path.read_bytes)
+        checksum = hashlib.sha256(raw_data).hexdigest()
+        if checksum == self._checksum:
+            self._stamp = stamp
+            return None
+
+        try:
+            raw_items = by_segment_id(json.loads(raw_data)["result"])
+            if self._raw_items is None:
+                diff = SubtitleDiff()
+            else:
+                diff = await asyncio.to_thread(diff_subtitles, self._raw_items, raw_items)
+        except (ValueError, KeyError, TypeError) as error:
+            # probably caught in the middle of writing, try again next time
+            self.logger.warning("Failed to parse %s: %s", self.path, error)
+            return None
+
+        if diff.changed or diff.removed:
+            await self.apply(diff, checksum)
+
+        self._stamp, self._checksum, self._raw_items = stamp, checksum, raw_items
+        return diff
+
+    async def apply(self, diff: SubtitleDiff, checksum: str):
+        """Write diff to sentence table in one transaction, then to in-memory indexes."""
+        segment_ids = [item.segment_id for item in diff.changed] + diff.removed
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            rows: dict[int, list[SentenceItem]] = {}
+            for row in (
+                await session.exec(
+                    select(SentenceItem).where(column("segment_id").in_(segment_ids))
+                )
+            ).all():
+                rows.setdefault(row.segment_id, []).append(row)
+
+            for item in diff.changed:
+                if old_rows := rows.get(item.segment_id):
+                    old_rows[0].sqlmodel_update(item.model_dump(include=SUBTITLE_FIELDS))
+                    session.add(old_rows[0])
+                else:
+                    session.add(item)
+
+            for segment_id in diff.removed:
+                for row in rows.get(segment_id, []):
+                    await session.delete(row)
+
+            checksum_row = (
+                await session.exec(
+                    select(ImportChecksum).where(ImportChecksum.source == self.path.name)
+                )
+            ).first() or ImportChecksum(source=self.path.name, checksum=checksum)
+            checksum_row.checksum = checksum
+            session.add(checksum_row)
+            await session.commit()
+
+        for index in (subtitle_index, frame_index, quote_matcher):
+            if index.loaded:
+                index.upsert(diff.changed)
+                for segment_id in diff.removed:
+                    index.remove(segment_id)
+
+        self.logger.info(
+            "Reloaded %s: %d changed, %d removed",
+            self.path.name,
+            len(diff.changed),
+            len(diff.removed),
+        )
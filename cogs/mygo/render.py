@@ -0,0 +1,126 @@
+import asyncio
+from collections import deque
+from contextlib import suppress
+from time import perf_counter
+from typing import BinaryIO
+
+import ffmpeg
+
+from core.classes import BaseClassMixin
+
+from .const import STREAM_CHUNK_SIZE, WAIT_SAMPLE_SIZE
+from .schema import RenderQueueStats
+from .telemetry import add_stage
+
+
+class RenderQueueFullError(Exception): ...
+
+
+class RenderQueue(BaseClassMixin):
+    """Run ffmpeg as asyncio subprocesses with bounded concurrency.
+
+    At most `concurrency` processes run at the same time, at most `max_pending` requests
+    wait for a slot, further requests are rejected with `RenderQueueFullError`.
+    """
+
+    def __init__(self, concurrency: int, max_pending: int):
+        super().__init__()
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.waiting: int = 0
+        self.running: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wait_times: deque[float] = deque(maxlen=WAIT_SAMPLE_SIZE)
+
+    async def run(
+        self, args: list[str], output: BinaryIO | None = None, stdin: bytes | None = None
+    ) -> bytes:
+        """Run compiled ffmpeg command and return its stdout.
+
+        If `output` is given, stdout is written to it chunk by chunk instead of being
+        buffered, and empty bytes are returned. `stdin` is fed to ffmpeg reading `pipe:`.
+        """
+        if self.waiting >= self.max_pending:
+            raise RenderQueueFullError(
+                f"Render queue is full ({self.waiting} pending), please try again later"
+            )
+
+        enqueued_at = perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self._wait_times.append(perf_counter() - enqueued_at)
+        add_stage("queue", self._wait_times[-1])
+        self.running += 1
+        try:
+            stdout, stderr, returncode = await self._exec(args, output, stdin)
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+        if returncode != 0:
+            self.failed += 1
+            self.logger.error("ffmpeg exited with %d:\n%s", returncode, stderr.decode())
+            raise ffmpeg.Error(args[0], stdout, stderr)
+
+        self.completed += 1
+        return stdout
+
+    @staticmethod
+    async def _exec(
+        args: list[str], output: BinaryIO | None, stdin: bytes | None
+    ) -> tuple[bytes, bytes, int]:
+        process = await asyncio.create_subprocess_exec(
+            *map(str, args),
+            stdin=asyncio.subprocess.DEVNULL if stdin is None else asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stderr_task = None
+        started = perf_counter()
+        try:
+            if output is None:
+                stdout, stderr = await process.communicate(stdin)
+            else:
+                stdout = b""
+                # drain stderr at the same time, otherwise a full pipe blocks ffmpeg
+                stderr_task = asyncio.ensure_future(process.stderr.read())
+                if chunk := await process.stdout.read(STREAM_CHUNK_SIZE):
+                    add_stage("first_byte", perf_counter() - started)
+                while chunk:
+                    output.write(chunk)
+                    chunk = await process.stdout.read(STREAM_CHUNK_SIZE)
+                stderr = await stderr_task
+                await process.wait()
+        except BaseException:
+            # cancelled, or writing output failed (e.g. disk full): ffmpeg must not outlive us
+            if stderr_task is not None:
+                stderr_task.cancel()
+            if process.returncode is None:
+                with suppress(ProcessLookupError):
+                    process.kill()
+                await process.wait()
+            raise
+
+        add_stage("ffmpeg", perf_counter() - started)
+        if output is not None:
+            output.seek(0)
+        return stdout, stderr, process.returncode
+
+    def stats(self) -> RenderQueueStats:
+        wait_times = list(self._wait_times)
+        return RenderQueueStats(
+            concurrency=self.concurrency,
+            max_pending=self.max_pending,
+            waiting=self.waiting,
+            running=self.running,
+            completed=self.completed,
+            failed=self.failed,
+            avg_wait=sum(wait_times) / len(wait_times) if wait_times else 0.0,
+            max_wait=max(wait_times, default=0.0),
+        )
@@ -0,0 +1,178 @@
+import asyncio
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterator
+from pathlib import Path
+from tempfile import TemporaryFile
+from typing import BinaryIO, get_args
+
+import ffmpeg
+import numpy as np
+
+from config import MyGOConfig
+from core.classes import BaseClassMixin
+
+from .const import (
+    SCENE_CHUNK_FRAMES,
+    SCENE_MIN_SHOT,
+    SCENE_SAMPLE_HEIGHT,
+    SCENE_SAMPLE_WIDTH,
+    SCENE_SNAP_WINDOW,
+    SCENE_THRESHOLD,
+    VIDEO_DIR,
+)
+from .render import RenderQueue
+from .schema import SceneCutEntry, SourceStamp
+from .types import EpisodeChoices
+
+
+def read_chunks(fp: BinaryIO) -> Iterator[np.ndarray]:
+    """Yield downscaled grayscale frames of `fp` as float arrays of `SCENE_CHUNK_FRAMES`."""
+    frame_size = SCENE_SAMPLE_WIDTH * SCENE_SAMPLE_HEIGHT
+    while chunk := fp.read(frame_size * SCENE_CHUNK_FRAMES):
+        yield np.frombuffer(chunk, dtype=np.uint8).reshape(-1, frame_size).astype(np.float32)
+
+
+def detect_cuts(chunks: Iterator[np.ndarray]) -> list[int]:
+    """Return frame numbers starting a new shot.
+
+    A frame starts a shot when its mean absolute difference from the previous frame is above
+    `SCENE_THRESHOLD` (0 ~ 1), and the last cut is at least `SCENE_MIN_SHOT` frames before.
+    """
+    cuts: list[int] = []
+    previous: np.ndarray | None = None
+    offset = 0
+    for frames in chunks:
+        # difference i is between frame i and i + 1 of `joined`, which starts one frame
+        # earlier when the last frame of previous chunk is prepended
+        joined = frames if previous is None else np.concatenate((previous, frames))
+        first_frame = offset + 1 if previous is None else offset
+        differences = np.abs(np.diff(joined, axis=0)).mean(axis=1) / 255
+        for index in np.flatnonzero(differences > SCENE_THRESHOLD):
+            frame = first_frame + int(index)
+            if not cuts or frame - cuts[-1] >= SCENE_MIN_SHOT:
+                cuts.append(frame)
+
+        offset += len(frames)
+        previous = frames[-1:]
+
+    return cuts
+
+
+def snap(cuts: list[int], start: int, end: int, window: int = SCENE_SNAP_WINDOW) -> tuple[int, int]:
+    """Trim `start` ~ `end` to the shots it mostly covers.
+
+    If a cut is at most `window` frames after `start`, the range starts at the last such cut.
+    If a cut is at most `window` frames before `end`, the range ends right before the first
+    such cut. Ranges are only shrunk, and kept as is if nothing would be left.
+    """
+    head = bisect_right(cuts, start + window)
+    if head and cuts[head - 1] > start:
+        snapped_start = cuts[head - 1]
+    else:
+        snapped_start = start
+
+    tail = bisect_left(cuts, end - window + 1)
+    if tail < len(cuts) and cuts[tail] <= end:
+        snapped_end = cuts[tail] - 1
+    else:
+        snapped_end = end
+
+    if snapped_start >= snapped_end:
+        return start, end
+
+    return snapped_start, snapped_end
+
+
+class SceneIndex(BaseClassMixin):
+    """Scene cut frame numbers of every episode, detected offline and kept on disk.
+
+    Cuts of an episode are only used while size and mtime of its video match, use
+    `python -m cogs.mygo.scene` to detect them again.
+    """
+
+    def __init__(self, directory: Path):
+        super().__init__()
+        self.directory = directory
+        self._entries: dict[str, SceneCutEntry] = {}
+
+    def _path(self, episode: str) -> Path:
+        return self.directory / f"{episode}.json"
+
+    def get(self, episode: str, source: Path) -> list[int] | None:
+        """Return cuts of `episode`, None if they are not detected for current `source`."""
+        stamp = SourceStamp.of(source)
+        entry = self._entries.get(episode)
+        if entry is None or entry.stamp != stamp:
+            try:
+                entry = SceneCutEntry.model_validate_json(
+                    self._path(episode).read_text(encoding="utf-8")
+                )
+            except (FileNotFoundError, ValueError):
+                return None
+
+            self._entries[episode] = entry
+
+        return entry.frames if entry.stamp == stamp else None
+
+    def snap(self, episode: str, source: Path, start: int, end: int) -> tuple[int, int]:
+        """Snap `start` ~ `end` to scene cuts, see `snap`."""
+        if (cuts := self.get(episode, source)) is None:
+            self.logger.warning("Scene cuts of episode %s are not detected yet", episode)
+            return start, end
+
+        return snap(cuts, start, end)
+
+    async def build(
+        self, episode: str, source: Path, render_queue: RenderQueue, force: bool = False
+    ) -> list[int]:
+        r"""Detect scene cuts of `source`, skip if they are up to date.
+
+        Frames are decoded by:
+            ffmpeg -i ${source} -an -vf scale=64:36,format=gray -fps_mode passthrough \
+                -f rawvideo pipe:
+        """
+        if not force and (cuts := self.get(episode, source)) is not None:
+            self.logger.info("Scene cuts of episode %s are up to date", episode)
+            return cuts
+
+        stamp = SourceStamp.of(source)
+        process = (
+            ffmpeg.input(source)
+            .video.filter("scale", SCENE_SAMPLE_WIDTH, SCENE_SAMPLE_HEIGHT)
+            .filter("format", "gray")
+            .output("pipe:", format="rawvideo", fps_mode="passthrough")
+        )
+
+        self.logger.info("Detecting scene cuts of episode %s", episode)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with TemporaryFile(dir=self.directory) as output:
+            await render_queue.run(process.compile(), output=output)
+            cuts = await asyncio.to_thread(detect_cuts, read_chunks(output))
+
+        entry = SceneCutEntry(stamp=stamp, frames=cuts)
+        path = self._path(episode)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        tmp_path.write_text(entry.model_dump_json(), encoding="utf-8")
+        tmp_path.replace(path)
+        self._entries[episode] = entry
+        self.logger.info("Found %d scene cuts in episode %s", len(cuts), episode)
+        return cuts
+
+
+async def build_index(force: bool = False):
+    """Detect scene cuts of all episodes one by one."""
+    index = SceneIndex(MyGOConfig.CACHE_DIR / "scene")
+    render_queue = RenderQueue(concurrency=1, max_pending=len(get_args(EpisodeChoices)))
+    for episode in get_args(EpisodeChoices):
+        source = VIDEO_DIR / f"{episode}.mp4"
+        if not source.exists():
+            index.logger.warning("Skip scene cuts of episode %s, %s not found", episode, source)
+            continue
+
+        await index.build(episode, source, render_queue, force=force)
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(build_index(force="--force" in sys.argv))
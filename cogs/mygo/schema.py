@@ -1,7 +1,18 @@
-from pydantic import BaseModel, computed_field
+import math
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from time import monotonic
+from typing import BinaryIO, Literal
+
+from pydantic import BaseModel, Field, computed_field, field_validator
 
 from database import SentenceItem
 
+from .const import CURSOR_TTL, PAGED_BY
+from .types import AnimationFormat, EpisodeChoices
+
 # --------------- Pydantic Model --------------- #
 
 
@@ -115,5 +126,216 @@ class FFProbeResponse(BaseModel):
     format: Format
 
 
+class ProbeCacheEntry(BaseModel):
+    size: int
+    mtime_ns: int
+    stream: FFProbeStream
+
+
+class SourceStamp(BaseModel):
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def of(cls, path: Path) -> "SourceStamp":
+        stat = path.stat()
+        return cls(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+
+class KeyframeEntry(BaseModel):
+    size: int
+    mtime_ns: int
+    frames: list[int]
+
+
+class SceneCutEntry(BaseModel):
+    """First frames of every shot of an episode, detected from video matching `stamp`."""
+
+    stamp: SourceStamp
+    frames: list[int]
+
+
+class PopularityEntry(BaseModel):
+    score: float
+    updated_at: float
+
+
 class SubtitleItem(BaseModel):
     result: list[SentenceItem]
+
+
+class SubtitleRecord(BaseModel):
+    """One subtitle of the data file, validated before it becomes a `SentenceItem`.
+
+    (validating `SentenceItem` itself inside another model does not check its fields)
+    """
+
+    text: str
+    episode: str
+    frame_start: int
+    frame_end: int
+    segment_id: int
+
+
+class SubtitleDiff(BaseModel):
+    """Subtitles changed (validated) or removed (segment ids) since the last import."""
+
+    changed: list[SentenceItem] = []
+    removed: list[int] = []
+
+
+class EpisodeInfo(BaseModel):
+    episode: str
+    total_frame: int
+    frame_rate: float
+    video_path: Path
+
+
+class EncodeProfile(BaseModel):
+    output_format: AnimationFormat = "gif"
+    width: int
+    fps: float | None = None
+    level: int = 100
+
+
+class RenderQueueStats(BaseModel):
+    concurrency: int
+    max_pending: int
+    waiting: int
+    running: int
+    completed: int
+    failed: int
+    avg_wait: float
+    max_wait: float
+
+
+class FrameMatch(BaseModel):
+    """Frame of an episode found by perceptual hash, `distance` is in differing bits."""
+
+    episode: EpisodeChoices
+    frame: int
+    distance: int
+
+
+class RenderCacheStats(BaseModel):
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    memory_items: int
+    memory_bytes: int
+    disk_items: int
+    disk_bytes: int
+
+
+class RenderTrace(BaseModel):
+    """Durations (in seconds) of the stages of one render, by stage name."""
+
+    kind: str
+    episode: str
+    frames: int = 1
+    output_bytes: int = 0
+    cached: bool = False
+    stages: dict[str, float] = {}
+
+    def measure(self, fp: BinaryIO):
+        """Record size of render output `fp`, and rewind it."""
+        self.output_bytes = fp.seek(0, os.SEEK_END)
+        fp.seek(0)
+
+
+class StageStats(BaseModel):
+    name: str
+    count: int
+    p50: float
+    p95: float
+
+
+class LatencyStats(BaseModel):
+    """Latency (in seconds) of successful requests."""
+
+    mean: float
+    p50: float
+    p95: float
+    max: float
+
+
+class BenchResult(BaseModel):
+    """Requests of one kind run at one concurrency level."""
+
+    kind: str
+    concurrency: int
+    requests: int
+    errors: dict[str, int] = {}
+    wall: float
+    throughput: float
+    latency: LatencyStats | None = None
+    stages: list[StageStats] = []
+
+
+class BenchReport(BaseModel):
+    revision: str | None
+    created: datetime
+    platform: dict[str, str | int | None]
+    settings: dict[str, str | int | float | bool]
+    # seconds spent generating videos, seeding database and warming indexes
+    setup: dict[str, float]
+    results: list[BenchResult]
+
+
+class SearchCursor(BaseModel):
+    """Ordered segment ids of one search, paged without searching again."""
+
+    text: str
+    episode: str | None = None
+    fuzzy: bool = False
+    segment_ids: list[int]
+    created_at: float = Field(default_factory=monotonic)
+
+    @property
+    def count(self) -> int:
+        return len(self.segment_ids)
+
+    def pages(self, paged_by: int = PAGED_BY) -> int:
+        """Number of pages, at least 1."""
+        return max(1, math.ceil(self.count / paged_by))
+
+    def expired(self, ttl: float = CURSOR_TTL) -> bool:
+        return monotonic() - self.created_at > ttl
+
+    def page(self, nth_page: int, paged_by: int = PAGED_BY) -> list[int]:
+        """(1-indexed)."""
+        offset = paged_by * (nth_page - 1)
+        return self.segment_ids[offset : offset + paged_by]
+
+
+class SearchState(BaseModel):
+    """State of a search message, kept in custom_id of its components instead of memory."""
+
+    query: str
+    episode: EpisodeChoices | None = None
+    fuzzy: bool = False
+    page: int = 1
+    response: Literal["frame", "gif"] = "frame"
+
+    @field_validator("query")
+    @classmethod
+    def _single_line(cls, query: str) -> str:
+        # `SEARCH_STATE_PATTERN` matches the query up to the first line break
+        return " ".join(query.split())
+
+    def encode(self, prefix: str) -> str:
+        """Encode as `{prefix}:` followed by `SEARCH_STATE_PATTERN`."""
+        return (
+            f"{prefix}:{self.page}:{self.response[0]}:{int(self.fuzzy)}:"
+            f"{self.episode or ''}:{self.query}"
+        )
+
+    @classmethod
+    def decode(cls, match: re.Match[str]) -> "SearchState":
+        return cls(
+            query=match["query"],
+            episode=match["episode"] or None,
+            fuzzy=match["fuzzy"] == "1",
+            page=int(match["page"]),
+            response="gif" if match["response"] == "g" else "frame",
+        )
@@ -0,0 +1,185 @@
+import asyncio
+import heapq
+import math
+import unicodedata
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.classes import BaseClassMixin
+from database import SentenceItem, engine
+
+from .const import (
+    BM25_B,
+    BM25_K1,
+    FUZZY_LIMIT,
+    IGNORED_CATEGORIES,
+    NGRAM_SIZE,
+    TRADITIONAL_CHARACTERS,
+    VARIANT_CHARACTERS,
+)
+
+VARIANT_TABLE = str.maketrans(VARIANT_CHARACTERS, TRADITIONAL_CHARACTERS)
+
+
+class SubtitleIndex(BaseClassMixin):
+    """In-memory inverted index over subtitle text.
+
+    Every subtitle is indexed by its characters and character bigrams (CJK text has no
+    word boundary), a query intersects the posting sets of its grams and then verifies
+    candidates with a substring check, so results are identical to `text LIKE '%query%'`.
+
+    For fuzzy search, text is also folded (see `fold`) and indexed with term frequencies,
+    then candidates sharing grams with the query are ranked by BM25.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.loaded: bool = False
+        self._texts: dict[int, str] = {}
+        self._episodes: dict[int, str] = {}
+        self._postings: defaultdict[str, set[int]] = defaultdict(set)
+        self._folded: dict[int, str] = {}
+        self._term_postings: defaultdict[str, dict[int, int]] = defaultdict(dict)
+        self._term_lengths: dict[int, int] = {}
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return text.casefold()
+
+    @staticmethod
+    def grams(text: str) -> set[str]:
+        """Return characters and bigrams of normalized text."""
+        result = set(text)
+        result.update(text[i : i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1))
+        return result
+
+    @staticmethod
+    def fold(text: str) -> str:
+        """Fold width, case and variant characters, drop punctuation and whitespace."""
+        text = unicodedata.normalize("NFKC", text).casefold().translate(VARIANT_TABLE)
+        return "".join(
+            char for char in text if unicodedata.category(char)[0] not in IGNORED_CATEGORIES
+        )
+
+    @staticmethod
+    def terms(text: str) -> list[str]:
+        """Return bigrams of folded text, or characters if text is too short for typos."""
+        if len(text) <= NGRAM_SIZE:
+            return list(text)
+
+        return [text[i : i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)]
+
+    async def ensure_loaded(self):
+        """Build index from sentence table on first use."""
+        if self.loaded:
+            return
+
+        async with self._lock:
+            if self.loaded:
+                return
+
+            async with AsyncSession(engine) as session:
+                rows = (await session.exec(select(SentenceItem))).all()
+                self.upsert(rows)
+
+            self.loaded = True
+            self.logger.info("Indexed %d subtitles", len(self))
+
+    def upsert(self, items: Iterable[SentenceItem]):
+        """Add new subtitles or re-index changed ones (by segment_id)."""
+        for item in items:
+            self.remove(item.segment_id)
+            text = self.normalize(item.text)
+            self._texts[item.segment_id] = text
+            self._episodes[item.segment_id] = item.episode
+            for gram in self.grams(text):
+                self._postings[gram].add(item.segment_id)
+
+            folded = self.fold(item.text)
+            terms = self._index_terms(folded)
+            self._folded[item.segment_id] = folded
+            self._term_lengths[item.segment_id] = len(terms)
+            for term, count in Counter(terms).items():
+                self._term_postings[term][item.segment_id] = count
+
+    def remove(self, segment_id: int):
+        if (text := self._texts.pop(segment_id, None)) is None:
+            return
+
+        del self._episodes[segment_id]
+        for gram in self.grams(text):
+            postings = self._postings[gram]
+            postings.discard(segment_id)
+            if not postings:
+                del self._postings[gram]
+
+        del self._term_lengths[segment_id]
+        for term in set(self._index_terms(self._folded.pop(segment_id))):
+            postings = self._term_postings[term]
+            del postings[segment_id]
+            if not postings:
+                del self._term_postings[term]
+
+    def search(self, text: str, episode: str | None = None) -> list[int]:
+        """Return all segment ids whose text contains `text`, ordered by segment id."""
+        query = self.normalize(text)
+        if len(query) < NGRAM_SIZE:
+            candidates = self._postings.get(query, set()) if query else self._texts.keys()
+        else:
+            posting_sets = sorted(
+                (self._postings.get(gram, set()) for gram in self.grams(query)), key=len
+            )
+            candidates = posting_sets[0].intersection(*posting_sets[1:])
+
+        return sorted(
+            segment_id
+            for segment_id in candidates
+            if query in self._texts[segment_id]
+            and (not episode or self._episodes[segment_id] == episode)
+        )
+
+    def rank(self, text: str, episode: str | None = None, limit: int = FUZZY_LIMIT) -> list[int]:
+        """Return segment ids best matching `text`, best first.
+
+        Subtitles containing the folded query come first, the rest are ordered by BM25
+        score over shared terms, so a wrong or missing character only loses a few terms.
+        """
+        query = self.fold(text)
+        if not query or not self._folded:
+            return []
+
+        average_length = sum(self._term_lengths.values()) / len(self._term_lengths)
+        scores: defaultdict[int, float] = defaultdict(float)
+        for term in set(self.terms(query)):
+            if not (postings := self._term_postings.get(term)):
+                continue
+
+            idf = math.log(1 + (len(self._folded) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for segment_id, count in postings.items():
+                length = self._term_lengths[segment_id]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[segment_id] += idf * count * (BM25_K1 + 1) / (count + norm)
+
+        return heapq.nlargest(
+            limit,
+            (
+                segment_id
+                for segment_id in scores
+                if not episode or self._episodes[segment_id] == episode
+            ),
+            key=lambda segment_id: (query in self._folded[segment_id], scores[segment_id]),
+        )
+
+    def _index_terms(self, folded: str) -> list[str]:
+        """Index both characters and bigrams so that short and long queries can match."""
+        return list(folded) + self.terms(folded) if len(folded) > NGRAM_SIZE else list(folded)
+
+
+subtitle_index = SubtitleIndex()
@@ -0,0 +1,177 @@
+import math
+from collections import deque
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.classes import BaseClassMixin
+from database import RenderTiming, engine
+
+from .const import RENDER_STAGES, TELEMETRY_RING_SIZE
+from .schema import RenderTrace, StageStats
+
+# trace of the render running in current task, stages are added to it wherever they happen
+current_trace: ContextVar[RenderTrace | None] = ContextVar("current_trace", default=None)
+
+
+def add_stage(name: str, seconds: float):
+    """Add duration to `name` stage of current trace, if any (repeated stages add up)."""
+    if (trace := current_trace.get()) is not None:
+        trace.stages[name] = trace.stages.get(name, 0.0) + seconds
+
+
+def mark_cached():
+    """Mark current trace as served from cache."""
+    if (trace := current_trace.get()) is not None:
+        trace.cached = True
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as `name` stage of current trace."""
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        add_stage(name, perf_counter() - started)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of `values` (0 < q <= 100)."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+class RenderTelemetry(BaseClassMixin):
+    """Per-stage durations of recent renders.
+
+    Finished traces are kept in a ring of `size` for reports, and queued for `flush` to write
+    them to `render_timing` table in one transaction. Stages (see `RENDER_STAGES`):
+        lookup:     keyframe / proxy lookup before seeking
+        queue:      waiting for a render slot
+        first_byte: ffmpeg start to first output byte (seek and decode, for GIF also palettegen)
+        ffmpeg:     ffmpeg start to exit
+        store:      writing result to cache
+        upload:     sending result to Discord
+        total:      whole command
+    """
+
+    def __init__(self, size: int = TELEMETRY_RING_SIZE):
+        super().__init__()
+        self.records: deque[RenderTrace] = deque(maxlen=size)
+        self._pending: list[RenderTrace] = []
+
+    @contextmanager
+    def trace(self, kind: str, episode: str, frames: int = 1) -> Iterator[RenderTrace]:
+        """Trace the enclosed block as one render, it is only recorded if it succeeds."""
+        trace = RenderTrace(kind=kind, episode=episode, frames=frames)
+        token = current_trace.set(trace)
+        started = perf_counter()
+        try:
+            yield trace
+        finally:
+            current_trace.reset(token)
+
+        trace.stages["total"] = perf_counter() - started
+        self.records.append(trace)
+        self._pending.append(trace)
+
+    async def flush(self):
+        """Write traces finished since last flush to database.
+
+        If writing fails, the traces are queued again (at most the ring size of them) for
+        the next flush.
+        """
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        try:
+            async with AsyncSession(engine) as session:
+                session.add_all(
+                    RenderTiming(
+                        kind=trace.kind,
+                        episode=trace.episode,
+                        frames=trace.frames,
+                        output_bytes=trace.output_bytes,
+                        cached=trace.cached,
+                        **{name: trace.stages.get(name, 0.0) for name in RENDER_STAGES},
+                    )
+                    for trace in pending
+                )
+                await session.commit()
+        except BaseException:
+            # traces finished during the failed write come after the batch
+            self._pending = [*pending, *self._pending][-self.records.maxlen :]
+            raise
+
+        self.logger.debug("Saved %d render timings", len(pending))
+
+    async def load(self):
+        """Fill the ring with latest timings from database, e.g. after a restart."""
+        async with AsyncSession(engine) as session:
+            rows = (
+                await session.exec(
+                    select(RenderTiming)
+                    .order_by(RenderTiming.create_time.desc())
+                    .limit(self.records.maxlen)
+                )
+            ).all()
+
+        self.records.extendleft(
+            RenderTrace(
+                kind=row.kind,
+                episode=row.episode,
+                frames=row.frames,
+                output_bytes=row.output_bytes,
+                cached=row.cached,
+                stages={name: getattr(row, name) for name in RENDER_STAGES},
+            )
+            for row in rows
+        )
+
+    def select(self, kind: str | None = None, episode: str | None = None) -> list[RenderTrace]:
+        return [
+            trace
+            for trace in self.records
+            if (kind is None or trace.kind == kind)
+            and (episode is None or trace.episode == episode)
+        ]
+
+    @staticmethod
+    def stage_stats(traces: Iterable[RenderTrace]) -> list[StageStats]:
+        """p50 / p95 of every stage that appears in `traces`."""
+        durations: dict[str, list[float]] = {name: [] for name in RENDER_STAGES}
+        for trace in traces:
+            for name, seconds in trace.stages.items():
+                if seconds > 0:
+                    durations[name].append(seconds)
+
+        return [
+            StageStats(
+                name=name, count=len(values), p50=percentile(values, 50), p95=percentile(values, 95)
+            )
+            for name, values in durations.items()
+            if values
+        ]
+
+    @staticmethod
+    def episode_stats(traces: Iterable[RenderTrace]) -> list[StageStats]:
+        """p50 / p95 of total duration per episode."""
+        totals: dict[str, list[float]] = {}
+        for trace in traces:
+            totals.setdefault(trace.episode, []).append(trace.stages["total"])
+
+        return [
+            StageStats(
+                name=episode,
+                count=len(values),
+                p50=percentile(values, 50),
+                p95=percentile(values, 95),
+            )
+            for episode, values in sorted(totals.items())
+        ]
@@ -1,3 +1,5 @@
 from typing import Literal
 
 EpisodeChoices = Literal["1-3", "4", "5", "6", "7", "8", "9", "10", "11", "12", "13"]
+AnimationFormat = Literal["gif", "webp", "mp4"]
+ClipMedia = Literal["video", "audio"]
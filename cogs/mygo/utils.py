@@ -1,19 +1,95 @@
-from io import BytesIO
+import asyncio
+import math
+import os
+from collections import OrderedDict, defaultdict
+from collections.abc import Awaitable, Callable
+from functools import partial
 from pathlib import Path
+from tempfile import SpooledTemporaryFile, TemporaryDirectory
+from typing import BinaryIO, Literal
 
 import ffmpeg
-from sqlmodel import column, func, select
+from discord.utils import DEFAULT_FILE_SIZE_LIMIT_BYTES
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import column, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from config import MyGOConfig
 from core.classes import BaseClassMixin
-from database import EpisodeItem, SentenceItem, engine
-
-from .const import HEIGHT, HOUR, MICROSECOND, MINUTE, PAGED_BY, SECOND
-from .schema import FFProbeResponse, FFProbeStream
-from .types import EpisodeChoices
+from database import SentenceItem, engine
+
+from .cache import ProbeCache, RenderCache, SingleFlight
+from .const import (
+    BATCH_MAX_GAP,
+    CLIP_CRF,
+    CLIP_MAX_SECONDS,
+    CLIP_PRESET,
+    CURSOR_CACHE_SIZE,
+    ENCODE_MAX_PASSES,
+    HOUR,
+    MICROSECOND,
+    MINUTE,
+    PAGED_BY,
+    PHASH_MAX_MATCHES,
+    PREWARM_TOP_K,
+    PROXY_GOP,
+    SECOND,
+    SHEET_MAX_GRID,
+    SHEET_TILE_WIDTH,
+    VIDEO_DIR,
+)
+from .encode import SizeEstimator, encode, ladder
+from .interval import frame_index
+from .keyframe import KeyframeIndex
+from .phash import PerceptualIndex
+from .popularity import PopularityCounter, system_busy
+from .proxy import ProxyStore
+from .registry import episode_registry
+from .render import RenderQueue, RenderQueueFullError
+from .scene import SceneIndex
+from .schema import (
+    EncodeProfile,
+    EpisodeInfo,
+    FFProbeResponse,
+    FFProbeStream,
+    FrameMatch,
+    SearchCursor,
+)
+from .search import subtitle_index
+from .telemetry import RenderTelemetry, mark_cached, stage
+from .types import AnimationFormat, ClipMedia, EpisodeChoices
+
+probe_cache = ProbeCache(MyGOConfig.CACHE_DIR / "probe.json")
 
 
 class SubtitleUtils(BaseClassMixin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.render_queue = RenderQueue(
+            MyGOConfig.RENDER_CONCURRENCY, MyGOConfig.RENDER_MAX_PENDING
+        )
+        self.render_cache = RenderCache(
+            MyGOConfig.CACHE_DIR / "render",
+            MyGOConfig.CACHE_MEMORY_BYTES,
+            MyGOConfig.CACHE_DISK_BYTES,
+        )
+        self.render_flight = SingleFlight()
+        self._cursors: OrderedDict[tuple[str, str | None, bool], SearchCursor] = OrderedDict()
+        # renders of popular segments, filled by `prewarm` and checked before other caches
+        self.warm_store = RenderCache(MyGOConfig.CACHE_DIR / "warm", 0, MyGOConfig.WARM_STORE_BYTES)
+        self.popularity = PopularityCounter(MyGOConfig.CACHE_DIR / "popularity.json")
+        # contact sheets are rarely requested twice in a row, keep them on disk only
+        self.sheet_cache = RenderCache(
+            MyGOConfig.CACHE_DIR / "sheet", 0, MyGOConfig.SHEET_CACHE_BYTES
+        )
+        self.clip_cache = RenderCache(MyGOConfig.CACHE_DIR / "clip", 0, MyGOConfig.CLIP_CACHE_BYTES)
+        self.keyframe_index = KeyframeIndex(MyGOConfig.CACHE_DIR / "keyframes")
+        self.proxy_store = ProxyStore(MyGOConfig.CACHE_DIR / "proxy")
+        self.size_estimator = SizeEstimator()
+        self.telemetry = RenderTelemetry()
+        self.perceptual_index = PerceptualIndex(MyGOConfig.CACHE_DIR / "phash")
+        self.scene_index = SceneIndex(MyGOConfig.CACHE_DIR / "scene")
+
     @staticmethod
     def _frame_to_time(frame: int, frame_rate: float) -> str:
         total_seconds, ms = divmod(frame / frame_rate, SECOND)
@@ -22,16 +98,15 @@ class SubtitleUtils(BaseClassMixin):
         return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}.{int(ms * MICROSECOND):03d}"
 
     @staticmethod
-    async def _check_frame_exist(episode: EpisodeChoices, *frames: int) -> list[bool]:
-        async with AsyncSession(engine) as session:
-            # episode_data = await session.get(EpisodeItem, episode)
-            episode_data = (
-                await session.exec(select(EpisodeItem).where(EpisodeItem.episode == episode))
-            ).first()
-        if episode_data is None:
-            raise ValueError(f"Episode {episode} does not exist")
+    async def get_episode(episode: EpisodeChoices) -> EpisodeInfo:
+        """Get episode metadata from in-memory registry."""
+        await episode_registry.ensure_loaded()
+        return episode_registry.get(episode)
 
-        return list(map(lambda frame: 0 <= frame <= episode_data.total_frame, frames))
+    @staticmethod
+    async def _check_frame_exist(episode: EpisodeChoices, *frames: int) -> list[bool]:
+        await episode_registry.ensure_loaded()
+        return episode_registry.check_frames(episode, *frames)
 
     @staticmethod
     async def get_total_frame_number(
@@ -39,75 +114,366 @@ class SubtitleUtils(BaseClassMixin):
     ) -> FFProbeStream:
         r"""Get total frame number of video file.
 
+        Result is kept in `probe_cache` until size or mtime of the file changes,
+        ffprobe itself runs in a worker thread.
+
         Equivalent to:
             ffprobe -select_streams v:0 -show_streams -print_format json ${episode}.mp4
         """
-        video_path = Path.home() / "mygo-anime" / f"{episode}.mp4"
+        video_path = VIDEO_DIR / f"{episode}.mp4"
+        if (stream := probe_cache.get(video_path)) is not None:
+            return stream
 
-        media = ffmpeg.probe(
-            video_path, select_streams="v:0", show_streams=None, print_format="json"
+        media = await asyncio.to_thread(
+            ffmpeg.probe, video_path, select_streams="v:0", show_streams=None, print_format="json"
         )
 
         # get the first video stream
-        return FFProbeResponse.model_validate(media).streams[0]
+        stream = FFProbeResponse.model_validate(media).streams[0]
+        probe_cache.put(video_path, stream)
+        return stream
+
+    async def _open_at(
+        self,
+        episode_data: EpisodeInfo,
+        start_frame: int,
+        end_frame: int | None = None,
+        proxy: bool = False,
+    ) -> ffmpeg.nodes.FilterableStream:
+        """Open video stream starting exactly at `start_frame`, until `end_frame` (exclusive).
+
+        Input seeks straight to the nearest preceding keyframe and `trim` drops the frames
+        before `start_frame`, so the result is frame accurate. If the keyframe index is
+        unavailable, fall back to timestamp seek.
+
+        If `proxy` is True and an up-to-date proxy of the episode exists, read it instead,
+        keyframes of a proxy are known without index.
+        """
+        source, skip, _ = await self._seek(episode_data, start_frame, proxy)
+        trim_kwargs = {"start_frame": skip}
+        if end_frame is not None:
+            trim_kwargs["end_frame"] = end_frame - start_frame + skip
+
+        return source.trim(**trim_kwargs).setpts("PTS-STARTPTS")
+
+    async def _seek(
+        self, episode_data: EpisodeInfo, start_frame: int, proxy: bool = False
+    ) -> tuple[ffmpeg.nodes.FilterableStream, int, float]:
+        """Open video file at the nearest keyframe preceding `start_frame`.
+
+        Return the input, number of frames before `start_frame` in it and timestamp (seconds)
+        of `start_frame` in it, the latter is where audio of the range starts. See `_open_at`
+        for `proxy`.
+        """
+        video_path = episode_data.video_path
+        with stage("lookup"):
+            if proxy and (proxy_path := self.proxy_store.get(video_path)) is not None:
+                video_path = proxy_path
+                keyframe = start_frame - start_frame % PROXY_GOP
+            else:
+                keyframe = await self.keyframe_index.preceding(episode_data, start_frame)
+
+        if keyframe is None:
+            start_time = self._frame_to_time(start_frame, episode_data.frame_rate)
+            return ffmpeg.input(video_path, ss=start_time), 0, 0.0
+
+        # seek half a frame after the keyframe, then input seek lands on the keyframe itself
+        # (no frame is dropped by -noaccurate_seek) whatever the timestamp rounding is
+        seek_time = (keyframe + 0.5) / episode_data.frame_rate
+        return (
+            ffmpeg.input(video_path, ss=f"{seek_time:.6f}", noaccurate_seek=None),
+            start_frame - keyframe,
+            start_frame / episode_data.frame_rate - seek_time,
+        )
+
+    async def warm_keyframes(self):
+        """Build missing keyframe indexes of all episodes."""
+        await episode_registry.ensure_loaded()
+        await self.keyframe_index.warm(list(episode_registry))
+
+    async def _cached_render(
+        self,
+        cache_key: str,
+        render: Callable[[], Awaitable[BinaryIO]],
+        cache: RenderCache | None = None,
+    ) -> BinaryIO:
+        """Return cached result or render it, concurrent identical renders share one job.
+
+        Result is opened from the cache, so large outputs are never held in memory whole.
+        Outputs too large for the cache are handed to the caller that rendered them as is,
+        other callers of the shared job render again. `cache` defaults to `self.render_cache`.
+        """
+        cache = cache or self.render_cache
+        if (cached := await self._open_cached(cache_key, cache)) is not None:
+            self.logger.info("Cache hit for render %s", cache_key)
+            mark_cached()
+            return cached
+
+        rendered_here = False
+
+        async def render_and_store() -> BinaryIO | None:
+            nonlocal rendered_here
+            rendered_here = True
+            output = await render()
+            try:
+                with stage("store"):
+                    await cache.put_file(cache_key, output)
+            except BaseException:
+                output.close()
+                raise
+
+            if await cache.contains(cache_key):
+                output.close()
+                return None
+
+            return output  # too large for the cache
+
+        def close_unused(output: BinaryIO | None):
+            # this caller was cancelled before it could take the output too large for the cache
+            if output is not None:
+                output.close()
+
+        if (
+            output := await self.render_flight.do(cache_key, render_and_store, close_unused)
+        ) is not None:
+            if rendered_here:
+                return output
+
+            return await render()
+
+        if (stored := await cache.open(cache_key, count=False)) is not None:
+            return stored
+
+        # evicted by another render in the meantime
+        return await render()
+
+    async def _open_cached(self, cache_key: str, cache: RenderCache) -> BinaryIO | None:
+        if await self.warm_store.contains(cache_key):
+            return await self.warm_store.open(cache_key)
+
+        return await cache.open(cache_key)
+
+    async def _store(self, cache_key: str, output: BinaryIO, cache: RenderCache) -> BinaryIO:
+        """Put render output into `cache` and return it opened from there.
+
+        `output` is closed, unless it is too large for the cache and returned itself.
+        """
+        try:
+            with stage("store"):
+                await cache.put_file(cache_key, output)
+        except BaseException:
+            output.close()
+            raise
+
+        if (stored := await cache.open(cache_key, count=False)) is not None:
+            output.close()
+            return stored
+
+        return output  # too large for the cache, `put_file` rewound it
+
+    @staticmethod
+    def _spool() -> BinaryIO:
+        """Temporary file for one render output, kept in memory up to `RENDER_SPOOL_BYTES`."""
+        MyGOConfig.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        return SpooledTemporaryFile(
+            max_size=MyGOConfig.RENDER_SPOOL_BYTES, dir=MyGOConfig.CACHE_DIR
+        )
+
+    async def _run_spooled(self, args: list[str]) -> BinaryIO:
+        """Run ffmpeg through `self.render_queue`, streaming its stdout into `_spool`."""
+        output = self._spool()
+        try:
+            await self.render_queue.run(args, output=output)
+        except BaseException:
+            output.close()
+            raise
+
+        return output
+
+    async def prewarm(
+        self, k: int = PREWARM_TOP_K, max_bytes: int = DEFAULT_FILE_SIZE_LIMIT_BYTES
+    ) -> int:
+        """Render frame and GIF of the `k` most requested segments into `self.warm_store`.
+
+        GIFs are rendered with the profile `extract_animation` picks first for `max_bytes`
+        (upload limit of most servers), so they share cache keys with the `gif` command.
+        Results go to `self.warm_store` only, not `self.render_cache`.
+
+        Stop as soon as users are rendering or the system is busy, and return the number of
+        newly warmed renders.
+        """
+        self.popularity.save()
+        try:
+            items = await self.get_items_by_segment_ids(self.popularity.top(k))
+        except SQLAlchemyError as error:
+            self.logger.warning("Failed to fetch popular segments: %s", error)
+            return 0
+
+        warmed = 0
+        for item in items:
+            # one segment of a missing video or unknown episode must not block the rest
+            try:
+                renders = await self._prewarm_renders(item, max_bytes)
+            except (OSError, ValueError) as error:
+                self.logger.warning("Failed to prewarm segment %d: %s", item.segment_id, error)
+                continue
+
+            for cache_key, render in renders:
+                if await self.warm_store.contains(cache_key):
+                    continue
+
+                stats = self.render_queue.stats()
+                if stats.running or stats.waiting or system_busy():
+                    self.logger.info("Prewarm paused after %d renders, system is busy", warmed)
+                    return warmed
+
+                try:
+                    result = await render()
+                except RenderQueueFullError:
+                    self.logger.info("Prewarm paused after %d renders, queue is full", warmed)
+                    return warmed
+                except (ffmpeg.Error, OSError, ValueError) as error:
+                    self.logger.warning("Failed to prewarm segment %d: %s", item.segment_id, error)
+                    continue
+
+                with result:
+                    await self.warm_store.put_file(cache_key, result)
+                warmed += 1
+
+        self.logger.info("Prewarmed %d renders", warmed)
+        return warmed
+
+    async def _prewarm_renders(
+        self, item: SentenceItem, max_bytes: int
+    ) -> list[tuple[str, Callable[[], Awaitable[BinaryIO]]]]:
+        """Cache keys and render calls of frame and GIF of `item`, as `prewarm` warms them."""
+        episode_data = await self.get_episode(item.episode)
+        renders = [
+            (
+                self._frame_key(episode_data, item.frame_start),
+                partial(self._render_frame, episode_data, item.frame_start),
+            )
+        ]
+        if item.frame_end > item.frame_start:
+            profiles = ladder("gif")
+            profile = profiles[
+                self.size_estimator.pick(
+                    profiles,
+                    item.frame_end - item.frame_start,
+                    episode_data.frame_rate,
+                    max_bytes,
+                )
+            ]
+            renders.append(
+                (
+                    self._animation_key(
+                        episode_data, item.frame_start, item.frame_end, False, profile
+                    ),
+                    partial(
+                        self._render_animation,
+                        episode_data,
+                        item.frame_start,
+                        item.frame_end,
+                        False,
+                        profile,
+                    ),
+                )
+            )
+
+        return renders
 
     async def extract_frame(
         self,
         episode: EpisodeChoices,
         frame_number: int,
-    ) -> BytesIO:
-        r"""Extract frame from video file as BytesIO.
+    ) -> BinaryIO:
+        r"""Extract frame from video file as file object.
 
         Equivalent to:
             ffmpeg -i ${episode}.mp4 -ss ${frame_time} -vframes 1 -f image2 -vcodec png -y ${output}
         """
+        if frame_number < 0:
+            raise ValueError("Frame number must be positive")
+
         if all(await self._check_frame_exist(episode, frame_number)) is False:
             raise ValueError(f"Frame {frame_number} does not exist in episode {episode}")
 
-        if frame_number < 0:
-            raise ValueError("Frame number must be positive")
+        episode_data = await self.get_episode(episode)
+        return await self._cached_render(
+            self._frame_key(episode_data, frame_number),
+            partial(self._render_frame, episode_data, frame_number),
+        )
 
-        async with AsyncSession(engine) as session:
-            episode_data = await session.get(EpisodeItem, episode)
+    def _frame_key(self, episode_data: EpisodeInfo, frame_number: int) -> str:
+        return self.render_cache.make_key(
+            "frame",
+            episode_data.episode,
+            frame_number,
+            episode_data.video_path.stat().st_mtime_ns,
+        )
 
-        video_path = Path.home() / "mygo-anime" / f"{episode}.mp4"
-        self.logger.info("Extracting frame %d from %s", frame_number, video_path)
+    def _animation_key(
+        self,
+        episode_data: EpisodeInfo,
+        start_frame: int,
+        end_frame: int,
+        reverse: bool,
+        profile: EncodeProfile,
+    ) -> str:
+        return self.render_cache.make_key(
+            "animation",
+            episode_data.episode,
+            start_frame,
+            end_frame,
+            reverse,
+            profile.model_dump_json(),
+            episode_data.video_path.stat().st_mtime_ns,
+        )
 
-        process = ffmpeg.input(
-            video_path,
-            ss=self._frame_to_time(frame_number, episode_data.frame_rate),
-        ).output("pipe:", vframes=1, format="image2", vcodec="mjpeg")
-        result, _ = process.run(capture_stdout=True)
+    async def _render_frame(self, episode_data: EpisodeInfo, frame_number: int) -> BinaryIO:
+        video_path = episode_data.video_path
+        self.logger.info("Extracting frame %d from %s", frame_number, video_path)
 
-        self.logger.debug(
-            "Extracted frame %d from %s: result=%s",
-            frame_number,
-            video_path,
-            result[:100],
+        process = (await self._open_at(episode_data, frame_number)).output(
+            "pipe:", vframes=1, format="image2", vcodec="mjpeg"
         )
-        return BytesIO(result)
+        return await self._run_spooled(process.compile())
 
     async def extract_gif(
         self,
         episode: EpisodeChoices,
         start_frame: int,
         end_frame: int,
-    ) -> BytesIO:
+    ) -> BinaryIO:
         r"""Extract frame range from video file as GIF.
 
         If start frame is greater than end frame, result GIF will be reversed.
 
-        video_path = Path.home() / "mygo-anime" / f"{EPISODE}.mp4"
-        # implement below two process
+        Rendering is done by ffmpeg subprocess through `self.render_queue`.
 
         ffmpeg -ss $start_time -to $end_time -i $video_path -vf "palettegen" -y $palette
         ffmpeg -ss $start_time -to $end_time -i $video_path -i $palette \
             -lavfi "$filters [x]; [x][1:v] paletteuse" -y $output
         """
-        video_path = Path.home() / "mygo-anime" / f"{episode}.mp4"
+        return await self.extract_animation(episode, start_frame, end_frame, "gif")
+
+    async def extract_animation(
+        self,
+        episode: EpisodeChoices,
+        start_frame: int,
+        end_frame: int,
+        output_format: AnimationFormat = "gif",
+        max_bytes: int | None = None,
+    ) -> BinaryIO:
+        """Extract frame range from video file as GIF, animated WebP or MP4.
+
+        If start frame is greater than end frame, result will be reversed.
+
+        Without `max_bytes` the range is rendered with the best profile of `ladder`. Otherwise
+        `self.size_estimator` picks the best profile expected to fit, and a smaller one is
+        tried if the result is still too large, up to `ENCODE_MAX_PASSES` renders.
+        """
         reverse = False
-        async with AsyncSession(engine) as session:
-            episode_data = await session.get(EpisodeItem, episode)
 
         if start_frame > end_frame:
             start_frame, end_frame = end_frame, start_frame
@@ -118,32 +484,490 @@ class SubtitleUtils(BaseClassMixin):
                 episode, start_frame
             )  # fallback to extract single frame
 
-        # process palettegen and paletteuse
-        input_stream = ffmpeg.input(
-            video_path,
-            ss=self._frame_to_time(start_frame, episode_data.frame_rate),
-            to=self._frame_to_time(end_frame, episode_data.frame_rate),
-        ).filter("scale", HEIGHT, -1)
+        if all(await self._check_frame_exist(episode, start_frame, end_frame)) is False:
+            raise ValueError(
+                f"Frame range {start_frame} ~ {end_frame} does not exist in episode {episode}"
+            )
+
+        episode_data = await self.get_episode(episode)
+        profiles = ladder(output_format)
+        if max_bytes is None:
+            return await self._render_profile(
+                episode_data, start_frame, end_frame, reverse, profiles[0]
+            )
+
+        frames = end_frame - start_frame
+        for _ in range(ENCODE_MAX_PASSES):
+            if not profiles:
+                break
+
+            index = self.size_estimator.pick(profiles, frames, episode_data.frame_rate, max_bytes)
+            profile, profiles = profiles[index], profiles[index + 1 :]
+            result = await self._render_profile(
+                episode_data, start_frame, end_frame, reverse, profile
+            )
+            size = result.seek(0, os.SEEK_END)
+            result.seek(0)
+            self.size_estimator.observe(profile, frames, episode_data.frame_rate, size)
+            if size <= max_bytes:
+                return result
+
+            result.close()
+            self.logger.info(
+                "Rendered %s is %d bytes, larger than %d bytes", profile, size, max_bytes
+            )
+
+        raise ValueError(
+            f"Frame range {start_frame} ~ {end_frame} is too long to fit in "
+            f"{max_bytes / 1024**2:.1f}MB as {output_format}"
+        )
+
+    async def snap_to_cuts(
+        self, episode: EpisodeChoices, start_frame: int, end_frame: int
+    ) -> tuple[int, int]:
+        """Trim frame range to scene cuts near its ends, so no other shot flashes by.
+
+        Reversed ranges stay reversed. Range is kept as is if cuts of the episode are not
+        detected yet (see `python -m cogs.mygo.scene`).
+        """
+        episode_data = await self.get_episode(episode)
+        start, end = sorted((start_frame, end_frame))
+        start, end = await asyncio.to_thread(
+            self.scene_index.snap, episode, episode_data.video_path, start, end
+        )
+        return (end, start) if start_frame > end_frame else (start, end)
+
+    async def _render_profile(
+        self,
+        episode_data: EpisodeInfo,
+        start_frame: int,
+        end_frame: int,
+        reverse: bool,
+        profile: EncodeProfile,
+    ) -> BinaryIO:
+        return await self._cached_render(
+            self._animation_key(episode_data, start_frame, end_frame, reverse, profile),
+            partial(self._render_animation, episode_data, start_frame, end_frame, reverse, profile),
+        )
+
+    async def _render_animation(
+        self,
+        episode_data: EpisodeInfo,
+        start_frame: int,
+        end_frame: int,
+        reverse: bool,
+        profile: EncodeProfile,
+    ) -> BinaryIO:
+        video_path = episode_data.video_path
+
+        input_stream = await self._open_at(
+            episode_data, start_frame, end_frame, proxy=MyGOConfig.USE_PROXY
+        )
         if reverse:
             input_stream = input_stream.filter("reverse")
 
+        process = encode(input_stream, profile, episode_data.frame_rate)
+
+        self.logger.info(
+            "Extracting %s from %s: start_frame=%d, end_frame=%d with below command\n%s",
+            profile.output_format,
+            video_path,
+            start_frame,
+            end_frame,
+            ", ".join(map(str, process.get_args())),
+        )
+
+        return await self._run_spooled(process.compile())
+
+    async def render_segments(
+        self, segment_ids: list[int], response_type: Literal["frame", "gif"] = "frame"
+    ) -> dict[int, BinaryIO]:
+        """Render first frame or GIF of many segments, keyed by segment id.
+
+        Segments are grouped by episode and sorted by time. Segments less than
+        `BATCH_MAX_GAP` seconds apart are cut by `trim` from one decoded stream, so a
+        group costs a single ffmpeg run. Results share the cache of single renders.
+        """
+        results: dict[int, BinaryIO] = {}
+        keys: dict[int, str] = {}
+        episodes: dict[str, list[SentenceItem]] = defaultdict(list)
+        for item in await self.get_items_by_segment_ids(segment_ids):
+            if response_type == "gif" and item.frame_end == item.frame_start:
+                # single frame segment, rendered like `extract_animation` does
+                results[item.segment_id] = await self.extract_frame(item.episode, item.frame_start)
+                continue
+
+            frames = self._span(item)
+            if all(await self._check_frame_exist(item.episode, *frames)) is False:
+                raise ValueError(f"Segment {item.segment_id} does not exist in its episode")
+
+            episode_data = await self.get_episode(item.episode)
+            if response_type == "frame":
+                keys[item.segment_id] = self._frame_key(episode_data, item.frame_start)
+            else:
+                # reversed segments play backwards, as in `extract_animation`
+                keys[item.segment_id] = self._animation_key(
+                    episode_data, *frames, item.frame_start > item.frame_end, ladder("gif")[0]
+                )
+
+            if (
+                cached := await self._open_cached(keys[item.segment_id], self.render_cache)
+            ) is not None:
+                results[item.segment_id] = cached
+            else:
+                episodes[item.episode].append(item)
+
+        jobs = []
+        for episode, items in episodes.items():
+            episode_data = await self.get_episode(episode)
+            jobs.extend(
+                self._render_batch(episode_data, group, response_type, keys)
+                for group in self._group_by_gap(items, BATCH_MAX_GAP * episode_data.frame_rate)
+            )
+
+        for rendered in await asyncio.gather(*jobs):
+            results.update(rendered)
+
+        return {
+            segment_id: results[segment_id] for segment_id in segment_ids if segment_id in results
+        }
+
+    @staticmethod
+    def _span(item: SentenceItem) -> tuple[int, int]:
+        """First and last frame of `item` in time, its frames may be reversed."""
+        return min(item.frame_start, item.frame_end), max(item.frame_start, item.frame_end)
+
+    @classmethod
+    def _group_by_gap(cls, items: list[SentenceItem], max_gap: float) -> list[list[SentenceItem]]:
+        """Sort `items` by time and group the ones less than `max_gap` frames apart."""
+        groups: list[list[SentenceItem]] = []
+        for item in sorted(items, key=lambda item: cls._span(item)[0]):
+            if groups and cls._span(item)[0] - max(cls._span(i)[1] for i in groups[-1]) <= max_gap:
+                groups[-1].append(item)
+            else:
+                groups.append([item])
+
+        return groups
+
+    async def _render_batch(
+        self,
+        episode_data: EpisodeInfo,
+        items: list[SentenceItem],
+        response_type: Literal["frame", "gif"],
+        keys: dict[int, str],
+    ) -> dict[int, BinaryIO]:
+        """Decode the range of sorted `items` once, and `split` it into one output per item.
+
+        Every output is stored in `self.render_cache` under `keys` of its segment id.
+        """
+        start_frame = self._span(items[0])[0]
+        end_frame = max(self._span(item)[1] for item in items) + 1
+        input_stream = await self._open_at(
+            episode_data,
+            start_frame,
+            end_frame,
+            proxy=response_type == "gif" and MyGOConfig.USE_PROXY,
+        )
         split = input_stream.split()
-        palette = split[0].filter("palettegen")
-        process_palette = ffmpeg.filter([split[1], palette], "paletteuse").output(
-            "pipe:", vcodec="gif", format="gif"
+
+        with TemporaryDirectory() as directory:
+            outputs, paths = [], {}
+            for index, item in enumerate(items):
+                if response_type == "frame":
+                    path = Path(directory) / f"{index}.jpg"
+                    branch = split[index].trim(
+                        start_frame=item.frame_start - start_frame,
+                        end_frame=item.frame_start - start_frame + 1,
+                    )
+                    output = branch.output(str(path), vframes=1, format="image2", vcodec="mjpeg")
+                else:
+                    path = Path(directory) / f"{index}.gif"
+                    first, last = self._span(item)
+                    branch = (
+                        split[index]
+                        .trim(start_frame=first - start_frame, end_frame=last - start_frame)
+                        .setpts("PTS-STARTPTS")
+                    )
+                    if item.frame_start > item.frame_end:
+                        branch = branch.filter("reverse")
+                    output = encode(branch, ladder("gif")[0], episode_data.frame_rate, str(path))
+
+                outputs.append(output)
+                paths[item.segment_id] = path
+
+            self.logger.info(
+                "Rendering %d segments of episode %s in one pass: %d ~ %d",
+                len(items),
+                episode_data.episode,
+                start_frame,
+                end_frame,
+            )
+            await self.render_queue.run(ffmpeg.merge_outputs(*outputs).compile())
+
+            results = {}
+            for segment_id, path in paths.items():
+                # still readable after the directory is removed, `_store` owns it
+                results[segment_id] = await self._store(
+                    keys[segment_id], path.open("rb"), self.render_cache
+                )
+
+            return results
+
+    async def extract_sheet(self, segment_id: int, columns: int, rows: int) -> BinaryIO:
+        """Render `columns` x `rows` contact sheet of evenly spaced frames of a segment.
+
+        Every tile is labeled with its frame number. Result is kept in `self.sheet_cache`.
+        """
+        if not (0 < columns <= SHEET_MAX_GRID and 0 < rows <= SHEET_MAX_GRID):
+            raise ValueError(f"Grid size must be between 1x1 and {SHEET_MAX_GRID}x{SHEET_MAX_GRID}")
+
+        item = await self.get_item_by_segment_id(segment_id)
+        if item is None:
+            raise ValueError(f"Segment {segment_id} does not exist")
+
+        frame_end = max(item.frame_start, item.frame_end)
+        if all(await self._check_frame_exist(item.episode, item.frame_start, frame_end)) is False:
+            raise ValueError(f"Segment {segment_id} does not exist in episode {item.episode}")
+
+        episode_data = await self.get_episode(item.episode)
+        cache_key = self.render_cache.make_key(
+            "sheet", segment_id, columns, rows, episode_data.video_path.stat().st_mtime_ns
+        )
+        return await self._cached_render(
+            cache_key,
+            partial(self._render_sheet, episode_data, item.frame_start, frame_end, columns, rows),
+            cache=self.sheet_cache,
         )
 
+    async def _render_sheet(
+        self, episode_data: EpisodeInfo, start_frame: int, end_frame: int, columns: int, rows: int
+    ) -> BinaryIO:
+        """Select tiles by `select`, label them by `drawtext` and join them by `tile`."""
+        count = min(columns * rows, end_frame - start_frame + 1)
+        step = (end_frame - start_frame) / (count - 1) if count > 1 else 0
+        offsets = [math.floor(index * step + 0.5) for index in range(count)]
+
+        process = (
+            (await self._open_at(episode_data, start_frame, end_frame + 1))
+            .filter("select", "+".join(f"eq(n,{offset})" for offset in offsets))
+            .filter("scale", SHEET_TILE_WIDTH, -1)
+            # `n` of drawtext counts selected frames, map it back to frame number
+            .filter(
+                "drawtext",
+                text=f"%{{eif:{start_frame}+floor(n*{step}+0.5):d}}",
+                x=8,
+                y=8,
+                fontsize=24,
+                fontcolor="white",
+                box=1,
+                boxcolor="black@0.6",
+            )
+            .filter("tile", f"{columns}x{rows}")
+            .output("pipe:", vframes=1, format="image2", vcodec="mjpeg")
+        )
         self.logger.info(
-            "Extracting GIF from %s: start_frame=%d, end_frame=%d with below command\n%s",
-            video_path,
+            "Rendering %dx%d sheet of %s: %d ~ %d",
+            columns,
+            rows,
+            episode_data.video_path,
             start_frame,
             end_frame,
-            ", ".join(map(str, process_palette.get_args())),
         )
+        return await self._run_spooled(process.compile())
 
-        result, _ = process_palette.run(capture_stdout=True)
+    async def extract_clip(
+        self,
+        episode: EpisodeChoices,
+        start_frame: int,
+        end_frame: int,
+        media: ClipMedia = "video",
+    ) -> BinaryIO:
+        """Cut frame range (inclusive) from video file as MP4 video or M4A audio.
 
-        return BytesIO(result)
+        Streams are copied without re-encoding when possible, see `_render_clip`. Result is
+        kept in `self.clip_cache`.
+        """
+        start_frame, end_frame = sorted((start_frame, end_frame))
+        if all(await self._check_frame_exist(episode, start_frame, end_frame)) is False:
+            raise ValueError(
+                f"Frame range {start_frame} ~ {end_frame} does not exist in episode {episode}"
+            )
+
+        episode_data = await self.get_episode(episode)
+        if (end_frame - start_frame + 1) / episode_data.frame_rate > CLIP_MAX_SECONDS:
+            raise ValueError(f"Clip must be at most {CLIP_MAX_SECONDS:.0f} seconds long")
+
+        cache_key = self.clip_cache.make_key(
+            "clip",
+            episode,
+            start_frame,
+            end_frame,
+            media,
+            episode_data.video_path.stat().st_mtime_ns,
+        )
+        return await self._cached_render(
+            cache_key,
+            partial(self._render_clip, episode_data, start_frame, end_frame, media),
+            cache=self.clip_cache,
+        )
+
+    @staticmethod
+    def _keyframe_aligned(
+        keyframes: list[int], start_frame: int, end_frame: int, total_frame: int
+    ) -> bool:
+        """Whether range starts at a keyframe and ends right before one (or at the end)."""
+        return start_frame in keyframes and (
+            end_frame + 1 >= total_frame or end_frame + 1 in keyframes
+        )
+
+    async def _render_clip(
+        self, episode_data: EpisodeInfo, start_frame: int, end_frame: int, media: ClipMedia
+    ) -> BinaryIO:
+        r"""Copy video of range when it is keyframe aligned, re-encode it otherwise.
+
+        Audio is always cut by `atrim` and re-encoded: copied audio would start at the
+        packet before the seek point, not where the range starts. Equivalent to:
+            ffmpeg -ss ${keyframe} -noaccurate_seek -i ${episode}.mp4 \
+                -filter_complex "[0:v] trim, setpts, fps [v]; [0:a] atrim, asetpts [a]" \
+                -map [v] -map [a] -c:v libx264 -c:a aac \
+                -f mp4 -movflags frag_keyframe+empty_moov+negative_cts_offsets pipe:
+        and `-map 0:v -c:v copy -frames:v ${count}` for video instead when copying.
+        """
+        count = end_frame - start_frame + 1
+        duration = count / episode_data.frame_rate
+        # negative composition offsets let the first frame start at 0 despite B-frame delay,
+        # fragmented output has no edit list to hide it
+        output_kwargs = {
+            "format": "mp4",
+            "movflags": "frag_keyframe+empty_moov+negative_cts_offsets",
+            "acodec": "aac",
+        }
+
+        source, skip, start_time = await self._seek(episode_data, start_frame)
+        audio = source.audio.filter(
+            "atrim", start=f"{start_time:.6f}", end=f"{start_time + duration:.6f}"
+        ).filter("asetpts", "PTS-STARTPTS")
+        if media == "audio":
+            process = audio.output("pipe:", **output_kwargs)
+        elif skip == 0 and self._keyframe_aligned(
+            await self.keyframe_index.get(episode_data),
+            start_frame,
+            end_frame,
+            episode_data.total_frame,
+        ):
+            process = ffmpeg.output(
+                source.video,
+                audio,
+                "pipe:",
+                vcodec="copy",
+                # packets are cut in decode order, so count frames instead of time
+                vframes=count,
+                **output_kwargs,
+            )
+        else:
+            video = (
+                source.video.trim(start_frame=skip, end_frame=skip + count)
+                .setpts("PTS-STARTPTS")
+                .filter("fps", episode_data.frame_rate)
+            )
+            process = ffmpeg.output(
+                video,
+                audio,
+                "pipe:",
+                vcodec="libx264",
+                preset=CLIP_PRESET,
+                crf=CLIP_CRF,
+                pix_fmt="yuv420p",
+                **output_kwargs,
+            )
+
+        self.logger.info(
+            "Cutting %s clip of %s: %d ~ %d with below command\n%s",
+            media,
+            episode_data.video_path,
+            start_frame,
+            end_frame,
+            ", ".join(map(str, process.get_args())),
+        )
+        return await self._run_spooled(process.compile())
+
+    async def whereis(
+        self, image: bytes, k: int = PHASH_MAX_MATCHES
+    ) -> list[tuple[FrameMatch, list[SentenceItem]]]:
+        """Find frames looking like `image` and the subtitles shown on them.
+
+        Frame hashes are built offline by `python -m cogs.mygo.phash`.
+        """
+        await self.perceptual_index.ensure_loaded()
+        query = await self.perceptual_index.hash_image(image, self.render_queue)
+        matches = await asyncio.to_thread(self.perceptual_index.search, query, k)
+        self.logger.info("Found %d frames by hash %016x", len(matches), query)
+        return [
+            (match, await self.get_items_at_frame(match.episode, match.frame)) for match in matches
+        ]
+
+    @staticmethod
+    async def get_items_at_frame(episode: EpisodeChoices, frame: int) -> list[SentenceItem]:
+        """Return subtitles shown on `frame` of `episode`, see `FrameIndex`."""
+        await frame_index.ensure_loaded()
+        return frame_index.at(episode, frame)
+
+    @staticmethod
+    async def get_items_in_range(
+        episode: EpisodeChoices, start: int, end: int
+    ) -> list[SentenceItem]:
+        """Return subtitles shown on any frame of `start` ~ `end` of `episode`."""
+        await frame_index.ensure_loaded()
+        return frame_index.overlapping(episode, start, end)
+
+    async def open_cursor(
+        self,
+        text: str,
+        episode: EpisodeChoices | None = None,
+        fuzzy: bool = False,
+    ) -> SearchCursor:
+        """Search subtitle by text and episode, and keep all matched segment ids in order.
+
+        Matching is done by in-memory `subtitle_index`. If `fuzzy` is True, best matches of
+        `subtitle_index.rank` come first, otherwise result is equivalent to:
+            SELECT segment_id FROM sentence
+            WHERE episode = ${episode} AND text LIKE '%${text}%'
+            ORDER BY segment_id
+
+        The last `CURSOR_CACHE_SIZE` results are reused until they expire, so paging through
+        a search message does not search again.
+        """
+        key = (text, episode, fuzzy)
+        if (cursor := self._cursors.get(key)) is not None and not cursor.expired():
+            self._cursors.move_to_end(key)
+            return cursor
+
+        await subtitle_index.ensure_loaded()
+
+        self.logger.info(
+            "Searching subtitle by text: %s, episode: %s, fuzzy: %s", text, episode, fuzzy
+        )
+        if fuzzy:
+            segment_ids = subtitle_index.rank(text, episode)
+        else:
+            segment_ids = subtitle_index.search(text, episode)
+
+        cursor = self._cursors[key] = SearchCursor(
+            text=text, episode=episode, fuzzy=fuzzy, segment_ids=segment_ids
+        )
+        self._cursors.move_to_end(key)
+        while len(self._cursors) > CURSOR_CACHE_SIZE:
+            self._cursors.popitem(last=False)
+
+        return cursor
+
+    async def fetch_page(
+        self, cursor: SearchCursor, nth_page: int = 1, paged_by: int = PAGED_BY
+    ) -> list[SentenceItem]:
+        """(1-indexed) Fetch only the rows of requested page of `cursor`."""
+        if paged_by <= 0 or nth_page <= 0:
+            raise ValueError("Page number and page size must be positive.")
+        return await self.get_items_by_segment_ids(cursor.page(nth_page, paged_by))
 
     async def search_title_by_text(
         self,
@@ -151,56 +975,35 @@ class SubtitleUtils(BaseClassMixin):
         episode: EpisodeChoices | None = None,
         paged_by: int = PAGED_BY,
         nth_page: int = 1,
+        fuzzy: bool = False,
     ) -> tuple[list[SentenceItem], int]:
         """(1-indexed).
 
-        Search subtitle by text and episode. and return paged result.
+        Search subtitle by text and episode. and return paged result with total count.
 
         Assume that paged_by is always greater than 0 and nth_page is always greater than 0
-
-        Equivalent to:
-            SELECT * FROM sentence
-            WHERE episode = ${episode} AND text LIKE '%${text}%'
-            LIMIT ${paged_by} OFFSET ${paged_by * (nth_page - 1)}
         """
-        assert paged_by > 0 and nth_page > 0, "Invalid Input"
-        async with AsyncSession(engine) as session:
-            sql_query = (
-                select(SentenceItem)
-                .where(
-                    column("text").contains(text),
-                )
-                .limit(paged_by)
-                .offset(paged_by * (nth_page - 1))
-            )
+        cursor = await self.open_cursor(text, episode, fuzzy)
+        return await self.fetch_page(cursor, nth_page, paged_by), cursor.count
 
-            # pylint: disable=not-callable
-            count_query = select(func.count(SentenceItem.segment_id)).where(
-                column("text").contains(text)
-            )
-
-            # Add condifion for episode(if provided)
-            if episode:
-                sql_query = sql_query.where(SentenceItem.episode == episode)
-                count_query = count_query.where(SentenceItem.episode == episode)
+    @staticmethod
+    async def get_items_by_segment_ids(segment_ids: list[int]) -> list[SentenceItem]:
+        """Fetch subtitles in one query, keeping order of `segment_ids`."""
+        if not segment_ids:
+            return []
 
-            self.logger.info(
-                "Searching subtitle by text: %s, episode: %s, paged_by: %d, nth_page: %d",
-                text,
-                episode,
-                paged_by,
-                nth_page,
-            )
-            self.logger.debug(
-                "SQL Query: %s\nCount Query: %s",
-                sql_query.compile(),
-                count_query.compile(),
-            )
+        async with AsyncSession(engine) as session:
+            rows = (
+                await session.exec(
+                    select(SentenceItem).where(column("segment_id").in_(segment_ids))
+                )
+            ).all()
 
-            results = (await session.exec(sql_query)).all()
-            total_found = (await session.exec(count_query)).one()
+        items = {}
+        for row in rows:
+            items.setdefault(row.segment_id, row)
 
-        return results, total_found
+        return [items[segment_id] for segment_id in segment_ids if segment_id in items]
 
     @staticmethod
     async def get_item_by_segment_id(segment_id: int) -> SentenceItem:
@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from typing import Literal
 
 
@@ -16,3 +17,18 @@ class OpenAIConfig:
 
 class Config:
     DEBUG = str(os.getenv("DEBUG", "False")).lower() == "true"
+
+
+class MyGOConfig:
+    RENDER_CONCURRENCY: int = int(os.getenv("MYGO_RENDER_CONCURRENCY", "2"))
+    RENDER_MAX_PENDING: int = int(os.getenv("MYGO_RENDER_MAX_PENDING", "16"))
+    VIDEO_DIR: Path = Path(os.getenv("MYGO_VIDEO_DIR", str(Path.home() / "mygo-anime")))
+    CACHE_DIR: Path = Path(os.getenv("MYGO_CACHE_DIR", str(VIDEO_DIR / ".cache")))
+    CACHE_MEMORY_BYTES: int = int(os.getenv("MYGO_CACHE_MEMORY_BYTES", str(64 * 1024**2)))
+    CACHE_DISK_BYTES: int = int(os.getenv("MYGO_CACHE_DISK_BYTES", str(1024**3)))
+    SHEET_CACHE_BYTES: int = int(os.getenv("MYGO_SHEET_CACHE_BYTES", str(64 * 1024**2)))
+    CLIP_CACHE_BYTES: int = int(os.getenv("MYGO_CLIP_CACHE_BYTES", str(1024**3)))
+    WARM_STORE_BYTES: int = int(os.getenv("MYGO_WARM_STORE_BYTES", str(256 * 1024**2)))
+    # render output above this size is spooled to a temporary file under CACHE_DIR
+    RENDER_SPOOL_BYTES: int = int(os.getenv("MYGO_RENDER_SPOOL_BYTES", str(4 * 1024**2)))
+    USE_PROXY: bool = str(os.getenv("MYGO_USE_PROXY", "True")).lower() == "true"
@@ -1,3 +1,5 @@
+import asyncio
+import hashlib
 import json
 from base64 import b64encode as be
 from pathlib import Path
@@ -5,13 +7,20 @@ from pathlib import Path
 from sqlmodel import SQLModel, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from cogs.mygo.const import SUBTITLE_FIELDS
+from cogs.mygo.interval import frame_index
+from cogs.mygo.quote import quote_matcher
+from cogs.mygo.registry import episode_registry
 from cogs.mygo.schema import SubtitleItem
+from cogs.mygo.search import subtitle_index
 from cogs.mygo.utils import SubtitleUtils
-from database import EpisodeItem, SentenceItem, engine
+from database import EpisodeItem, ImportChecksum, SentenceItem, engine
 from loggers import setup_package_logger
 
 logger = setup_package_logger("core.func")
 
+SUBTITLE_SOURCE = "mygo_detail.json"
+
 
 def encode_image_to_b64(image_path: str | Path | bytes) -> str:
     if isinstance(image_path, bytes):
@@ -30,35 +39,67 @@ async def init_models():
 
 
 async def db_insert_subtitle_data(data: SubtitleItem, session: AsyncSession, update: bool = False):
+    """Insert new subtitles and (if `update`) changed ones, diffed by segment_id in memory.
+
+    Existing rows are read with one query, the flush then batches all inserts and updates.
+    """
+    # NOTE: ID is auto-incremented, so we can't use it to check for duplicates
+    old_rows: dict[int, SentenceItem] = {}
+    for row in (await session.exec(select(SentenceItem))).all():
+        old_rows.setdefault(row.segment_id, row)
+
+    inserted = updated = 0
     for i, item in enumerate(data.result):
-        # Update if sentence already exists (via segment_id)
-        # NOTE: ID is auto-incremented, so we can't use it to check for duplicates
-        old_row = (
-            await session.exec(
-                select(SentenceItem).where(SentenceItem.segment_id == item.segment_id)
-            )
-        ).first()
-
-        if old_row is not None and update is True:
-            old_row.sqlmodel_update(
-                item.model_dump(
-                    include=["text", "episode", "frame_start", "frame_end", "segment_id"]
-                )
-            )
+        old_row = old_rows.get(item.segment_id)
+        if old_row is None:
+            session.add(item)
+            old_rows[item.segment_id] = item
+            inserted += 1
+            continue
+
+        changes = item.model_dump(include=SUBTITLE_FIELDS)
+        if update is True and old_row.model_dump(include=SUBTITLE_FIELDS) != changes:
+            old_row.sqlmodel_update(changes)
             session.add(old_row)
             data.result[i] = old_row  # prevent duplicate insert
-
-        elif old_row is None:
-            session.add(item)
+            updated += 1
 
         else:
             data.result[i] = None
 
+    logger.info("Subtitle import: %d inserted, %d updated", inserted, updated)
+
+    # copy changed rows before commit expires them, indexes follow only a committed import
+    changed = [
+        SentenceItem(**item.model_dump(include=SUBTITLE_FIELDS))
+        for item in data.result
+        if item is not None
+    ]
+    await session.commit()
+
+    for index in (subtitle_index, frame_index, quote_matcher):
+        if index.loaded:
+            index.upsert(changed)
+
+
+async def get_import_checksum(source: str, session: AsyncSession) -> str | None:
+    row = (
+        await session.exec(select(ImportChecksum).where(ImportChecksum.source == source))
+    ).first()
+    return row.checksum if row is not None else None
+
+
+async def set_import_checksum(source: str, checksum: str, session: AsyncSession):
+    row = (
+        await session.exec(select(ImportChecksum).where(ImportChecksum.source == source))
+    ).first()
+    if row is None:
+        row = ImportChecksum(source=source, checksum=checksum)
+    else:
+        row.checksum = checksum
+
+    session.add(row)
     await session.commit()
-    for item in data.result:
-        # ignore non-inserted or updated items
-        if item is None:
-            continue
 
 
 async def db_insert_episode(episode: str, session: AsyncSession, update: bool = False):
@@ -66,7 +107,10 @@ async def db_insert_episode(episode: str, session: AsyncSession, update: bool =
     insert_item = EpisodeItem(
         episode=episode, total_frame=data.total_frame, frame_rate=data.frame_rate
     )
-    if (old_row := await session.get(EpisodeItem, episode)) is not None and update is True:
+    old_row = (
+        await session.exec(select(EpisodeItem).where(EpisodeItem.episode == episode))
+    ).first()
+    if old_row is not None and update is True:
         old_row.sqlmodel_update(
             insert_item.model_dump(include=["episode", "total_frame", "frame_rate"])
         )
@@ -77,15 +121,30 @@ async def db_insert_episode(episode: str, session: AsyncSession, update: bool =
 
     await session.commit()
 
+    if old_row is None or update is True:
+        episode_registry.update(insert_item)
+
 
 async def init():
     await init_models()
 
-    with (Path.cwd() / "json_data" / "mygo_detail.json").open("r", encoding="utf-8") as file:
-        data = SubtitleItem.model_validate(json.load(file), strict=True)
+    raw_data = (Path.cwd() / "json_data" / "mygo_detail.json").read_bytes()
+    checksum = hashlib.sha256(raw_data).hexdigest()
+
+    episodes = ["1-3", "4", "5", "6", "7", "8", "9", "10", "11", "12", "13"]
+    # probe concurrently first, sequential inserts below are then served from probe cache
+    await asyncio.gather(*map(SubtitleUtils.get_total_frame_number, episodes))
 
     async with AsyncSession(engine) as session:
-        for episode in ["1-3", "4", "5", "6", "7", "8", "9", "10", "11", "12", "13"]:
+        for episode in episodes:
             await db_insert_episode(episode, session, update=True)
 
-        await db_insert_subtitle_data(data, session, update=True)
+        if await get_import_checksum(SUBTITLE_SOURCE, session) == checksum:
+            logger.info("%s is unchanged, skip subtitle import", SUBTITLE_SOURCE)
+        else:
+            data = SubtitleItem.model_validate(json.loads(raw_data), strict=True)
+            await db_insert_subtitle_data(data, session, update=True)
+            await set_import_checksum(SUBTITLE_SOURCE, checksum, session)
+
+    await episode_registry.ensure_loaded()
+    await subtitle_index.ensure_loaded()
@@ -4,6 +4,7 @@ from pathlib import Path
 from textwrap import dedent
 
 from pydantic import ConfigDict, computed_field
+from sqlalchemy import BigInteger
 from sqlalchemy.dialects.mysql import TEXT
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Column, Field, Relationship, SQLModel
@@ -13,15 +14,19 @@ from core import load_env
 from loggers import TZ
 
 load_env(Path.cwd() / "env" / "db.env")
-DATABASE_URL: str = (
-    # pylint: disable=consider-using-f-string
-    "mysql+aiomysql://"
-    "{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:3306/{MYSQL_DATABASE}?charset=UTF8mb4"
-).format(
-    MYSQL_USER=os.getenv("MYSQL_USER", "root"),
-    MYSQL_PASSWORD=os.getenv("MYSQL_PASSWORD", "root"),
-    MYSQL_HOST=os.getenv("MYSQL_HOST", "localhost"),
-    MYSQL_DATABASE=os.getenv("MYSQL_DATABASE", "default"),
+# DATABASE_URL overrides the MariaDB settings, e.g. to run against a local SQLite file
+DATABASE_URL: str = os.getenv(
+    "DATABASE_URL",
+    (
+        # pylint: disable=consider-using-f-string
+        "mysql+aiomysql://"
+        "{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:3306/{MYSQL_DATABASE}?charset=UTF8mb4"
+    ).format(
+        MYSQL_USER=os.getenv("MYSQL_USER", "root"),
+        MYSQL_PASSWORD=os.getenv("MYSQL_PASSWORD", "root"),
+        MYSQL_HOST=os.getenv("MYSQL_HOST", "localhost"),
+        MYSQL_DATABASE=os.getenv("MYSQL_DATABASE", "default"),
+    ),
 )
 engine = create_async_engine(DATABASE_URL, echo=False)
 
@@ -86,6 +91,45 @@ class SentenceItem(BaseSQLModel, table=True):
         return f"mygo frame {self.episode} <number in {self.frame_start} ~ {self.frame_end}>"
 
 
+class ImportChecksum(BaseSQLModel, table=True):
+    """Content hash of last imported data file, used to skip unchanged imports."""
+
+    __tablename__ = "import_checksum"
+    model_config = ConfigDict(title=__tablename__)
+
+    source: str = Field(index=True)
+    checksum: str
+
+
+class AutoQuoteChannel(BaseSQLModel, table=True):
+    """Channel where chat messages quoting a subtitle are replied with its frame."""
+
+    __tablename__ = "auto_quote_channel"
+    model_config = ConfigDict(title=__tablename__)
+
+    channel_id: int = Field(sa_type=BigInteger, index=True, unique=True)
+
+
+class RenderTiming(BaseSQLModel, table=True):
+    """Stage durations (in seconds) of one render, see `cogs.mygo.telemetry`."""
+
+    __tablename__ = "render_timing"
+    model_config = ConfigDict(title=__tablename__)
+
+    kind: str = Field(index=True)
+    episode: str = Field(index=True)
+    frames: int
+    output_bytes: int
+    cached: bool
+    lookup: float = 0.0
+    queue: float = 0.0
+    first_byte: float = 0.0
+    ffmpeg: float = 0.0
+    store: float = 0.0
+    upload: float = 0.0
+    total: float = 0.0
+
+
 # --------------- Kasa --------------- #
 class Emeter(BaseSQLModel):
     __abstract__ = True
@@ -0,0 +1,58 @@
+import random
+import shutil
+from itertools import pairwise
+from pathlib import Path
+
+import pytest
+
+from cogs.mygo.bench import (
+    generate_episode,
+    in_workspace,
+    probe_video,
+    summarize,
+    synthetic_subtitles,
+    workspace_env,
+)
+from cogs.mygo.const import BENCH_VOCABULARY
+from cogs.mygo.schema import RenderTrace
+
+
+def test_synthetic_subtitles():
+    items = synthetic_subtitles("4", 1000, 10, random.Random(0))
+
+    assert [item.segment_id for item in items] == list(range(10, 10 + len(items)))
+    assert all(0 <= item.frame_start < item.frame_end <= 1000 for item in items)  # noqa: PLR2004
+    assert all(item.frame_end < following.frame_start for item, following in pairwise(items))
+    assert all(any(word in item.text for word in BENCH_VOCABULARY) for item in items)
+
+
+def test_summarize():
+    traces = [RenderTrace(kind="frame", episode="4", stages={"ffmpeg": 0.1, "total": 0.2})]
+
+    result = summarize("frame", 2, [0.2, 0.4], traces)
+    empty = summarize("frame", 2, [], [])
+
+    assert result.requests == 2  # noqa: PLR2004
+    assert result.latency.mean == pytest.approx(0.3)
+    assert result.latency.max == 0.4  # noqa: PLR2004
+    assert [stats.name for stats in result.stages] == ["ffmpeg", "total"]
+    assert empty.latency is None
+
+
+def test_workspace(tmp_path: Path):
+    env = workspace_env(tmp_path)
+
+    assert env["DATABASE_URL"].endswith(str(tmp_path / "bench.db"))
+    assert env["MYGO_VIDEO_DIR"] == str(tmp_path / "videos")
+    # tests never run against the benchmark database
+    assert not in_workspace(tmp_path)
+
+
+@pytest.mark.skipif(shutil.which("ffprobe") is None, reason="ffmpeg is not installed")
+def test_generate_episode_of_other_length(tmp_path: Path):
+    path = tmp_path / "4.mp4"
+
+    assert generate_episode(path, 1, frame_rate=24) == 24  # noqa: PLR2004
+    # video of an earlier run with another length is generated again
+    assert generate_episode(path, 2, frame_rate=24) == 48  # noqa: PLR2004
+    assert probe_video(path) == (pytest.approx(2), 48)
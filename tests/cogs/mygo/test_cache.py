@@ -0,0 +1,164 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from cogs.mygo.cache import ProbeCache, RenderCache, SingleFlight
+from cogs.mygo.schema import FFProbeStream
+
+
+# ------------------------------- fixture -------------------------------
+@pytest.fixture
+def cache(tmp_path: Path) -> RenderCache:
+    return RenderCache(tmp_path, max_memory_bytes=10, max_disk_bytes=20)
+
+
+# ------------------------------- test -------------------------------
+@pytest.mark.asyncio
+async def test_miss_then_memory_hit(cache: RenderCache):
+    key = RenderCache.make_key("frame", "4", 100, 0)
+    assert await cache.get(key) is None
+
+    await cache.put(key, b"12345")
+    assert await cache.get(key) == b"12345"
+
+    stats = cache.stats()
+    assert (stats.memory_hits, stats.disk_hits, stats.misses) == (1, 0, 1)
+
+
+@pytest.mark.asyncio
+async def test_memory_eviction_falls_back_to_disk(cache: RenderCache):
+    await cache.put("a", b"123456")
+    await cache.put("b", b"123456")  # evicts "a" from memory
+
+    assert cache.stats().memory_items == 1
+    assert await cache.get("a") == b"123456"
+    assert cache.stats().disk_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_disk_eviction(cache: RenderCache, tmp_path: Path):
+    for key in "abc":
+        await cache.put(key, b"12345678")
+
+    assert not (tmp_path / "a").exists()
+    assert (tmp_path / "b").exists()
+    assert cache.stats().disk_bytes == 16  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_disk_index_survives_restart(cache: RenderCache, tmp_path: Path):
+    await cache.put("a", b"1234")
+
+    restarted = RenderCache(tmp_path, max_memory_bytes=10, max_disk_bytes=20)
+    assert await restarted.get("a") == b"1234"
+    assert restarted.stats().disk_items == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_job():
+    flight = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def render() -> bytes:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return b"gif"
+
+    tasks = [asyncio.create_task(flight.do("key", render)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert flight.inflight == 1
+
+    release.set()
+    assert await asyncio.gather(*tasks) == [b"gif"] * 5
+    assert calls == 1
+    assert flight.shared == 4  # noqa: PLR2004
+    assert flight.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_propagates_error():
+    flight = SingleFlight()
+
+    async def render() -> bytes:
+        await asyncio.sleep(0)
+        raise ValueError("bad frame")
+
+    results = await asyncio.gather(
+        flight.do("key", render), flight.do("key", render), return_exceptions=True
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_discards_result_of_cancelled_starter():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    discarded = []
+
+    async def render() -> bytes:
+        await release.wait()
+        return b"gif"
+
+    starter = asyncio.create_task(flight.do("key", render, discarded.append))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("key", render, discarded.append))
+    await asyncio.sleep(0)
+    starter.cancel()
+    await asyncio.sleep(0)
+
+    release.set()
+    # the job still finishes for the others
+    assert await follower == b"gif"
+    assert discarded == [b"gif"]
+
+
+def test_probe_cache_persists_until_file_changes(tmp_path: Path):
+    stream = FFProbeStream.model_validate(
+        json.loads(Path("json_data/ffprobe_example.json").read_text(encoding="utf-8"))["streams"][0]
+    )
+    video_path = tmp_path / "4.mp4"
+    video_path.write_bytes(b"video")
+
+    ProbeCache(tmp_path / "probe.json").put(video_path, stream)
+    cache = ProbeCache(tmp_path / "probe.json")
+    assert cache.get(video_path) == stream
+
+    video_path.write_bytes(b"new video")
+    assert cache.get(video_path) is None
+
+
+@pytest.mark.asyncio
+async def test_contains_keeps_stats(cache: RenderCache):
+    key = RenderCache.make_key("frame", "4", 100, 0)
+    assert await cache.contains(key) is False
+
+    await cache.put(key, b"12345")
+    assert await cache.contains(key) is True
+    assert cache.stats().misses == 0
+
+
+@pytest.mark.asyncio
+async def test_put_file_and_open(cache: RenderCache, tmp_path: Path):
+    small, large = tmp_path / "small", tmp_path / "large"
+    small.write_bytes(b"12345")
+    large.write_bytes(b"x" * 15)
+
+    for key, path in (("small", small), ("large", large)):
+        with path.open("rb") as fp:
+            await cache.put_file(key, fp)
+            assert fp.tell() == 0
+
+    # only the small one is read into memory, the large one is opened from disk
+    assert cache.stats().memory_items == 1
+    with await cache.open("large") as fp:
+        assert fp.read() == b"x" * 15
+    with await cache.open("small") as fp:
+        assert fp.read() == b"12345"
+
+    assert await cache.open("missing") is None
+    stats = cache.stats()
+    assert (stats.memory_hits, stats.disk_hits, stats.misses) == (1, 1, 1)
@@ -0,0 +1,33 @@
+from cogs.mygo.encode import SizeEstimator, ladder
+
+
+# ------------------------------- test -------------------------------
+def test_pick_best_fitting_profile():
+    estimator = SizeEstimator()
+    profiles = ladder("gif")
+
+    assert estimator.pick(profiles, 1, 24.0, 1024**3) == 0
+    assert estimator.pick(profiles, 10000, 24.0, 1) == len(profiles) - 1
+
+    # each profile is estimated smaller than the one before
+    estimates = [estimator.estimate(profile, 240, 24.0) for profile in profiles]
+    assert estimates == sorted(estimates, reverse=True)
+
+
+def test_observe_moves_estimate():
+    estimator = SizeEstimator()
+    profile = ladder("webp")[0]
+    before = estimator.estimate(profile, 240, 24.0)
+
+    for _ in range(20):
+        estimator.observe(profile, 240, 24.0, round(before * 4))
+
+    assert estimator.estimate(profile, 240, 24.0) > before * 3
+    # other formats are learned separately
+    assert estimator.estimate(ladder("mp4")[0], 240, 24.0) < before
+
+
+def test_output_frames_follow_fps():
+    profile = ladder("mp4")[-1]
+    assert SizeEstimator.output_frames(profile, 240, 24.0) == 100  # noqa: PLR2004
+    assert SizeEstimator.output_frames(ladder("mp4")[0], 240, 24.0) == 240  # noqa: PLR2004
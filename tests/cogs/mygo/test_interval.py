@@ -0,0 +1,53 @@
+import pytest
+
+from cogs.mygo.interval import FrameIndex
+from database import SentenceItem
+
+
+# ------------------------------- fixture -------------------------------
+@pytest.fixture
+def index() -> FrameIndex:
+    index = FrameIndex()
+    index.upsert(
+        [
+            SentenceItem(segment_id=0, frame_start=0, frame_end=100, text="長", episode="4"),
+            SentenceItem(segment_id=1, frame_start=10, frame_end=20, text="小祥", episode="4"),
+            SentenceItem(segment_id=2, frame_start=30, frame_end=25, text="春日影", episode="4"),
+            SentenceItem(segment_id=3, frame_start=150, frame_end=160, text="MyGO", episode="4"),
+            SentenceItem(segment_id=4, frame_start=10, frame_end=20, text="一輩子", episode="5"),
+        ]
+    )
+    return index
+
+
+def segment_ids(items: list[SentenceItem]) -> list[int]:
+    return [item.segment_id for item in items]
+
+
+# ------------------------------- test -------------------------------
+def test_at(index: FrameIndex):
+    assert segment_ids(index.at("4", 15)) == [0, 1]
+    assert segment_ids(index.at("4", 20)) == [0, 1]
+    assert segment_ids(index.at("4", 27)) == [0, 2]
+    assert segment_ids(index.at("4", 120)) == []
+    assert segment_ids(index.at("4", 160)) == [3]
+    assert segment_ids(index.at("13", 15)) == []
+
+
+def test_overlapping(index: FrameIndex):
+    assert segment_ids(index.overlapping("4", 90, 155)) == [0, 3]
+    assert segment_ids(index.overlapping("4", 155, 90)) == [0, 3]
+    assert segment_ids(index.overlapping("5", 0, 9)) == []
+
+
+def test_upsert_moves_segment(index: FrameIndex):
+    assert segment_ids(index.at("4", 15)) == [0, 1]
+    index.upsert(
+        [SentenceItem(segment_id=1, frame_start=200, frame_end=210, text="小祥", episode="5")]
+    )
+    assert segment_ids(index.at("4", 15)) == [0]
+    assert segment_ids(index.at("5", 205)) == [1]
+
+    index.remove(0)
+    assert segment_ids(index.at("4", 15)) == []
+    assert len(index) == 4  # noqa: PLR2004
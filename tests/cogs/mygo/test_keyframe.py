@@ -0,0 +1,57 @@
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+
+from cogs.mygo.keyframe import KeyframeIndex
+from cogs.mygo.schema import EpisodeInfo
+
+
+# ------------------------------- fixture -------------------------------
+@pytest.fixture
+def episode_data(tmp_path: Path) -> EpisodeInfo:
+    video_path = tmp_path / "4.mp4"
+    video_path.write_bytes(b"video")
+    return EpisodeInfo(episode="4", total_frame=500, frame_rate=24.0, video_path=video_path)
+
+
+# ------------------------------- test -------------------------------
+@pytest.mark.asyncio
+async def test_preceding(
+    tmp_path: Path, episode_data: EpisodeInfo, monkeypatch: pytest.MonkeyPatch
+):
+    index = KeyframeIndex(tmp_path / "keyframes")
+    monkeypatch.setattr(index, "_probe", AsyncMock(return_value=[0, 48, 96]))
+
+    assert await index.preceding(episode_data, 0) == 0
+    assert await index.preceding(episode_data, 95) == 48  # noqa: PLR2004
+    assert await index.preceding(episode_data, 400) == 96  # noqa: PLR2004
+    index._probe.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_persisted_until_video_changes(
+    tmp_path: Path, episode_data: EpisodeInfo, monkeypatch: pytest.MonkeyPatch
+):
+    first = KeyframeIndex(tmp_path / "keyframes")
+    monkeypatch.setattr(first, "_probe", AsyncMock(return_value=[0, 48]))
+    await first.get(episode_data)
+
+    second = KeyframeIndex(tmp_path / "keyframes")
+    monkeypatch.setattr(second, "_probe", AsyncMock(return_value=[0, 24]))
+    assert await second.get(episode_data) == [0, 48]
+
+    episode_data.video_path.write_bytes(b"new video")
+    assert await second.get(episode_data) == [0, 24]
+
+
+@pytest.mark.asyncio
+async def test_probe_failure_falls_back(
+    tmp_path: Path, episode_data: EpisodeInfo, monkeypatch: pytest.MonkeyPatch
+):
+    index = KeyframeIndex(tmp_path / "keyframes")
+    monkeypatch.setattr(index, "_probe", AsyncMock(side_effect=FileNotFoundError("ffprobe")))
+
+    assert await index.preceding(episode_data, 10) is None
+    assert await index.preceding(episode_data, 10) is None
+    index._probe.assert_awaited_once()
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from cogs.mygo.const import PHASH_SAMPLE_SIZE, PHASH_STEP
+from cogs.mygo.phash import PerceptualIndex, hamming, phash
+
+
+# ------------------------------- fixture -------------------------------
+@pytest.fixture
+def frames() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    # smooth random images, like downscaled video frames
+    low = rng.integers(0, 256, size=(20, 4, 4)).astype(np.float32)
+    return np.kron(low, np.ones((8, 8), dtype=np.float32)).astype(np.uint8)
+
+
+def save_episode(directory: Path, episode: str, hashes: np.ndarray):
+    directory.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        directory / f"{episode}.npz",
+        hashes=hashes,
+        frames=np.arange(len(hashes), dtype=np.uint32) * PHASH_STEP,
+        size=0,
+        mtime_ns=0,
+    )
+
+
+# ------------------------------- test -------------------------------
+def test_phash_robust_to_noise(frames: np.ndarray):
+    assert frames.shape[1:] == (PHASH_SAMPLE_SIZE, PHASH_SAMPLE_SIZE)
+    hashes = phash(frames)
+    noisy = np.clip(frames + np.random.default_rng(1).normal(0, 4, frames.shape), 0, 255).astype(
+        np.uint8
+    )
+
+    assert hashes.dtype == np.uint64
+    assert (hamming(phash(noisy), int(hashes[0]))[0]) <= 6  # noqa: PLR2004
+    # different images are far apart
+    assert np.median(hamming(hashes[1:], int(hashes[0]))) > 20  # noqa: PLR2004
+
+
+def test_hamming():
+    hashes = np.array([0, 1, 0b1011, 2**64 - 1], dtype=np.uint64)
+    assert hamming(hashes, 0).tolist() == [0, 1, 3, 64]
+
+
+@pytest.mark.asyncio
+async def test_search(tmp_path: Path, frames: np.ndarray):
+    hashes = phash(frames)
+    save_episode(tmp_path, "4", hashes[:10])
+    save_episode(tmp_path, "5", hashes[10:])
+    # index of episode 6 being written by `build`
+    (tmp_path / "6.npz.tmp").write_bytes(b"partial")
+    index = PerceptualIndex(tmp_path)
+    await index.ensure_loaded()
+
+    assert index.episodes == ["4", "5"]
+    assert len(index) == len(hashes)
+    best = index.search(int(hashes[13]), k=1)
+    assert [(match.episode, match.frame, match.distance) for match in best] == [
+        ("5", 3 * PHASH_STEP, 0)
+    ]
+
+    # reloaded once an episode is rebuilt
+    save_episode(tmp_path, "4", hashes[:2])
+    await index.ensure_loaded()
+    assert len(index) == len(hashes) - 8
@@ -0,0 +1,56 @@
+from pathlib import Path
+from typing import NamedTuple
+
+import pytest
+
+from cogs.mygo import popularity
+from cogs.mygo.popularity import PopularityCounter, system_busy
+
+
+class Sensor(NamedTuple):
+    current: float
+
+
+# ------------------------------- test -------------------------------
+def test_score_decays(tmp_path: Path):
+    counter = PopularityCounter(tmp_path / "popularity.json", half_life=10)
+    counter.hit(1, now=0)
+    counter.hit(1, now=0)
+
+    assert counter.score(1, now=0) == 2  # noqa: PLR2004
+    assert counter.score(1, now=10) == 1
+    assert counter.score(2, now=10) == 0
+
+
+def test_top_prefers_recent(tmp_path: Path):
+    counter = PopularityCounter(tmp_path / "popularity.json", half_life=10)
+    for _ in range(3):
+        counter.hit(1, now=0)
+    for _ in range(2):
+        counter.hit(2, now=30)
+    counter.hit(3, now=30)
+
+    assert counter.top(2, now=30) == [2, 3]
+
+
+def test_save_and_prune(tmp_path: Path):
+    path = tmp_path / "popularity.json"
+    counter = PopularityCounter(path, half_life=10)
+    counter.hit(1, now=0)
+    counter.hit(2, now=100)
+    counter.save(now=100)
+
+    restored = PopularityCounter(path, half_life=10)
+    assert restored.top(10, now=100) == [2]
+
+
+@pytest.mark.parametrize(
+    ("load", "temperatures", "busy"),
+    [(0.1, {}, False), (100.0, {}, True), (0.1, {"cpu_thermal": [Sensor(85.0)]}, True)],
+)
+def test_system_busy(monkeypatch: pytest.MonkeyPatch, load: float, temperatures: dict, busy: bool):
+    monkeypatch.setattr(popularity.psutil, "getloadavg", lambda: (load, load, load))
+    monkeypatch.setattr(
+        popularity.psutil, "sensors_temperatures", lambda: temperatures, raising=False
+    )
+    assert system_busy() is busy
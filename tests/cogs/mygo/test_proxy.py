@@ -0,0 +1,48 @@
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+
+from cogs.mygo.proxy import ProxyStore
+
+
+# ------------------------------- fixture -------------------------------
+@pytest.fixture
+def source(tmp_path: Path) -> Path:
+    video_path = tmp_path / "4.mp4"
+    video_path.write_bytes(b"video")
+    return video_path
+
+
+def fake_render_queue() -> AsyncMock:
+    async def run(args: list[str]) -> bytes:
+        output = next(arg for arg in map(str, args) if arg.endswith(".tmp.mp4"))
+        Path(output).write_bytes(b"proxy")
+        return b""
+
+    return AsyncMock(run=AsyncMock(side_effect=run))
+
+
+# ------------------------------- test -------------------------------
+@pytest.mark.asyncio
+async def test_build_and_get(tmp_path: Path, source: Path):
+    store = ProxyStore(tmp_path / "proxy")
+    assert store.get(source) is None
+
+    render_queue = fake_render_queue()
+    proxy = await store.build(source, render_queue)
+    assert proxy == store.get(source)
+    assert proxy.read_bytes() == b"proxy"
+
+    # up-to-date proxy is not rebuilt
+    await store.build(source, render_queue)
+    render_queue.run.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_stale_after_source_changes(tmp_path: Path, source: Path):
+    store = ProxyStore(tmp_path / "proxy")
+    await store.build(source, fake_render_queue())
+
+    source.write_bytes(b"new video")
+    assert store.get(source) is None
@@ -0,0 +1,92 @@
+import pytest
+
+from cogs.mygo.quote import AhoCorasick, QuoteChannels, QuoteMatcher
+from database import SentenceItem
+
+
+# ------------------------------- fixture -------------------------------
+@pytest.fixture
+def matcher() -> QuoteMatcher:
+    matcher = QuoteMatcher()
+    matcher.loaded = True
+    matcher.upsert(
+        [
+            SentenceItem(
+                segment_id=1, frame_start=0, frame_end=1, text="為什麼要演奏春日影", episode="7"
+            ),
+            SentenceItem(
+                segment_id=2, frame_start=0, frame_end=1, text="要演奏春日影", episode="7"
+            ),
+            SentenceItem(segment_id=3, frame_start=0, frame_end=1, text="小祥", episode="4"),
+            SentenceItem(
+                segment_id=4, frame_start=0, frame_end=1, text="是我的一輩子", episode="4"
+            ),
+            SentenceItem(
+                segment_id=5, frame_start=0, frame_end=1, text="是我的一輩子!!", episode="9"
+            ),
+        ]
+    )
+    return matcher
+
+
+# ------------------------------- test -------------------------------
+def test_aho_corasick_overlapping():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    found = {(position, automaton.patterns[index]) for position, index in automaton.find("ushers")}
+    assert found == {(3, "she"), (3, "he"), (5, "hers")}
+    assert automaton.find("xyz") == []
+
+
+@pytest.mark.asyncio
+async def test_match_longest(matcher: QuoteMatcher):
+    assert await matcher.match("欸 為什麼要演奏春日影!?") == 1
+    assert await matcher.match("我要演奏 春日影") == 2  # noqa: PLR2004
+    # too short to be quoted
+    assert await matcher.match("小祥") is None
+    # same folded text, first segment wins
+    assert await matcher.match("是我的一輩子") == 4  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_match_after_upsert(matcher: QuoteMatcher):
+    assert await matcher.match("為什麼要演奏春日影") == 1
+    matcher.remove(1)
+    assert await matcher.match("為什麼要演奏春日影") == 2  # noqa: PLR2004
+    matcher.upsert(
+        [SentenceItem(segment_id=2, frame_start=0, frame_end=1, text="一輩子都在迷路", episode="7")]
+    )
+    assert await matcher.match("為什麼要演奏春日影") is None
+    assert await matcher.match("一輩子都在迷路") == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_change_during_compile(matcher: QuoteMatcher, monkeypatch: pytest.MonkeyPatch):
+    compile_texts = QuoteMatcher._compile
+    compiled = []
+
+    def compile_and_remove(texts: dict[int, str]):
+        # subtitle removed by an import while the snapshot is compiled in a thread
+        if not compiled:
+            matcher.remove(1)
+        compiled.append(texts.keys())
+        return compile_texts(texts)
+
+    monkeypatch.setattr(matcher, "_compile", compile_and_remove)
+
+    assert await matcher.match("為什麼要演奏春日影") == 2  # noqa: PLR2004
+    assert len(compiled) == 2  # noqa: PLR2004
+    assert 1 in compiled[0]
+    assert 1 not in compiled[1]
+
+
+def test_channel_cooldown(monkeypatch: pytest.MonkeyPatch):
+    now = 100.0
+    monkeypatch.setattr("cogs.mygo.quote.monotonic", lambda: now)
+    channels = QuoteChannels(cooldown=30)
+    channels.enabled = {1}
+
+    assert channels.acquire(2) is False
+    assert channels.acquire(1) is True
+    assert channels.acquire(1) is False
+    now += 30
+    assert channels.acquire(1) is True
@@ -0,0 +1,34 @@
+import pytest
+
+from cogs.mygo.const import VIDEO_DIR
+from cogs.mygo.registry import EpisodeRegistry
+from database import EpisodeItem
+
+
+# ------------------------------- fixture -------------------------------
+@pytest.fixture
+def registry() -> EpisodeRegistry:
+    registry = EpisodeRegistry()
+    registry.update(EpisodeItem(episode="4", total_frame=100, frame_rate=23.976))
+    return registry
+
+
+# ------------------------------- test -------------------------------
+def test_get(registry: EpisodeRegistry):
+    info = registry.get("4")
+    assert info.total_frame == 100  # noqa: PLR2004
+    assert info.video_path == VIDEO_DIR / "4.mp4"
+
+
+def test_get_missing_episode(registry: EpisodeRegistry):
+    with pytest.raises(ValueError):
+        registry.get("5")
+
+
+def test_check_frames(registry: EpisodeRegistry):
+    assert registry.check_frames("4", -1, 0, 100, 101) == [False, True, True, False]
+
+
+def test_update_refreshes(registry: EpisodeRegistry):
+    registry.update(EpisodeItem(episode="4", total_frame=200, frame_rate=23.976))
+    assert registry.check_frames("4", 150) == [True]
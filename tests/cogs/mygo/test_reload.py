@@ -0,0 +1,110 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from cogs.mygo.reload import SubtitleReloader, by_segment_id, diff_subtitles
+from cogs.mygo.search import SubtitleIndex
+from database import BaseSQLModel, ImportChecksum, SentenceItem
+
+
+def raw(segment_id: int, text: str) -> dict:
+    return {
+        "text": text,
+        "episode": "4",
+        "frame_start": segment_id * 10,
+        "frame_end": segment_id * 10 + 5,
+        "segment_id": segment_id,
+    }
+
+
+# ------------------------------- fixture -------------------------------
+@pytest_asyncio.fixture
+async def engine(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> AsyncEngine:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'reload.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseSQLModel.metadata.create_all)
+
+    async with AsyncSession(engine) as session:
+        session.add_all(SentenceItem(**raw(i, f"line {i}")) for i in range(3))
+        await session.commit()
+
+    monkeypatch.setattr("cogs.mygo.reload.engine", engine)
+    yield engine
+    await engine.dispose()
+
+
+def write(path: Path, items: list[dict]):
+    path.write_text(json.dumps({"result": items}), encoding="utf-8")
+    # make sure mtime changes even on coarse filesystem clocks
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+# ------------------------------- test -------------------------------
+def test_diff_subtitles():
+    old = by_segment_id([raw(0, "a"), raw(1, "b"), raw(2, "c")])
+    new = by_segment_id([raw(0, "a"), raw(1, "B"), raw(3, "d"), raw(3, "duplicate")])
+
+    diff = diff_subtitles(old, new)
+
+    assert [(item.segment_id, item.text) for item in diff.changed] == [(1, "B"), (3, "d")]
+    assert diff.removed == [2]
+
+
+def test_diff_subtitles_validates_changed_only():
+    old = by_segment_id([raw(0, "a")])
+    with pytest.raises(ValueError, match="frame_start"):
+        diff_subtitles(old, by_segment_id([raw(0, "a"), {**raw(1, "b"), "frame_start": "1"}]))
+
+
+@pytest.mark.asyncio
+async def test_reloader_applies_diff(
+    tmp_path: Path, engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch
+):
+    index = SubtitleIndex()
+    index.loaded = True
+    index.upsert(SentenceItem(**raw(i, f"line {i}")) for i in range(3))
+    monkeypatch.setattr("cogs.mygo.reload.subtitle_index", index)
+
+    path = tmp_path / "mygo_detail.json"
+    write(path, [raw(i, f"line {i}") for i in range(3)])
+    reloader = SubtitleReloader(path)
+    assert not (await reloader.check()).changed  # first check takes file as imported
+    assert await reloader.check() is None  # unchanged
+
+    write(path, [raw(0, "line 0"), raw(1, "changed"), raw(3, "new")])
+    diff = await reloader.check()
+    assert [item.segment_id for item in diff.changed] == [1, 3]
+    assert diff.removed == [2]
+
+    async with AsyncSession(engine) as session:
+        rows = (await session.exec(select(SentenceItem).order_by(SentenceItem.segment_id))).all()
+        checksum = (await session.exec(select(ImportChecksum))).one()
+    assert [(row.segment_id, row.text) for row in rows] == [
+        (0, "line 0"),
+        (1, "changed"),
+        (3, "new"),
+    ]
+    assert checksum.source == "mygo_detail.json"
+    assert index.search("changed") == [1]
+    assert index.search("line 2") == []
+
+
+@pytest.mark.asyncio
+async def test_reloader_skips_broken_file(tmp_path: Path, engine: AsyncEngine):
+    path = tmp_path / "mygo_detail.json"
+    write(path, [raw(0, "line 0")])
+    reloader = SubtitleReloader(path)
+    await reloader.check()
+
+    path.write_text('{"result": [', encoding="utf-8")
+    assert await reloader.check() is None
+
+    write(path, [raw(0, "fixed")])
+    assert [item.text for item in (await reloader.check()).changed] == ["fixed"]
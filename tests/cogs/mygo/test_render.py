@@ -0,0 +1,100 @@
+import asyncio
+import sys
+from unittest.mock import AsyncMock, Mock
+
+import ffmpeg
+import pytest
+from discord.ext import commands
+
+from cogs.mygo.cmd import SubtitleCMD, render_error_message
+from cogs.mygo.render import RenderQueue, RenderQueueFullError
+
+SLEEP_COMMAND = [sys.executable, "-c", "import time; time.sleep(0.2); print('done', end='')"]
+
+
+# ------------------------------- test -------------------------------
+@pytest.mark.asyncio
+async def test_run_returns_stdout():
+    queue = RenderQueue(concurrency=1, max_pending=1)
+    result = await queue.run([sys.executable, "-c", "print('frame', end='')"])
+
+    assert result == b"frame"
+    assert queue.stats().completed == 1
+
+
+@pytest.mark.asyncio
+async def test_run_raises_on_failure():
+    queue = RenderQueue(concurrency=1, max_pending=1)
+    with pytest.raises(ffmpeg.Error):
+        await queue.run([sys.executable, "-c", "raise SystemExit(1)"])
+
+    assert queue.stats().failed == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_and_wait_time():
+    queue = RenderQueue(concurrency=1, max_pending=4)
+    tasks = [asyncio.create_task(queue.run(SLEEP_COMMAND)) for _ in range(3)]
+    await asyncio.sleep(0.1)
+
+    stats = queue.stats()
+    assert stats.running == 1
+    assert stats.waiting == 2  # noqa: PLR2004
+
+    assert await asyncio.gather(*tasks) == [b"done"] * 3
+    assert queue.stats().max_wait > 0
+
+
+@pytest.mark.asyncio
+async def test_queue_full():
+    queue = RenderQueue(concurrency=1, max_pending=1)
+    tasks = [asyncio.create_task(queue.run(SLEEP_COMMAND)) for _ in range(2)]
+    await asyncio.sleep(0.1)
+
+    with pytest.raises(RenderQueueFullError):
+        await queue.run(SLEEP_COMMAND)
+
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_run_streams_to_output(tmp_path):
+    queue = RenderQueue(concurrency=1, max_pending=1)
+    command = [sys.executable, "-c", "import sys; sys.stdout.buffer.write(b'x' * 300000)"]
+    with (tmp_path / "output").open("w+b") as output:
+        assert await queue.run(command, output=output) == b""
+        assert output.tell() == 0
+        assert output.read() == b"x" * 300000
+
+
+@pytest.mark.asyncio
+async def test_run_kills_process_when_output_fails(monkeypatch: pytest.MonkeyPatch):
+    processes = []
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def spawn(*args, **kwargs):
+        processes.append(await create_subprocess_exec(*args, **kwargs))
+        return processes[-1]
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", spawn)
+    output = Mock(write=Mock(side_effect=OSError("No space left on device")))
+    queue = RenderQueue(concurrency=1, max_pending=1)
+    command = [sys.executable, "-c", "print('frame', flush=True); import time; time.sleep(30)"]
+
+    with pytest.raises(OSError, match="No space"):
+        await queue.run(command, output=output)
+
+    assert processes[0].returncode is not None
+
+
+@pytest.mark.asyncio
+async def test_render_errors_are_replied():
+    cog = Mock(spec=SubtitleCMD, logger=Mock())
+    ctx = AsyncMock()
+    error = commands.CommandInvokeError(RenderQueueFullError("Render queue is full"))
+
+    await SubtitleCMD.cog_command_error(cog, ctx, error)
+
+    ctx.send.assert_awaited_once_with("Render queue is full", ephemeral=True)
+    assert render_error_message(ffmpeg.Error("ffmpeg", b"", b"")) is not None
+    assert render_error_message(RuntimeError()) is None
@@ -0,0 +1,60 @@
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from cogs.mygo.const import SCENE_SAMPLE_HEIGHT, SCENE_SAMPLE_WIDTH
+from cogs.mygo.scene import SceneIndex, detect_cuts, read_chunks, snap
+from cogs.mygo.schema import SceneCutEntry, SourceStamp
+
+
+# ------------------------------- fixture -------------------------------
+@pytest.fixture
+def shots() -> bytes:
+    """Raw grayscale frames of three shots: 10 dark, 2 bright (flash) + 10 mid, 5 dark."""
+    levels = [20] * 10 + [240] * 2 + [120] * 10 + [20] * 5
+    noise = np.random.default_rng(0).integers(0, 6, size=SCENE_SAMPLE_WIDTH * SCENE_SAMPLE_HEIGHT)
+    return b"".join((noise + level).astype(np.uint8).tobytes() for level in levels)
+
+
+# ------------------------------- test -------------------------------
+def test_detect_cuts(shots: bytes):
+    # flash at 10 and cut at 12 are too close, only the first is kept
+    assert detect_cuts(read_chunks(BytesIO(shots))) == [10, 22]
+
+
+def test_detect_cuts_across_chunks(shots: bytes, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("cogs.mygo.scene.SCENE_CHUNK_FRAMES", 10)
+    assert detect_cuts(read_chunks(BytesIO(shots))) == [10, 22]
+
+
+@pytest.mark.parametrize(
+    ("start", "end", "expected"),
+    [
+        (95, 205, (100, 199)),  # stray frames of other shots at both ends
+        (50, 150, (50, 150)),  # cut in the middle is kept
+        (100, 199, (100, 199)),
+        (95, 105, (95, 105)),  # nothing would be left
+        (60, 250, (60, 250)),  # cuts too far inside
+    ],
+)
+def test_snap(start: int, end: int, expected: tuple[int, int]):
+    assert snap([100, 200, 500], start, end, window=12) == expected
+
+
+def test_index_stale_after_video_changes(tmp_path: Path):
+    source = tmp_path / "4.mp4"
+    source.write_bytes(b"video")
+    index = SceneIndex(tmp_path / "scene")
+    assert index.get("4", source) is None
+    assert index.snap("4", source, 95, 205) == (95, 205)
+
+    index.directory.mkdir()
+    (index.directory / "4.json").write_text(
+        SceneCutEntry(stamp=SourceStamp.of(source), frames=[100, 200]).model_dump_json()
+    )
+    assert index.snap("4", source, 95, 205) == (100, 199)
+
+    source.write_bytes(b"new video")
+    assert index.get("4", source) is None
@@ -0,0 +1,150 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from discord.ext import commands
+
+from cogs.mygo.cmd import PageButton, ResponseSelect, SubtitleCMD, SubtitleView, search_message
+from cogs.mygo.const import SEARCH_QUERY_MAX_LENGTH
+from cogs.mygo.schema import SearchCursor, SearchState
+from cogs.mygo.search import SubtitleIndex
+from database import SentenceItem
+
+
+# ------------------------------- fixture -------------------------------
+@pytest.fixture
+def index() -> SubtitleIndex:
+    index = SubtitleIndex()
+    index.upsert(
+        [
+            SentenceItem(segment_id=2, frame_start=0, frame_end=1, text="小祥", episode="1-3"),
+            SentenceItem(
+                segment_id=0, frame_start=0, frame_end=1, text="為什麼要演奏春日影", episode="7"
+            ),
+            SentenceItem(segment_id=1, frame_start=0, frame_end=1, text="春日影", episode="1-3"),
+            SentenceItem(segment_id=3, frame_start=0, frame_end=1, text="MyGO!!!!!", episode="4"),
+        ]
+    )
+    return index
+
+
+# ------------------------------- test -------------------------------
+def test_search_substring(index: SubtitleIndex):
+    assert index.search("春日影") == [0, 1]
+    assert index.search("日影春") == []
+
+
+def test_search_single_character_and_empty(index: SubtitleIndex):
+    assert index.search("祥") == [2]
+    assert index.search("") == [0, 1, 2, 3]
+
+
+def test_search_case_insensitive(index: SubtitleIndex):
+    assert index.search("mygo") == [3]
+
+
+def test_search_episode_filter(index: SubtitleIndex):
+    assert index.search("春日影", episode="1-3") == [1]
+
+
+def test_upsert_replaces_text(index: SubtitleIndex):
+    index.upsert(
+        [SentenceItem(segment_id=1, frame_start=0, frame_end=1, text="一輩子", episode="1-3")]
+    )
+    assert index.search("春日影") == [0]
+    assert index.search("一輩子") == [1]
+    assert len(index) == 4  # noqa: PLR2004
+
+
+def test_remove(index: SubtitleIndex):
+    index.remove(0)
+    assert index.search("春日影") == [1]
+    assert "演奏" not in index._postings
+
+
+def test_fold():
+    assert SubtitleIndex.fold("妳終於來了!") == "你終於來了"
+    assert SubtitleIndex.fold("ＭｙＧＯ！！！！！ 为什么") == "mygo為什麼"  # noqa: RUF001
+
+
+def test_rank_tolerates_variant_and_punctuation(index: SubtitleIndex):
+    assert index.rank("为什么要演奏春日影?!")[0] == 0
+
+
+def test_rank_tolerates_typo(index: SubtitleIndex):
+    assert index.rank("為什麼要演湊春日影")[0] == 0
+
+
+def test_rank_prefers_containment_and_filters_episode(index: SubtitleIndex):
+    assert index.rank("春日影")[:2] == [1, 0]
+    assert index.rank("春日影", episode="7") == [0]
+
+
+def test_rank_after_remove(index: SubtitleIndex):
+    index.remove(1)
+    assert index.rank("春日影") == [0]
+    assert 1 not in index._term_lengths
+
+
+def test_cursor_page_and_expire():
+    cursor = SearchCursor(text="春日影", segment_ids=list(range(60)))
+    assert cursor.count == 60  # noqa: PLR2004
+    assert cursor.page(3, paged_by=25) == list(range(50, 60))
+    assert cursor.page(4, paged_by=25) == []
+    assert cursor.pages(paged_by=25) == 3  # noqa: PLR2004
+    assert SearchCursor(text="", segment_ids=[]).pages() == 1
+    assert not cursor.expired()
+    assert cursor.expired(ttl=-1)
+
+
+@pytest.mark.asyncio
+async def test_search_state_in_custom_id():
+    state = SearchState(
+        query="春日影:" * (SEARCH_QUERY_MAX_LENGTH // 4), episode="1-3", fuzzy=True, page=120
+    )
+    items = [SentenceItem(segment_id=1, frame_start=0, frame_end=1, text="春日影", episode="4")]
+    view = SubtitleView(state.model_copy(update={"response": "gif"}), items, has_next=True)
+
+    custom_ids = [item.item.custom_id for item in view.children]
+    assert all(len(custom_id) <= 100 for custom_id in custom_ids)  # noqa: PLR2004
+    assert custom_ids[1] == "mygo:subtitle:gif"
+
+    for item_class, custom_id, page in [
+        (ResponseSelect, custom_ids[0], 120),
+        (PageButton, custom_ids[2], 119),
+        (PageButton, custom_ids[3], 121),
+    ]:
+        match = item_class.__discord_ui_compiled_template__.fullmatch(custom_id)
+        assert SearchState.decode(match) == state.model_copy(
+            update={"page": page, "response": "gif"}
+        )
+
+
+@pytest.mark.asyncio
+async def test_search_page_zero():
+    cog = Mock(spec=SubtitleCMD, utils=Mock())
+
+    with pytest.raises(commands.BadArgument, match="Page number"):
+        await SubtitleCMD.search_subtitles.callback(cog, AsyncMock(), "春日影", nth_page=0)
+
+
+@pytest.mark.asyncio
+async def test_search_page_past_results():
+    items = [SentenceItem(segment_id=1, frame_start=0, frame_end=1, text="春日影", episode="4")]
+    utils = Mock(
+        open_cursor=AsyncMock(return_value=SearchCursor(text="春日影", segment_ids=[1] * 60)),
+        fetch_page=AsyncMock(return_value=items),
+    )
+
+    content, view = await search_message(utils, SearchState(query="春日影", page=10**100))
+
+    assert content.startswith("Paged 3:")
+    utils.fetch_page.assert_awaited_once_with(utils.open_cursor.return_value, 3)
+    assert all(len(item.item.custom_id) <= 100 for item in view.children)  # noqa: PLR2004
+
+
+def test_search_state_of_multiline_query():
+    state = SearchState(query="為什麼\n要演奏\r\n春日影")
+    match = PageButton.__discord_ui_compiled_template__.fullmatch(state.encode("mygo:page"))
+
+    assert state.query == "為什麼 要演奏 春日影"
+    assert SearchState.decode(match) == state
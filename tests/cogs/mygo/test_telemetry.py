@@ -0,0 +1,126 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from cogs.mygo.schema import RenderTrace
+from cogs.mygo.telemetry import RenderTelemetry, add_stage, mark_cached, percentile, stage
+from database import BaseSQLModel
+
+
+def traced(episode: str, total: float, **stages: float) -> RenderTrace:
+    return RenderTrace(kind="gif", episode=episode, stages={"total": total, **stages})
+
+
+# ------------------------------- fixture -------------------------------
+@pytest_asyncio.fixture
+async def engine(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> AsyncEngine:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'telemetry.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseSQLModel.metadata.create_all)
+
+    monkeypatch.setattr("cogs.mygo.telemetry.engine", engine)
+    yield engine
+    await engine.dispose()
+
+
+# ------------------------------- test -------------------------------
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+
+    assert percentile(values, 50) == 50.0  # noqa: PLR2004
+    assert percentile(values, 95) == 95.0  # noqa: PLR2004
+    assert percentile([3.0], 95) == 3.0  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_trace_collects_stages_across_tasks():
+    telemetry = RenderTelemetry()
+
+    async def render():
+        add_stage("queue", 0.5)
+        mark_cached()
+
+    with telemetry.trace("frame", "4") as trace:
+        with stage("lookup"):
+            pass
+        add_stage("queue", 0.25)
+        # tasks copy the context, so stages of spawned renders land on the same trace
+        await asyncio.ensure_future(render())
+
+    # outside a trace, stages are dropped
+    add_stage("queue", 1.0)
+
+    assert list(telemetry.records) == [trace]
+    assert trace.cached
+    assert trace.stages["queue"] == 0.75  # noqa: PLR2004
+    assert {"lookup", "total"} <= trace.stages.keys()
+
+
+def test_failed_render_is_not_recorded():
+    telemetry = RenderTelemetry()
+
+    with pytest.raises(RuntimeError), telemetry.trace("gif", "4"):
+        raise RuntimeError
+
+    assert not telemetry.records
+
+
+def test_stage_and_episode_stats():
+    traces = [traced("4", 0.1 * i, ffmpeg=0.01 * i) for i in range(1, 21)]
+    traces.append(traced("5", 1.0))
+
+    stages = {stats.name: stats for stats in RenderTelemetry.stage_stats(traces)}
+    episodes = {stats.name: stats for stats in RenderTelemetry.episode_stats(traces)}
+
+    assert stages.keys() == {"ffmpeg", "total"}
+    assert stages["ffmpeg"].count == 20  # noqa: PLR2004
+    assert stages["ffmpeg"].p95 == pytest.approx(0.19)
+    assert episodes["4"].p50 == pytest.approx(1.0)
+    assert episodes["5"].count == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_and_load(engine: AsyncEngine):
+    telemetry = RenderTelemetry()
+    for episode in ("4", "5"):
+        with telemetry.trace("mp4", episode, frames=24) as trace:
+            add_stage("ffmpeg", 0.2)
+            trace.output_bytes = 1024
+
+    await telemetry.flush()
+    await telemetry.flush()
+
+    restored = RenderTelemetry()
+    await restored.load()
+
+    assert len(restored.records) == 2  # noqa: PLR2004
+    assert {trace.episode for trace in restored.select("mp4")} == {"4", "5"}
+    assert restored.select(episode="5")[0].stages["ffmpeg"] == pytest.approx(0.2)
+    assert restored.select(episode="5")[0].output_bytes == 1024  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_traces(engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch):
+    telemetry = RenderTelemetry(size=2)
+    for episode in ("4", "5", "6"):
+        with telemetry.trace("frame", episode):
+            pass
+
+    # database without tables
+    broken = create_async_engine("sqlite+aiosqlite://")
+    monkeypatch.setattr("cogs.mygo.telemetry.engine", broken)
+    with pytest.raises(OperationalError):
+        await telemetry.flush()
+    await broken.dispose()
+
+    monkeypatch.setattr("cogs.mygo.telemetry.engine", engine)
+    await telemetry.flush()
+    restored = RenderTelemetry()
+    await restored.load()
+
+    # at most the ring size of traces is kept for the next flush
+    assert {trace.episode for trace in restored.records} == {"5", "6"}
@@ -0,0 +1,235 @@
+import asyncio
+import re
+import shutil
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryFile
+from unittest.mock import AsyncMock
+
+import ffmpeg
+import pytest
+from discord.utils import DEFAULT_FILE_SIZE_LIMIT_BYTES
+
+from cogs.mygo.cache import RenderCache
+from cogs.mygo.const import SHEET_MAX_GRID
+from cogs.mygo.registry import episode_registry
+from cogs.mygo.render import RenderQueueFullError
+from cogs.mygo.utils import SubtitleUtils
+from config import MyGOConfig
+from database import EpisodeItem, SentenceItem
+
+SEGMENT = SentenceItem(text="a", episode="4", frame_start=24, frame_end=72, segment_id=1)
+
+
+# ------------------------------- fixture -------------------------------
+@pytest.fixture
+def utils(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> SubtitleUtils:
+    """Utils with cache under `tmp_path` and episode 4 at `tmp_path / "4.mp4"`."""
+    monkeypatch.setattr(MyGOConfig, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr("cogs.mygo.registry.VIDEO_DIR", tmp_path)
+    monkeypatch.setattr(episode_registry, "_episodes", {})
+    monkeypatch.setattr(episode_registry, "loaded", True)
+    episode_registry.update(EpisodeItem(episode="4", total_frame=480, frame_rate=24.0))
+    return SubtitleUtils()
+
+
+@pytest.fixture
+def prewarm_utils(utils: SubtitleUtils, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    (tmp_path / "4.mp4").touch()
+    monkeypatch.setattr("cogs.mygo.utils.system_busy", lambda: False)
+    utils.popularity.hit(SEGMENT.segment_id)
+    utils.get_items_by_segment_ids = AsyncMock(return_value=[SEGMENT])
+    utils._render_frame = AsyncMock(side_effect=lambda *_: BytesIO(b"frame"))
+    utils._render_animation = AsyncMock(side_effect=lambda *_: BytesIO(b"gif"))
+    return utils
+
+
+# ------------------------------- test -------------------------------
+def test_group_by_gap():
+    items = [
+        SentenceItem(text="c", episode="4", frame_start=500, frame_end=520, segment_id=3),
+        SentenceItem(text="a", episode="4", frame_start=0, frame_end=100, segment_id=1),
+        SentenceItem(text="b", episode="4", frame_start=50, frame_end=60, segment_id=2),
+        SentenceItem(text="d", episode="4", frame_start=600, frame_end=610, segment_id=4),
+    ]
+
+    groups = SubtitleUtils._group_by_gap(items, max_gap=80)
+
+    assert [[item.segment_id for item in group] for group in groups] == [[1, 2], [3, 4]]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(("columns", "rows"), [(0, 4), (4, 0), (SHEET_MAX_GRID + 1, 1)])
+async def test_sheet_grid_size(columns: int, rows: int):
+    with pytest.raises(ValueError, match="Grid size"):
+        await SubtitleUtils().extract_sheet(1, columns, rows)
+
+
+@pytest.mark.parametrize(
+    ("start", "end", "expected"),
+    [
+        (48, 95, True),
+        (48, 143, True),
+        (48, 479, True),  # until the last frame
+        (50, 95, False),
+        (48, 100, False),
+    ],
+)
+def test_keyframe_aligned(start: int, end: int, expected: bool):
+    assert SubtitleUtils._keyframe_aligned([0, 48, 96, 144], start, end, 480) is expected
+
+
+@pytest.mark.asyncio
+async def test_prewarm_shares_key_with_gif_command(prewarm_utils: SubtitleUtils):
+    utils = prewarm_utils
+
+    assert await utils.prewarm() == 2  # noqa: PLR2004
+    assert await utils.prewarm() == 0
+
+    result = await utils.extract_animation(
+        "4", SEGMENT.frame_start, SEGMENT.frame_end, max_bytes=DEFAULT_FILE_SIZE_LIMIT_BYTES
+    )
+
+    assert result.read() == b"gif"
+    assert utils._render_animation.await_count == 1
+    # warmed renders are kept in the warm store only
+    assert utils.render_cache.stats().memory_items == utils.render_cache.stats().disk_items == 0
+
+
+@pytest.mark.asyncio
+async def test_prewarm_stops_when_queue_is_full(prewarm_utils: SubtitleUtils):
+    prewarm_utils._render_frame.side_effect = RenderQueueFullError("full")
+
+    assert await prewarm_utils.prewarm() == 0
+    prewarm_utils._render_animation.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("broken", ["missing video", "unknown episode"])
+async def test_prewarm_skips_broken_segment(
+    prewarm_utils: SubtitleUtils, tmp_path: Path, broken: str
+):
+    if broken == "missing video":
+        episode_registry.update(EpisodeItem(episode="5", total_frame=480, frame_rate=24.0))
+    item = SentenceItem(text="b", episode="5", frame_start=0, frame_end=0, segment_id=2)
+    prewarm_utils.get_items_by_segment_ids.return_value = [item, SEGMENT]
+
+    # 5.mp4 does not exist, or episode 5 is not registered
+    assert await prewarm_utils.prewarm() == 2  # noqa: PLR2004
+    prewarm_utils._render_animation.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_cached_render_hands_over_output_too_large_for_cache(
+    utils: SubtitleUtils, tmp_path: Path
+):
+    utils.render_cache = RenderCache(tmp_path / "small", 0, 10)
+    outputs = []
+
+    async def render():
+        await asyncio.sleep(0.01)
+        outputs.append(TemporaryFile())
+        outputs[-1].write(b"x" * 100)
+        outputs[-1].seek(0)  # as `RenderQueue.run` leaves it
+        return outputs[-1]
+
+    first, second = await asyncio.gather(
+        utils._cached_render("key", render), utils._cached_render("key", render)
+    )
+
+    # the caller that rendered gets the file itself, the other one renders again
+    assert {id(first), id(second)} == {id(output) for output in outputs}
+    assert first.read() == second.read() == b"x" * 100
+
+
+@pytest.fixture
+def video(utils: SubtitleUtils, tmp_path: Path) -> SubtitleUtils:
+    """Utils with a real 20s, 24fps episode 4 with sound and a keyframe every 48 frames."""
+    ffmpeg.output(
+        ffmpeg.input("testsrc=size=160x90:rate=24", f="lavfi"),
+        ffmpeg.input("sine=sample_rate=48000", f="lavfi"),
+        str(tmp_path / "4.mp4"),
+        t=20,
+        vcodec="libx264",
+        g=48,
+        keyint_min=48,
+        sc_threshold=0,
+        pix_fmt="yuv420p",
+        acodec="aac",
+    ).run(quiet=True)
+    keyframes = list(range(0, 480, 48))
+    utils.keyframe_index.get = AsyncMock(return_value=keyframes)
+    utils.keyframe_index.preceding = AsyncMock(side_effect=lambda _, frame: frame - frame % 48)
+    return utils
+
+
+def probe_clip(path: Path) -> tuple[list[float], float]:
+    """Timestamps of video frames and duration of audio (seconds) of a clip."""
+    samples, log = (
+        ffmpeg.input(str(path))
+        .audio.output("pipe:", format="s16le", ac=1, ar=48000)
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    if b"Video:" in log:
+        _, log = (
+            ffmpeg.input(str(path))
+            .video.filter("showinfo")
+            .output("-", format="null")
+            .run(capture_stderr=True)
+        )
+    timestamps = [float(t) for t in re.findall(rb"pts_time:([\d.]+)", log)]
+    return timestamps, len(samples) / 2 / 48000
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+@pytest.mark.parametrize(
+    ("start", "end", "media"),
+    [(100, 150, "video"), (48, 95, "video"), (100, 150, "audio")],
+)
+async def test_clip_duration_and_timestamps(
+    video: SubtitleUtils, tmp_path: Path, start: int, end: int, media: str
+):
+    with await video.extract_clip("4", start, end, media) as clip:
+        (tmp_path / "clip.mp4").write_bytes(clip.read())
+
+    timestamps, audio_duration = probe_clip(tmp_path / "clip.mp4")
+
+    duration = (end - start + 1) / 24
+    assert audio_duration == pytest.approx(duration, abs=0.05)
+    if media == "audio":
+        assert timestamps == []
+        return
+
+    # copied video keeps up to a frame of codec delay of the source
+    assert 0 <= timestamps[0] <= 1 / 24 + 0.001
+    assert [t - timestamps[0] for t in timestamps] == pytest.approx(
+        [i / 24 for i in range(end - start + 1)], abs=0.001
+    )
+    if (start, end) == (100, 150):
+        assert timestamps[0] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+async def test_batch_renders_reversed_segment_as_extract_animation(
+    video: SubtitleUtils, tmp_path: Path
+):
+    item = SentenceItem(text="a", episode="4", frame_start=72, frame_end=24, segment_id=9)
+    video.get_items_by_segment_ids = AsyncMock(return_value=[item])
+
+    with (await video.render_segments([9], "gif"))[9] as gif:
+        (tmp_path / "batch.gif").write_bytes(gif.read())
+    video._render_animation = AsyncMock()
+    with await video.extract_animation("4", 72, 24) as gif:
+        assert gif.read() == (tmp_path / "batch.gif").read_bytes()
+
+    # same cache key as the reversed animation, and all of its frames
+    video._render_animation.assert_not_awaited()
+    _, log = (
+        ffmpeg.input(str(tmp_path / "batch.gif"))
+        .filter("showinfo")
+        .output("-", format="null")
+        .run(capture_stderr=True)
+    )
+    assert log.count(b"pts_time:") == 48  # noqa: PLR2004
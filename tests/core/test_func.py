@@ -1,13 +1,16 @@
 import os
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 import pytest_asyncio
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from cogs.mygo.schema import SubtitleItem
-from core.func import db_insert_subtitle_data
+from cogs.mygo.search import SubtitleIndex
+from core.func import db_insert_subtitle_data, get_import_checksum, set_import_checksum
 from database import BaseSQLModel, SentenceItem
 
 
@@ -80,3 +83,40 @@ async def test_insert_subtitle_data_update(data: SubtitleItem, session_fixture:
         if attr.startswith("_"):
             continue
         assert getattr(after, attr) == getattr(data.result[0], attr)
+
+
+@pytest.mark.asyncio
+async def test_insert_subtitle_data_unchanged(data: SubtitleItem, session_fixture: AsyncSession):
+    data.result[0].text = "Hi"
+    await db_insert_subtitle_data(data, session_fixture, update=True)
+
+    assert data.result == [None]  # nothing to insert or update
+    assert len((await session_fixture.exec(select(SentenceItem))).all()) == 1
+
+
+@pytest.mark.asyncio
+async def test_import_checksum(session_fixture: AsyncSession):
+    assert await get_import_checksum("mygo_detail.json", session_fixture) is None
+
+    await set_import_checksum("mygo_detail.json", "old", session_fixture)
+    await set_import_checksum("mygo_detail.json", "new", session_fixture)
+    assert await get_import_checksum("mygo_detail.json", session_fixture) == "new"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("commit_fails", [False, True])
+async def test_index_follows_committed_import(
+    data: SubtitleItem, monkeypatch: pytest.MonkeyPatch, commit_fails: bool
+):
+    index = SubtitleIndex()
+    index.loaded = True
+    monkeypatch.setattr("core.func.subtitle_index", index)
+    session = Mock(exec=AsyncMock(return_value=Mock(all=Mock(return_value=[]))), commit=AsyncMock())
+    if commit_fails:
+        session.commit.side_effect = OperationalError("COMMIT", {}, Exception("gone away"))
+        with pytest.raises(OperationalError):
+            await db_insert_subtitle_data(data, session)
+    else:
+        await db_insert_subtitle_data(data, session)
+
+    assert index.search("Hello") == ([] if commit_fails else [1])